@@ -0,0 +1,89 @@
+import argparse
+import os
+
+from streamlit.testing.v1 import AppTest
+
+
+def benchmark_reruns(reruns=3):
+    """
+    Drive the dashboard with Streamlit's AppTest and report the server time
+    per rerun when every tab is built on each rerun, as before, and with
+    lazy memoized tabs, for filter changes, slider moves and tab switches.
+    For the sliders that live in a fragment, the fragment column is the time
+    of the fragment alone, which is all a slider move reruns in a browser.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    script = (
+        f"import sys\nsys.path.insert(0, {repo!r})\n"
+        "import streamlit as st\n"
+        "from zero_waste_stats import StoreDataAnalysisDashboard\n"
+        "lazy = st.session_state['benchmark_lazy']\n"
+        "if not lazy:\n"
+        "    st.session_state.pop('dashboard_memo', None)\n"
+        "StoreDataAnalysisDashboard(set_page_config=False, lazy_tabs=lazy).run()\n"
+    )
+
+    def change_filter(at, i):
+        store = at.sidebar.selectbox[0]
+        store.select(store.options[i % (len(store.options) - 1) + 1])
+
+    def change_threshold(at, i):
+        threshold = next(s for s in at.slider if s.label.startswith("Discount Percentage"))
+        threshold.set_value(10.0 + i % 2 * 5)
+
+    def change_segments(at, i):
+        next(s for s in at.slider if s.label == "Number of Segments").set_value(4 + i % 2)
+
+    def switch_tab(at, i):
+        at.session_state['dashboard_tab'] = ["🔍 Detailed Analysis", "🧠 ML Insights", "📊 Overall Statistics"][i % 3]
+
+    ml_tab = "🧠 ML Insights"
+    # (scenario, step, tab it happens on, fragment it reruns)
+    scenarios = [
+        ("filter change", change_filter, None, None),
+        ("threshold change", change_threshold, ml_tab, "Threshold sections"),
+        ("segments change", change_segments, ml_tab, "Segmentation"),
+        ("tab switch", switch_tab, None, None),
+    ]
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(repo)
+    try:
+        for lazy in [False, True]:
+            for name, step, tab, fragment in scenarios:
+                if name == "tab switch" and not lazy:
+                    # Without lazy tabs switching happens in the browser and does not rerun the script
+                    continue
+                at = AppTest.from_string(script, default_timeout=300)
+                at.session_state['benchmark_lazy'] = lazy
+                if tab:
+                    at.session_state['dashboard_tab'] = tab
+                at.run()
+                elapsed = fragment_elapsed = 0.0
+                for i in range(reruns):
+                    step(at, i)
+                    at.run()
+                    if at.exception:
+                        raise RuntimeError(at.exception[0].message)
+                    timings = at.session_state['dashboard_timings']
+                    elapsed += timings['Total']
+                    fragment_elapsed += timings.get(fragment, 0.0)
+                results[(name, lazy)] = elapsed / reruns
+                if fragment and lazy:
+                    results[(name, 'fragment')] = fragment_elapsed / reruns
+    finally:
+        os.chdir(cwd)
+
+    columns = [(False, 'all tabs'), (True, 'lazy tabs'), ('fragment', 'fragment')]
+    print(f"{'ms per rerun':<18}" + "".join(f"{label:>11}" for _, label in columns))
+    for name, *_ in scenarios:
+        cells = [f"{results[(name, mode)] * 1000:.0f}" if (name, mode) in results else "-" for mode, _ in columns]
+        print(f"{name:<18}" + "".join(f"{cell:>11}" for cell in cells))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure dashboard rerun times with and without lazy tabs")
+    parser.add_argument("--reruns", type=int, default=3)
+    args = parser.parse_args()
+    benchmark_reruns(args.reruns)
@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from streamlit.testing.v1 import AppTest
+
+
+def _click(label=None, key=None):
+    def step(at):
+        button = at.button(key=key) if key else next(b for b in at.button if b.label == label)
+        button.click()
+    return step
+
+
+def _wizard_steps(product_index):
+    """One product through the button wizard, picking both dates step by step"""
+    day = product_index % 28 + 1
+    return [
+        _click("Manual"),
+        _click(key="btn_food"),
+        _click(key="btn_cat_Dairy Products"),
+        _click(key="btn_brand_Amul"),
+        _click(key="btn_product_Milk"),
+        _click(key="btn_step_date"),
+        _click(key="btn_year_2025"),
+        _click(key="btn_month_1"),
+        _click(key=f"btn_day_{day}"),
+        _click(key="btn_step_exp"),
+        _click(key="btn_exp_year_2026"),
+        _click(key="btn_exp_month_6"),
+        _click(key=f"btn_exp_day_{day}"),
+        _click(key="btn_avail_yes"),
+        _click(key="final_submit"),
+    ]
+
+
+def _form_steps(product_index, last):
+    """One product through the batch form; the batch is saved after the last one"""
+    def fill_and_submit(at):
+        at.selectbox(key="batch_category").set_value("Dairy Products")
+        at.selectbox(key="batch_brand").set_value("Amul")
+        at.selectbox(key="batch_product").set_value("Milk")
+        at.number_input(key="batch_price").set_value(1000 * (product_index + 1))
+        at.date_input(key="batch_production").set_value(datetime(2025, 1, product_index % 28 + 1).date())
+        at.date_input(key="batch_expire").set_value(datetime(2026, 6, product_index % 28 + 1).date())
+        _click("Add to batch")(at)
+
+    steps = [fill_and_submit]
+    if product_index == 0:
+        steps.insert(0, _click("Batch entry"))
+    if last:
+        steps.append(_click(key="batch_save"))
+    return steps
+
+
+def benchmark_entry_reruns(products=5):
+    """
+    Drive dat() with Streamlit's AppTest and report the script reruns and
+    time per product for the button wizard and the batch form. Runs against
+    scratch copies of the data files.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    script = f"import sys\nsys.path.insert(0, {repo!r})\nfrom dataa import dat\ndat()\n"
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ["products_data.csv", "enhanced_store_data.csv"]:
+            shutil.copy(os.path.join(repo, name), tmp_dir)
+        os.chdir(tmp_dir)
+        try:
+            # The form saves its batch after the last product; the wizard saves each one
+            form_steps = lambda i: _form_steps(i, last=i == products - 1)
+            for mode, steps in [("wizard", _wizard_steps), ("form", form_steps)]:
+                at = AppTest.from_string(script, default_timeout=120)
+                at.run()
+                runs = 0
+                elapsed = 0.0
+                for i in range(products):
+                    for step in steps(i):
+                        step(at)
+                        started = time.perf_counter()
+                        at.run()
+                        elapsed += time.perf_counter() - started
+                        runs += 1
+                        if at.exception:
+                            raise RuntimeError(at.exception[0].message)
+                results[mode] = (runs / products, elapsed / products)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'mode':<8}{'reruns/product':>16}{'seconds/product':>17}")
+    for mode, (reruns, seconds) in results.items():
+        print(f"{mode:<8}{reruns:>16.1f}{seconds:>17.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count reruns per manual product entry")
+    parser.add_argument("--products", type=int, default=5)
+    args = parser.parse_args()
+    benchmark_entry_reruns(args.products)
@@ -0,0 +1,144 @@
+import os
+import re
+import sqlite3
+import threading
+
+import pandas as pd
+
+from file_utils import FileLock
+
+
+# Set this to a database path (e.g. catalog.sqlite) to serve the pages from SQLite
+CATALOG_DB_ENV = "ZEROWASTE_CATALOG_DB"
+
+INDEXED_COLUMNS = ["store_name", "product_group", "product_brand", "product_name", "date_of_expiry"]
+
+
+class CatalogDB:
+    """
+    Embedded SQLite copy of a product CSV with indexes on the filter columns.
+
+    Each CSV gets its own table, rebuilt whenever the CSV changes on disk.
+    Filters are dicts of column -> value for equality, or column ->
+    (low, high) for an inclusive range; both are pushed down as SQL so the
+    indexes do the work instead of a pandas scan.
+    """
+
+    def __init__(self, db_path, csv_file):
+        """Initialize the catalog for one CSV file"""
+        self.db_path = db_path
+        self.csv_file = csv_file
+        self.table = re.sub(r"\W", "_", os.path.splitext(os.path.basename(csv_file))[0])
+        self.columns = []
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _source_signature(self):
+        stat = os.stat(self.csv_file)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _stored_signature(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS catalog_meta (source TEXT PRIMARY KEY, signature TEXT)")
+        row = conn.execute("SELECT signature FROM catalog_meta WHERE source = ?", (self.table,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, chunk_rows=50_000):
+        """Rebuild the table and its indexes if the CSV changed since the last build"""
+        conn = self._connect()
+        signature = self._source_signature()
+        if self._stored_signature(conn) != signature:
+            with FileLock(self.db_path + ".lock"):
+                if self._stored_signature(conn) != signature:
+                    self._rebuild(conn, signature, chunk_rows)
+
+        self.columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{self.table}")')]
+        return self
+
+    def _rebuild(self, conn, signature, chunk_rows):
+        staging = f"{self.table}__staging"
+        conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+        for chunk in pd.read_csv(self.csv_file, chunksize=chunk_rows):
+            chunk.to_sql(staging, conn, if_exists="append", index=False)
+
+        # Swap the new table in within one transaction so readers never see a half-built catalog
+        with conn:
+            conn.execute(f'DROP TABLE IF EXISTS "{self.table}"')
+            conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{self.table}"')
+            columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{self.table}")')]
+            for column in INDEXED_COLUMNS:
+                if column in columns:
+                    conn.execute(f'CREATE INDEX "idx_{self.table}_{column}" ON "{self.table}" ("{column}")')
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog_meta (source, signature) VALUES (?, ?)",
+                (self.table, signature)
+            )
+        conn.execute("ANALYZE")
+
+    def _where(self, filters):
+        clauses = []
+        params = []
+        for column, value in (filters or {}).items():
+            if column not in self.columns:
+                raise KeyError(f"Unknown column: {column}")
+            if isinstance(value, tuple):
+                low, high = value
+                clauses.append(f'"{column}" BETWEEN ? AND ?')
+                params.extend([_sql_value(low), _sql_value(high)])
+            else:
+                clauses.append(f'"{column}" = ?')
+                params.append(_sql_value(value))
+        sql = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return sql, params
+
+    def select(self, filters=None, columns=None, limit=None):
+        """Return the rows matching the filters as a DataFrame"""
+        projection = ", ".join(f'"{col}"' for col in columns) if columns else "*"
+        where, params = self._where(filters)
+        sql = f'SELECT {projection} FROM "{self.table}"{where}'
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(sql, self._connect(), params=params)
+
+    def distinct(self, column, filters=None):
+        """Return the sorted distinct values of a column among the matching rows"""
+        where, params = self._where(filters)
+        sql = f'SELECT DISTINCT "{column}" FROM "{self.table}"{where} ORDER BY "{column}"'
+        return [row[0] for row in self._connect().execute(sql, params) if row[0] is not None]
+
+    def min_max(self, column, filters=None):
+        """Return (min, max) of a column among the matching rows"""
+        where, params = self._where(filters)
+        sql = f'SELECT MIN("{column}"), MAX("{column}") FROM "{self.table}"{where}'
+        return self._connect().execute(sql, params).fetchone()
+
+
+def _sql_value(value):
+    # Dates are stored as ISO text in the CSVs, which also sorts correctly
+    if hasattr(value, "isoformat"):
+        return value.isoformat()[:10]
+    return value
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(csv_file):
+    """Return the SQLite catalog for a CSV file, or None when the backend is not enabled"""
+    db_path = os.environ.get(CATALOG_DB_ENV)
+    if not db_path or not os.path.exists(csv_file):
+        return None
+
+    key = (os.path.abspath(db_path), os.path.abspath(csv_file))
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = CatalogDB(db_path, csv_file)
+            _catalogs[key] = catalog
+    return catalog.refresh()
@@ -1,97 +1,74 @@
 def tables():
     import streamlit as st
     import pandas as pd
-
-    @st.cache_data
-    def load_data():
-        try:
-            df = pd.read_csv('store_product_data.csv')
-            return df
-        except FileNotFoundError:
-            try:
-                df = pd.read_csv("D:/Dasturlash/VS code/Hakhathon/Navruz/ZeroWaste/store_product_data.csv")
-                return df
-            except Exception as e:
-                st.error(f"Error loading CSV file: {e}")
-                return pd.DataFrame(columns=['product_group', 'product_brand', 'product_name'])
-
+    from dataset_service import get_products, get_products_catalog, get_products_hierarchy, get_products_search, get_products_suggest
+    from product_query import distinct, query
 
     def main():
     
+        # Filters are pushed down to SQLite when the catalog backend is enabled
+        catalog = get_products_catalog()
+        if catalog is not None:
+            columns = catalog.columns
+        else:
+            # Shared, already typed and column-mapped table; no per-session copy
+            try:
+                df = get_products()
+            except FileNotFoundError:
+                df = pd.DataFrame()
         
-        df = load_data()
-        
-        if df.empty:
-            st.warning("No data available. Please check the CSV file path.")
-            return
-        
-        df.columns = [col.lower() for col in df.columns]
-     
-        required_columns = ['product_group', 'product_brand', 'product_name']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+            if df.empty:
+                st.warning("No data available. Please check the CSV file path.")
+                return
+            columns = df.columns
         
-        if missing_columns:
-            st.warning(f"Missing columns in CSV: {', '.join(missing_columns)}")
-            st.write("Available columns:", ", ".join(df.columns))
-            
-            column_mapping = {}
-            for req_col in missing_columns:
-                possible_matches = [col for col in df.columns if req_col.replace('_', '') in col.replace('_', '').lower()]
-                if possible_matches:
-                    column_mapping[possible_matches[0]] = req_col
-                    st.info(f"Mapped '{possible_matches[0]}' to '{req_col}'")
-     
-            if column_mapping:
-                df = df.rename(columns=column_mapping)
+        # Filtering goes through the same query engine as the dashboard
+        if catalog is not None:
+            counts = lambda column, filters: dict.fromkeys(distinct(column, filters))
+        else:
+            # Dropdown options come from the prebuilt group -> brand -> name tree, not a pass over the rows
+            counts = get_products_hierarchy().counts
+        
+        def choose(label, column, filters):
+            # Show how many products each option covers when the tree knows it
+            option_counts = counts(column, filters)
+            return st.sidebar.selectbox(
+                label,
+                ['All'] + list(option_counts),
+                format_func=lambda value: f"{value} ({option_counts[value]:,})" if option_counts.get(value) else value,
+            )
         
         st.sidebar.header("Filters")
+        filters = {}
         
-        if 'product_group' in df.columns:
-            product_groups = ['All'] + sorted(df['product_group'].unique().tolist())
-            selected_group = st.sidebar.selectbox("Select Product Group:", product_groups)
+        if 'product_group' in columns:
+            selected_group = choose("Select Product Group:", 'product_group', {})
+            if selected_group != 'All':
+                filters['product_group'] = selected_group
         else:
             selected_group = 'All'
             st.sidebar.warning("Product Group filter not available")
         
-        if 'product_brand' in df.columns:
-          
-            if selected_group != 'All':
-                brand_options = df[df['product_group'] == selected_group]['product_brand'].unique()
-            else:
-                brand_options = df['product_brand'].unique()
-            
-            product_brands = ['All'] + sorted(brand_options.tolist())
-            selected_brand = st.sidebar.selectbox("Select Product Brand:", product_brands)
+        if 'product_brand' in columns:
+            selected_brand = choose("Select Product Brand:", 'product_brand', filters)
+            if selected_brand != 'All':
+                filters['product_brand'] = selected_brand
         else:
             selected_brand = 'All'
             st.sidebar.warning("Product Brand filter not available")
         
        
-        if 'product_name' in df.columns:
-         
-            filtered_df = df.copy()
-            if selected_group != 'All':
-                filtered_df = filtered_df[filtered_df['product_group'] == selected_group]
-            if selected_brand != 'All':
-                filtered_df = filtered_df[filtered_df['product_brand'] == selected_brand]
-            
-            product_names = ['All'] + sorted(filtered_df['product_name'].unique().tolist())
-            selected_name = st.sidebar.selectbox("Select Product Name:", product_names)
+        if 'product_name' in columns:
+            selected_name = choose("Select Product Name:", 'product_name', filters)
+            if selected_name != 'All':
+                filters['product_name'] = selected_name
         else:
             selected_name = 'All'
             st.sidebar.warning("Product Name filter not available")
         
     
-        filtered_df = df.copy()
-        
-        if selected_group != 'All' and 'product_group' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['product_group'] == selected_group]
-        
-        if selected_brand != 'All' and 'product_brand' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['product_brand'] == selected_brand]
-        
-        if selected_name != 'All' and 'product_name' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['product_name'] == selected_name]
+        result = query(filters)
+        filtered_df = result.rows
         
      
         st.write("### Current Filters:")
@@ -108,14 +85,30 @@ def tables():
         
       
         search_term = st.text_input("Search in results:", "")
+        if search_term and catalog is None:
+            # Product, brand and store names starting with what was typed, most sold first
+            suggestions = get_products_suggest().suggest(search_term, 5)
+            if suggestions:
+                st.caption("Suggestions: " + " · ".join(f"{item['text']} ({item['kind']})" for item in suggestions))
         if search_term:
-         
-            text_columns = filtered_df.select_dtypes(include=['object']).columns
-            mask = False
-            for col in text_columns:
-                mask = mask | filtered_df[col].str.contains(search_term, case=False, na=False)
-            filtered_df = filtered_df[mask]
-            st.write(f"Found {len(filtered_df)} results containing '{search_term}'")
+            if catalog is None:
+                # Result rows keep their position in the shared table as index, which the search index answers for
+                # Spelling, script and accents may differ ("молоко", "Nestle"); best matches come first
+                search = get_products_search(result.version)
+                while search is None:
+                    # The table was rewritten after the query; filter the new version before ranking
+                    result = query(filters)
+                    filtered_df = result.rows
+                    search = get_products_search(result.version)
+                positions, _ = search.rank(search_term, filtered_df.index.to_numpy())
+                filtered_df = filtered_df.iloc[positions]
+            else:
+                text_columns = filtered_df.select_dtypes(include=['object', 'category']).columns
+                mask = False
+                for col in text_columns:
+                    mask = mask | filtered_df[col].str.contains(search_term, case=False, regex=False, na=False)
+                filtered_df = filtered_df[mask]
+            st.write(f"Found {len(filtered_df)} results matching '{search_term}'")
         
   
         columns_to_show = ['store_name', 'product_group', 'product_brand', 'product_name',"product_price", "status",  "date_of_manufacture", "date_of_expiry","sales_volume"]
@@ -153,77 +146,14 @@ def maps():
     import pandas as pd
     import folium
     from streamlit_folium import folium_static
-    from math import radians, sin, cos, sqrt, asin
+    from dataset_service import get_geo_view
+    from geo import nearest
 
-    @st.cache_data
     def load_data():
         try:
-         
-            try:
-            
-                df = pd.read_csv('./store_product_data.csv')
-            except FileNotFoundError:
-            
-                try:
-                    df = pd.read_csv("D:/Dasturlash/VS code/Hakhathon/Navruz/ZeroWaste/store_product_data.csv")
-                    st.info("Using absolute path for data file.")
-                except:
-                    st.error("Could not find the data file. Using sample data instead.")
-               
-                    sample_data = {
-                        'shop_name': ['Sample Shop 1', 'Sample Shop 2', 'Sample Shop 3', 
-                                      'Sample Shop 4', 'Sample Shop 5', 'Sample Shop 6'],
-                        'latitude': [34.0047, 34.1205, 34.0553, 34.0298, 34.0331, 34.0482],
-                        'longitude': [-118.2661, -118.3071, -118.4152, -118.2943, -118.3550, -118.2437]
-                    }
-                    return pd.DataFrame(sample_data)
-
-            column_mapping = {
-                'store name': 'shop_name',
-                'location_lat': 'latitude', 
-                'location_long': 'longitude'  
-            }
-            
-          
-            for original, new_name in column_mapping.items():
-                if original in df.columns:
-                    df = df.rename(columns={original: new_name})
-            
-          
-            required_columns = ['shop_name', 'latitude', 'longitude']
-            missing_columns = set(required_columns) - set(df.columns)
-            
-         
-            if missing_columns:
-        
-                position_mapping = {}
-                
-          
-                if 'shop_name' in missing_columns and len(df.columns) >= 1:
-                    position_mapping[df.columns[0]] = 'shop_name'
-                    
-            
-                if 'longitude' in missing_columns and len(df.columns) >= 2:
-                    position_mapping[df.columns[1]] = 'longitude'
-                    
-            
-                if 'latitude' in missing_columns and len(df.columns) >= 3:
-                    position_mapping[df.columns[2]] = 'latitude'
-                
-        
-                if position_mapping:
-                    df = df.rename(columns=position_mapping)
-            
-       
-            still_missing = set(required_columns) - set(df.columns)
-            if still_missing:
-                raise ValueError(f"Could not map the following required columns: {still_missing}")
-            
-            return df
-            
-        except Exception as e:
-            st.error(f"Error loading data: {e}")
-    
+            return get_geo_view()
+        except FileNotFoundError:
+            st.error("Could not find the data file. Using sample data instead.")
             sample_data = {
                 'shop_name': ['Sample Shop 1', 'Sample Shop 2', 'Sample Shop 3',
                               'Sample Shop 4', 'Sample Shop 5', 'Sample Shop 6'],
@@ -233,25 +163,9 @@ def maps():
             return pd.DataFrame(sample_data)
 
 
-    def haversine_distance(lat1, lon1, lat2, lon2):
-   
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        
-        
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        r = 6371 
-        
-        return c * r
-
-  
+    # One row per store at its canonical location, whichever backend serves the product pages
     df = load_data()
-
-    
-  
-    unique_shops = sorted(df['shop_name'].unique())
+    unique_shops = sorted(df['shop_name'])
     
    
     shop_to_show = st.selectbox("Select a shop:", unique_shops)
@@ -266,16 +180,14 @@ def maps():
         base_lon = selected_shop['longitude']
         
   
-        distances = []
-        for idx, row in df.iterrows():
-            
-            if row['shop_name'] == shop_to_show and row['latitude'] == base_lat and row['longitude'] == base_lon:
-                continue
-                
-            distance = haversine_distance(base_lat, base_lon, row['latitude'], row['longitude'])
-            distances.append((row['shop_name'], row['latitude'], row['longitude'], distance))
-
-        nearest_shops = sorted(distances, key=lambda x: x[3])[:4]
+        # Each store is one point, so the nearest 4 are 4 different shops
+        skip = (df['shop_name'] == shop_to_show).to_numpy()
+        top, distances = nearest(base_lat, base_lon, df['latitude'].to_numpy(), df['longitude'].to_numpy(), 4, skip)
+        points = df[['shop_name', 'latitude', 'longitude']].iloc[top]
+        nearest_shops = [
+            (shop_name, lat, lon, distance)
+            for (shop_name, lat, lon), distance in zip(points.itertuples(index=False), distances)
+        ]
    
         m = folium.Map(location=[base_lat, base_lon], zoom_start=14)
         
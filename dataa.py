@@ -5,6 +5,9 @@ import folium
 from PIL import Image
 from consumer import maps, tables
 from zero_waste_stats import StoreDataAnalysisDashboard
+from product_store import get_product_store
+from ingest import apply_edits, ingest_upload, merge_editor_changes, new_upload_edits, read_page, upload_digest, validate_upload
+from enrich import ENRICH_DELAY, request_enrichment, start_enrichment
 import streamlit as st
 import pandas as pd
 import json
@@ -12,6 +15,29 @@ from datetime import datetime, timedelta
 import os
 
 
+UPLOAD_PAGE_SIZES = [50, 100, 200]
+NON_FOOD_CATEGORIES = ["Electronics", "Clothing", "Home Goods"]
+
+
+def manual_entry_record(direction, category, brand, product, price, production_date, expire_date, availability, discount):
+    """Build one products_data.csv row the way the manual wizard writes it"""
+    production = datetime.strptime(production_date, "%d.%m.%Y")
+    expire = datetime.strptime(expire_date, "%d.%m.%Y")
+    duration = max((expire - production).days, 0)
+    discounted_price = int(price - price * discount / 100)
+    return {
+        "product_direction": direction,
+        "product_category": category,
+        "product_brand": brand,
+        "product_name": product,
+        "product_price": f"{price} sum",
+        "production_date": production_date,
+        "expire_date": expire_date,
+        "period_of_duration": f"{duration} days",
+        "brand_availability": availability,
+        "discount_percentage": f"{discount}%",
+        "price_after_discount": f"{discounted_price} sum"
+    }
 
 
 def dat():
@@ -40,6 +66,8 @@ def dat():
     }
 
     csv_file = "products_data.csv"
+    store = get_product_store(csv_file)
+    start_enrichment(store)
 
     # Initialize session state variables
     if 'uploaded_df' not in st.session_state:
@@ -76,20 +104,31 @@ def dat():
         st.session_state.expire_day = None
     if 'brand_availability' not in st.session_state:
         st.session_state.brand_availability = None
+    if 'show_batch' not in st.session_state:
+        st.session_state.show_batch = False
+    if 'entry_queue' not in st.session_state:
+        st.session_state.entry_queue = []
 
     # Main interface
     st.title("Product Management System")
 
     # Navigation buttons
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("Upload"):
             st.session_state.show_upload = True
             st.session_state.show_manual = False  # Hide manual when showing upload
+            st.session_state.show_batch = False
+    with col3:
+        if st.button("Batch entry"):
+            st.session_state.show_batch = True
+            st.session_state.show_upload = False
+            st.session_state.show_manual = False
     with col2:
         if st.button("Manual"):
             st.session_state.show_manual = True
             st.session_state.show_upload = False  # Hide upload when showing manual
+            st.session_state.show_batch = False
             # Reset selection state when switching to manual mode
             st.session_state.selected_direction = None
             st.session_state.selected_category = None
@@ -106,25 +145,72 @@ def dat():
             
             if uploaded_file is not None:
                 try:
-                    if uploaded_file.name.endswith('.csv'):
-                        df = pd.read_csv(uploaded_file, encoding='iso-8859-1', sep=',', on_bad_lines='skip')
-                    elif uploaded_file.name.endswith('.xlsx'):
-                        df = pd.read_excel(uploaded_file)
+                    # The whole file is hashed and checked once per upload; after that each rerun reads a single page
+                    if st.session_state.get("upload_file_id") != uploaded_file.file_id:
+                        st.session_state.upload_digest = upload_digest(uploaded_file)
+                        st.session_state.upload_file_id = uploaded_file.file_id
+                    upload_id = st.session_state.upload_digest
+                    if st.session_state.get("upload_id") != upload_id:
+                        known_brands = {brand for group in food_products.values() for brand in group["brands"]}
+                        with st.spinner("Checking uploaded file..."):
+                            total_rows, report, upload_pages = validate_upload(uploaded_file, known_brands)
+                        st.session_state.upload_id = upload_id
+                        st.session_state.upload_rows = total_rows
+                        st.session_state.upload_report = report
+                        st.session_state.upload_pages = upload_pages
+                        st.session_state.upload_edits = new_upload_edits()
+                        st.session_state.upload_editor_version = 0
+                    total_rows = st.session_state.upload_rows
+                    report = st.session_state.upload_report
+                    edits = st.session_state.upload_edits
+                    
+                    st.success(f"File '{uploaded_file.name}' successfully loaded! {total_rows} rows found.")
+                    if report.empty:
+                        st.info("No problems found in the uploaded file.")
+                    else:
+                        st.warning("Some rows need attention. Row numbers match the preview below.")
+                        st.dataframe(report, hide_index=True)
                     
-                    st.success(f"File '{uploaded_file.name}' successfully loaded!")
-                    # Display single editable table
-                    edited_df = st.data_editor(df, num_rows="dynamic", key="upload_editor")
-                    st.session_state.uploaded_df = edited_df
+                    # Only the current page is sent to the browser
+                    col1, col2 = st.columns(2)
+                    page_rows = col1.selectbox("Rows per page", UPLOAD_PAGE_SIZES, index=1)
+                    pages = max(-(-total_rows // page_rows), 1)
+                    page = col2.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+                    start = (page - 1) * page_rows
+                    page_df = apply_edits(read_page(uploaded_file, start, page_rows, st.session_state.upload_pages), start, edits)
+                    
+                    editor_key = f"upload_editor_{start}_{page_rows}_{st.session_state.upload_editor_version}"
+                    st.data_editor(page_df, num_rows="dynamic", key=editor_key)
+                    # Keep the page's changes as a diff and redraw the page with them applied
+                    if merge_editor_changes(edits, st.session_state[editor_key], page_df.index.tolist()):
+                        st.session_state.upload_editor_version += 1
+                        st.rerun()
+                    st.caption(
+                        f"{len(edits['edited'])} edited, {len(edits['deleted'])} deleted and {len(edits['added'])} added rows "
+                        "will be applied when the file is saved."
+                    )
                     
                     # Save edited data to CSV
                     if st.button("Save Uploaded Data"):
-                        if not os.path.exists(csv_file):
-                            edited_df.to_csv(csv_file, index=False)
-                        else:
-                            df_old = pd.read_csv(csv_file)
-                            df_all = pd.concat([df_old, edited_df], ignore_index=True)
-                            df_all.to_csv(csv_file, index=False)
-                        st.success("Uploaded data saved successfully!")
+                        progress_bar = st.progress(0.0, text="Saving uploaded data...")
+                        stats = ingest_upload(
+                            uploaded_file,
+                            store,
+                            edits=edits,
+                            progress=lambda fraction: progress_bar.progress(fraction, text=f"Saving uploaded data... {fraction:.0%}")
+                        )
+                        progress_bar.progress(1.0, text="Done")
+                        st.success(f"Uploaded data saved successfully! {stats['rows_written']} rows saved, {stats['rows_rejected']} empty rows skipped.")
+                        # Duplicate report: products matched on store, brand, name and batch dates
+                        col1, col2, col3, col4 = st.columns(4)
+                        col1.metric("New products", stats["inserted"])
+                        col2.metric("Updated products", stats["updated"])
+                        col3.metric("Already saved", stats["duplicates"])
+                        col4.metric("Repeated in file", stats["batch_duplicates"])
+
+                        # Push the new rows to the dashboard data, together with other submits of the next seconds
+                        request_enrichment()
+                        st.caption(f"The new rows reach the dashboard within {ENRICH_DELAY} seconds.")
                 except Exception as e:
                     st.error(f"Error reading file: {str(e)}")
                     st.info("Try opening and resaving your CSV file in Excel with comma delimiter and ISO-8859-1 encoding.")
@@ -171,7 +257,7 @@ def dat():
                             st.session_state.selected_product = None
             else:
                 # For non-food products, use limited categories
-                non_food_categories = ["Electronics", "Clothing", "Home Goods"]
+                non_food_categories = NON_FOOD_CATEGORIES
                 nf_category_cols = st.columns(len(non_food_categories))
                 
                 for i, category in enumerate(non_food_categories):
@@ -518,29 +604,80 @@ def dat():
                         submit_col1, submit_col2, submit_col3 = st.columns([1, 2, 1])
                         with submit_col2:
                             if st.button("SUBMIT", key="final_submit", use_container_width=True):
-                                data = {
-                                    "product_direction": st.session_state.selected_direction,
-                                    "product_category": st.session_state.selected_category,
-                                    "product_brand": st.session_state.selected_brand,
-                                    "product_name": st.session_state.selected_product,
-                                    "product_price": f"{price} sum",
-                                    "production_date": production_date,
-                                    "expire_date": expire_date,
-                                    "period_of_duration": f"{duration} days" if duration >= 0 else "non-eatable product",
-                                    "brand_availability": st.session_state.brand_availability,
-                                    "discount_percentage": f"{discount}%",
-                                    "price_after_discount": f"{discounted_price} sum"
-                                }
+                                data = manual_entry_record(
+                                    st.session_state.selected_direction,
+                                    st.session_state.selected_category,
+                                    st.session_state.selected_brand,
+                                    st.session_state.selected_product,
+                                    price,
+                                    production_date,
+                                    expire_date,
+                                    st.session_state.brand_availability,
+                                    discount
+                                )
                                 df_new = pd.DataFrame([data])
-                                if not os.path.exists(csv_file):
-                                    df_new.to_csv(csv_file, index=False)
-                                else:
-                                    df_old = pd.read_csv(csv_file)
-                                    df_all = pd.concat([df_old, df_new], ignore_index=True)
-                                    df_all.to_csv(csv_file, index=False)
+                                result = store.upsert(df_new)
                                 
-                                st.success("Data submitted successfully")
+                                if result["duplicates"]:
+                                    st.info("This product is already saved with the same details")
+                                elif result["updated"]:
+                                    st.success("Existing product updated successfully")
+                                else:
+                                    st.success("Data submitted successfully")
+                                request_enrichment()
                                 st.table(data)
+
+    # Batch entry: widgets inside the form do not rerun the page, so each product costs one rerun
+    if st.session_state.show_batch:
+        st.subheader("Batch Product Entry")
+        categories = {category: "food_products" for category in food_products}
+        categories.update({category: "non_food_products" for category in NON_FOOD_CATEGORIES})
+        brands = sorted({brand for group in food_products.values() for brand in group["brands"]})
+        products = sorted({product for group in food_products.values() for product in group["products"]})
+        today = datetime.now().date()
+
+        with st.form("batch_entry_form", clear_on_submit=True):
+            form_col1, form_col2 = st.columns(2)
+            with form_col1:
+                category = st.selectbox("Category", list(categories), key="batch_category")
+                product = st.selectbox("Product", products, accept_new_options=True, key="batch_product")
+                production = st.date_input("Production date", value=today, max_value=today, format="DD.MM.YYYY", key="batch_production")
+                availability = st.radio("Brand availability", ["yes", "no"], horizontal=True, key="batch_availability")
+            with form_col2:
+                brand = st.selectbox("Brand", brands, accept_new_options=True, key="batch_brand")
+                price = st.number_input("product_price", min_value=0, step=1000, value=0, key="batch_price")
+                expire = st.date_input("Expire date", value=today + timedelta(days=60), format="DD.MM.YYYY", key="batch_expire")
+                discount = st.number_input("discount", min_value=0, max_value=100, step=1, key="batch_discount")
+            added = st.form_submit_button("Add to batch")
+
+        if added:
+            if expire < production:
+                st.error("Error: Expiration date cannot be earlier than production date!")
+            else:
+                st.session_state.entry_queue.append(manual_entry_record(
+                    categories[category], category, brand, product, price,
+                    production.strftime("%d.%m.%Y"), expire.strftime("%d.%m.%Y"), availability, discount
+                ))
+
+        queue = st.session_state.entry_queue
+        if queue:
+            st.write(f"**{len(queue)} products** waiting to be saved:")
+            st.dataframe(pd.DataFrame(queue), hide_index=True)
+            save_col, clear_col = st.columns(2)
+            with save_col:
+                if st.button("Save batch", key="batch_save"):
+                    # One locked write for the whole batch
+                    result = store.upsert(pd.DataFrame(queue))
+                    request_enrichment()
+                    st.session_state.entry_queue = []
+                    st.success(
+                        f"Batch saved: {result['inserted']} new, {result['updated']} updated, "
+                        f"{result['duplicates'] + result['batch_duplicates']} already saved."
+                    )
+            with clear_col:
+                if st.button("Clear batch", key="batch_clear"):
+                    st.session_state.entry_queue = []
+                    st.rerun()
                                 
                                 
               
@@ -2475,4 +2612,3 @@ def dat():
 #                                 st.success("Data submitted successfully")
 #                                 st.table(data)
 
-                  
\ No newline at end of file
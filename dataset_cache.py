@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+from snapshot import load_table
+
+
+class DatasetCache:
+    """
+    Process-wide cache of parsed product tables, shared by every session.
+
+    Entries are keyed on the file path and the requested columns and are
+    valid for one (size, mtime) signature of the file. Callers get a shallow
+    copy of the cached frame: no data is copied, and pandas 3's copy-on-write
+    makes any change a caller applies land in its own copy, never in the
+    shared one.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache"""
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_seconds = 0.0
+
+    def get(self, path, columns=None, loader=None):
+        """Return the table at path, loading it only if the file changed since the last load"""
+        key = _key(path, columns)
+        signature = _signature(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1].copy(deep=False)
+            # One loader per key; concurrent sessions asking for the same file wait for it
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == signature:
+                    self.hits += 1
+                    return entry[1].copy(deep=False)
+
+            started = time.perf_counter()
+            df = (loader or load_table)(path, columns)
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self.misses += 1
+                self.load_seconds += elapsed
+                self._entries[key] = (signature, df)
+        return df.copy(deep=False)
+
+    def key_lock(self, path, columns=None):
+        """Return the lock loads of path take; hold it while writing the file so no load sees it half built"""
+        with self._lock:
+            return self._loading.setdefault(_key(path, columns), threading.Lock())
+
+    def stats(self):
+        """Return hit/miss counters and the memory held by the cached frames"""
+        with self._lock:
+            frames = [entry[1] for entry in self._entries.values()]
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "entries": len(frames),
+                "memory_bytes": int(sum(df.memory_usage(deep=True).sum() for df in frames)),
+                "load_seconds": self.load_seconds,
+            }
+
+    def clear(self):
+        """Drop every cached frame"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _key(path, columns):
+    return os.path.abspath(path), tuple(columns) if columns else None
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+_cache = DatasetCache()
+
+
+def get_dataset(path, columns=None, loader=None):
+    """Return a shared read-only view of a product table from the process-wide cache"""
+    return _cache.get(path, columns, loader)
+
+
+def dataset_lock(path):
+    """Return the lock that serializes loading and rebuilding the table at path in this process"""
+    return _cache.key_lock(path)
+
+
+def cache_stats():
+    """Return the counters of the process-wide dataset cache"""
+    return _cache.stats()
+
+
+def clear_cache():
+    """Drop every table held by the process-wide dataset cache"""
+    _cache.clear()
@@ -0,0 +1,188 @@
+import os
+import threading
+
+import pandas as pd
+
+from catalog_db import get_catalog
+from dataset_cache import clear_cache, dataset_lock, get_dataset
+from file_utils import file_signature
+from filter_index import FilterIndex
+from option_index import HIERARCHY_LEVELS, OptionHierarchy
+from search_index import SearchIndex
+from suggest_index import SuggestIndex
+from snapshot import load_table
+from store_table import read_stores, stores_are_fresh, stores_path, write_stores
+
+
+# Every page reads the enriched table; the raw export is only used when it has not been built yet
+DATASET_FILES = ["enhanced_store_data.csv", "store_product_data.csv"]
+
+# Headers seen in older exports and uploads, mapped to the canonical column names
+COLUMN_ALIASES = {
+    "store name": "store_name",
+    "shop_name": "store_name",
+    "latitude": "location_lat",
+    "longitude": "location_long",
+    "product_category": "product_group",
+}
+
+REQUIRED_COLUMNS = ["product_group", "product_brand", "product_name"]
+
+# Column names the map page works with
+GEO_COLUMNS = {"store_name": "shop_name", "location_lat": "latitude", "location_long": "longitude"}
+
+
+def dataset_path():
+    """Return the product table every page should read"""
+    for path in DATASET_FILES:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(DATASET_FILES[0])
+
+
+def dataset_version():
+    """Return (path, size, mtime) of the product table; it changes whenever the table is rewritten"""
+    path = dataset_path()
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def map_columns(df):
+    """Rename aliased or differently spelled headers to the canonical column names"""
+    df = df.rename(columns=lambda col: str(col).strip().lower())
+    df = df.rename(columns={alias: name for alias, name in COLUMN_ALIASES.items() if name not in df.columns})
+
+    # Fall back to matching names with the underscores removed, e.g. 'ProductGroup'
+    mapping = {}
+    for required in REQUIRED_COLUMNS:
+        if required not in df.columns:
+            matches = [col for col in df.columns if required.replace("_", "") in col.replace("_", "")]
+            if matches:
+                mapping[matches[0]] = required
+    return df.rename(columns=mapping)
+
+
+def _load(path, columns=None):
+    df = map_columns(load_table(path))
+    for col in df.columns:
+        # Snapshot columns already arrive typed
+        if "date" in col and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
+def get_products(columns=None):
+    """
+    Return a read-only view of the product table, typed and with canonical columns.
+
+    The table is parsed once per process and file version and shared by all
+    sessions; selecting columns or renaming them does not copy the data.
+    """
+    df = get_dataset(dataset_path(), loader=_load)
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+    return df
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_building = {}
+
+
+def _get_index(index_class, columns=None, version=None):
+    """
+    Return the shared index_class of the product table, built once per file version.
+
+    With a version, return the index of exactly that version, or None when
+    the table has been rewritten since and only a newer one can be built.
+    """
+    current = dataset_version()
+    wanted = version or current
+    key = (index_class, wanted[0])
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry is not None and entry[0] == wanted:
+            return entry[1]
+        if wanted != current:
+            return None
+        # One build per kind of index; sessions asking for another kind do not wait for it
+        build_lock = _building.setdefault(index_class, threading.Lock())
+
+    with build_lock:
+        with _indexes_lock:
+            entry = _indexes.get(key)
+        if entry is None or entry[0] != wanted:
+            df = get_products(columns)
+            if dataset_version() == wanted:
+                index = index_class(df, version=wanted)
+                with _indexes_lock:
+                    # Only the latest version of each file is kept
+                    entry = _indexes[key] = (wanted, index)
+            else:
+                entry = None
+    if entry is None:
+        # Rewritten while it was read; the rows may belong to the newer version
+        return _get_index(index_class, columns, version)
+    return entry[1]
+
+
+def get_products_index():
+    """Return the shared filter index of the product table, built once per file version"""
+    return _get_index(FilterIndex)
+
+
+def get_products_hierarchy():
+    """Return the shared group -> brand -> product option tree, built once per file version"""
+    return _get_index(OptionHierarchy, HIERARCHY_LEVELS)
+
+
+def get_products_search(version=None):
+    """
+    Return the shared n-gram search index of the product table's text columns, built once per file version.
+
+    Pass the version of the filter index whose row positions will be ranked;
+    None comes back when the table has been rewritten since.
+    """
+    return _get_index(SearchIndex, version=version)
+
+
+def get_products_suggest():
+    """Return the shared product, brand and store name autocomplete, built once per file version"""
+    return _get_index(SuggestIndex)
+
+
+def get_stores():
+    """
+    Return the canonical stores table: store_id, store_name, location_lat,
+    location_long and products, one row per store.
+
+    It is written next to the product table the first time a new version
+    of that table is read, and keeps the location each store was first given.
+    """
+    path = dataset_path()
+    if not stores_are_fresh(path):
+        # One rebuild at a time; sessions that waited for it find the table fresh
+        with dataset_lock(stores_path(path)):
+            if not stores_are_fresh(path):
+                # Taken before the rows are read, so a newer table only causes one extra rebuild
+                source = file_signature(path)
+                write_stores(path, get_products(list(GEO_COLUMNS)), source)
+    return get_dataset(stores_path(path), loader=read_stores)
+
+
+def get_geo_view():
+    """Return every store once with its location, under the column names the map page uses"""
+    return get_stores().rename(columns=GEO_COLUMNS)
+
+
+def get_products_catalog():
+    """Return the SQLite catalog of the product table, or None when that backend is not enabled"""
+    try:
+        return get_catalog(dataset_path())
+    except FileNotFoundError:
+        return None
+
+
+def refresh():
+    """Drop the cached tables so the next request reloads them even if the files look unchanged"""
+    clear_cache()
@@ -0,0 +1,198 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from file_utils import atomic_write_bytes
+from normalize import ENHANCED_COLUMNS, canonicalize
+
+
+# A product row is identified by where it is sold, what it is and its batch dates
+IDENTITY_COLUMNS = ["store_name", "product_brand", "product_name", "date_of_manufacture", "date_of_expiry"]
+
+# Key recorded for rows that are never superseded (duplicates already in the store when the index was built)
+NO_KEY = 0
+
+# Floats are hashed at this many decimals; XLSX and CSV round trips disagree in the last bits
+HASH_DECIMALS = 9
+
+# Bumped whenever identity_hashes changes, so indexes built with the old hashes are rebuilt
+HASH_VERSION = 2
+
+_ENTRY = np.dtype([("key", "<u8"), ("row", "<u8")])
+
+
+def identity_hashes(df):
+    """
+    Return (key_hashes, row_hashes) as uint64 arrays for a batch of rows.
+
+    Both are computed on the canonical form of each row, so a manual entry
+    and an uploaded row describing the same product get the same key, and
+    '5 sum' and 5.0 hash to the same row. Floats are rounded to
+    HASH_DECIMALS first, so 41.399210849235125 read back from an XLSX
+    matches the 41.39921084923512 stored from the CSV.
+    """
+    canonical = canonicalize(df)
+    floats = canonical.select_dtypes("float").columns
+    canonical[floats] = canonical[floats].round(HASH_DECIMALS)
+    keys = pd.util.hash_pandas_object(canonical[IDENTITY_COLUMNS], index=False).to_numpy(np.uint64, copy=True)
+    rows = pd.util.hash_pandas_object(canonical[ENHANCED_COLUMNS], index=False).to_numpy(np.uint64, copy=True)
+    # Keep the sentinel free for rows that must not be deduplicated
+    keys[keys == NO_KEY] = 1
+    return keys, rows
+
+
+def _pairs(keys, rows):
+    pairs = np.empty(len(keys), dtype=_ENTRY)
+    pairs["key"] = keys
+    pairs["row"] = rows
+    return pairs
+
+
+class DedupIndex:
+    """
+    On-disk map from product identity to the hash of its latest stored row.
+
+    The file is a JSON header line followed by one fixed-size (key, row) hash
+    pair per stored row, in store order, so entry i describes row i of the
+    CSV plus journal. A later pair with the same key supersedes the earlier
+    row. Writers append pairs, and each process replays only the bytes it
+    has not seen yet, so keeping the map current costs O(batch).
+
+    The header records the store generation the index was built against and
+    how many rows that generation's CSV holds, like the store journal does,
+    so touching or copying the CSV never invalidates it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.base_rows = 0
+        self._offset = None
+        self._header = None
+        self._inode = None
+
+    def _read_header(self):
+        try:
+            with open(self.path, "rb") as f:
+                header = f.readline()
+        except FileNotFoundError:
+            return None, b""
+        try:
+            info = json.loads(header)
+        except ValueError:
+            return None, header
+        return (info if isinstance(info, dict) else None), header
+
+    def is_current(self, generation):
+        """Whether the file on disk was built for the given store generation with the current hashes"""
+        info, _ = self._read_header()
+        return info is not None and info.get("_generation") == generation and info.get("hashes") == HASH_VERSION
+
+    def unkeyed(self, count):
+        """
+        Return which of count rows the file on disk marks with NO_KEY, or None
+        when it does not describe exactly count rows. Lets a rebuild keep the
+        rows that were never deduplicated apart from superseded ones.
+        """
+        info, header = self._read_header()
+        if info is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(len(header))
+            data = f.read()
+        if len(data) != count * _ENTRY.itemsize:
+            return None
+        return np.frombuffer(data, dtype=_ENTRY)["key"] == NO_KEY
+
+    def load(self):
+        """Read entries appended since the last call into memory"""
+        with open(self.path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            header = f.readline()
+            # A rewrite replaces the file, so start over when it is not the one we read before
+            if self._offset is None or self._inode != inode or self._header != header:
+                info = json.loads(header) if header.endswith(b"\n") else {}
+                self.entries = {}
+                self.base_rows = info.get("rows", 0)
+                self._inode = inode
+                self._header = header
+                self._offset = len(header)
+            f.seek(self._offset)
+            data = f.read()
+
+        # Ignore a torn trailing entry from a crashed writer
+        usable = len(data) - len(data) % _ENTRY.itemsize
+        self._remember(np.frombuffer(data[:usable], dtype=_ENTRY))
+        self._offset += usable
+
+    def _remember(self, pairs):
+        pairs = pairs[pairs["key"] != NO_KEY]
+        self.entries.update(zip(pairs["key"].tolist(), pairs["row"].tolist()))
+
+    def entry_count(self):
+        """Number of complete entries in the file, one per stored row"""
+        return (self._offset - len(self._header)) // _ENTRY.itemsize
+
+    def pairs(self):
+        """Return every loaded entry as a structured array with key and row fields"""
+        with open(self.path, "rb") as f:
+            f.seek(len(self._header))
+            data = f.read(self._offset - len(self._header))
+        return np.frombuffer(data, dtype=_ENTRY)
+
+    def keep_mask(self):
+        """Boolean array over all stored rows, False where a later row supersedes it"""
+        keys = self.pairs()["key"]
+        return (keys == NO_KEY) | ~pd.Series(keys).duplicated(keep="last").to_numpy()
+
+    def classify(self, keys, rows):
+        """
+        Split a batch into inserts, updates and exact duplicates.
+
+        Returns (write_mask, stats). Only the last occurrence of a key inside
+        the batch is considered; earlier ones count as batch duplicates.
+        """
+        last_in_batch = ~pd.Series(keys).duplicated(keep="last").to_numpy()
+        stored = np.fromiter((self.entries.get(key, 0) for key in keys.tolist()), dtype=np.uint64, count=len(keys))
+        known = np.fromiter((key in self.entries for key in keys.tolist()), dtype=bool, count=len(keys))
+
+        inserted = last_in_batch & ~known
+        updated = last_in_batch & known & (stored != rows)
+        duplicates = last_in_batch & known & (stored == rows)
+        stats = {
+            "rows": len(keys),
+            "inserted": int(inserted.sum()),
+            "updated": int(updated.sum()),
+            "duplicates": int(duplicates.sum()),
+            "batch_duplicates": int((~last_in_batch).sum()),
+        }
+        return inserted | updated, stats
+
+    def append(self, keys, rows):
+        """Record one (key, row) pair per newly stored row, on disk and in memory"""
+        if len(keys) == 0:
+            return
+        pairs = _pairs(keys, rows)
+        with open(self.path, "r+b") as f:
+            # Drop a torn entry first so the file stays aligned with the store rows
+            f.truncate(self._offset)
+            f.seek(self._offset)
+            f.write(pairs.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._remember(pairs)
+        self._offset += pairs.nbytes
+
+    def rewrite(self, generation, base_rows, keys, rows):
+        """Replace the file with entries for every stored row, base_rows of them in the CSV"""
+        header = (json.dumps({"_generation": generation, "rows": base_rows, "hashes": HASH_VERSION}) + "\n").encode("utf-8")
+        pairs = _pairs(keys, rows)
+        atomic_write_bytes(self.path, header + pairs.tobytes())
+        self.entries = {}
+        self._remember(pairs)
+        self.base_rows = base_rows
+        self._inode = os.stat(self.path).st_ino
+        self._header = header
+        self._offset = len(header) + pairs.nbytes
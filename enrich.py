@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from dedup_index import HASH_VERSION, NO_KEY, identity_hashes
+from normalize import ENHANCED_COLUMNS, normalize_products, write_csv_chunk
+from model_registry import get_model
+from file_utils import FileLock, atomic_replace, atomic_write_bytes, temp_path
+
+
+ENHANCED_FILE = "enhanced_store_data.csv"
+
+# Seconds the enrichment thread waits after a request, so a burst of submits becomes one append
+ENRICH_DELAY = 30
+
+# Same defaults as the dashboard's ML threshold sliders
+ULTRA_DISCOUNT_THRESHOLD = 20.0
+MAX_DISCOUNT = 50.0
+# Products with less than this share of their shelf life left get a discount
+DISCOUNT_SHELF_LIFE_SHARE = 0.5
+
+# Features the discount model was trained on
+MODEL_FEATURES = ["sales_volume", "product_price", "duration_of_expiry", "days_to_expiry", "is_discount"]
+
+_STATE = np.dtype([("key", "<u8"), ("row", "<u8")])
+
+
+def _predict_discount(features, model):
+    """Discount percentage from the ML model, or from the rule of thumb fitted to enhanced_store_data.csv"""
+    if model is not None:
+        names = list(getattr(model, "feature_names_in_", MODEL_FEATURES))
+        try:
+            return pd.Series(model.predict(features[names].fillna(0)), index=features.index)
+        except (KeyError, ValueError):
+            pass
+    share_left = features["days_to_expiry"] / features["duration_of_expiry"].where(features["duration_of_expiry"] > 0)
+    estimate = (23 - 10 * share_left.fillna(0) + 4 * features["sales_volume"].fillna(0) / 100
+                - 3 * features["days_to_expiry"] / 365)
+    return estimate.round(1)
+
+
+def derive_columns(df, reference_date=None, model=None):
+    """
+    Fill the derived columns of normalized rows, the ones app.py describes.
+
+    Values already present in the rows are kept; only missing ones are
+    computed. Expired products get the maximum discount and products that
+    are still on sale past reference_date keep last_status "yes".
+    """
+    out = df.copy()
+    reference = pd.Timestamp(reference_date if reference_date is not None else pd.Timestamp.today()).normalize()
+
+    days_left = (out["date_of_expiry"] - reference).dt.days
+    expired = days_left < 0
+    share_left = days_left / out["duration_of_expiry"].where(out["duration_of_expiry"] > 0)
+    wants_discount = expired | (share_left < DISCOUNT_SHELF_LIFE_SHARE)
+    out["discount"] = out["discount"].fillna(pd.Series(np.where(wants_discount, "yes", "no"), index=out.index))
+    is_discount = out["discount"] == "yes"
+
+    features = pd.DataFrame({
+        "sales_volume": out["sales_volume"],
+        "product_price": out["product_price"],
+        "duration_of_expiry": out["duration_of_expiry"],
+        "days_to_expiry": days_left,
+        "is_discount": is_discount.astype(int),
+    })
+    predicted = _predict_discount(features, model).clip(0, MAX_DISCOUNT).where(~expired, MAX_DISCOUNT)
+    out["discount_percentage"] = out["discount_percentage"].fillna(predicted.where(is_discount, 0.0))
+    out["discount_price"] = out["discount_price"].fillna(out["product_price"] * out["discount_percentage"] / 100)
+
+    on_sale = (out["status"] == "yes") & ~expired
+    out["last_status"] = out["last_status"].fillna(pd.Series(np.where(on_sale, "yes", "no"), index=out.index))
+
+    ultra = out["discount_percentage"].where(out["discount_percentage"] > ULTRA_DISCOUNT_THRESHOLD, 0.0)
+    out["ultra_discount_percentage"] = out["ultra_discount_percentage"].fillna(ultra)
+    out["ultra_discount"] = out["ultra_discount"].fillna(out["product_price"] * out["ultra_discount_percentage"] / 100)
+    return out[ENHANCED_COLUMNS]
+
+
+def _state_file(enhanced_file):
+    # Row hashes of another HASH_VERSION never match; a new version starts over as a first run
+    return f"{enhanced_file}.enriched-{HASH_VERSION}"
+
+
+def _read_state(enhanced_file):
+    try:
+        state = np.fromfile(_state_file(enhanced_file), dtype=np.uint8)
+    except FileNotFoundError:
+        return None
+    # Ignore a torn trailing entry
+    usable = len(state) - len(state) % _STATE.itemsize
+    return state[:usable].view(_STATE)
+
+
+def _append_state(enhanced_file, keys, rows):
+    state = np.empty(len(keys), dtype=_STATE)
+    state["key"] = keys
+    state["row"] = rows
+    with open(_state_file(enhanced_file), "ab") as f:
+        f.write(state.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _mark_file(enhanced_file):
+    return enhanced_file + ".mark"
+
+
+def _read_mark(enhanced_file):
+    try:
+        with open(_mark_file(enhanced_file), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def seed_enrichment(store, enhanced_file=ENHANCED_FILE):
+    """
+    Mark the rows already in the store as enriched, the first time only.
+
+    The existing enhanced file was built offline from those rows, so only
+    rows written after this call are enriched by enrich_new_rows.
+    """
+    if os.path.exists(_state_file(enhanced_file)):
+        return
+    with FileLock(enhanced_file + ".lock"):
+        if not os.path.exists(_state_file(enhanced_file)):
+            _append_state(enhanced_file, *store.index_entries())
+
+
+def _drop_products(enhanced_file, keys, chunk_rows):
+    """Rewrite the enhanced file without the rows of the given product keys"""
+    tmp_path = temp_path(enhanced_file)
+    dropped = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+        header = True
+        for chunk in pd.read_csv(enhanced_file, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            stale = np.isin(identity_hashes(chunk.replace("", np.nan))[0], keys)
+            dropped += int(stale.sum())
+            chunk[~stale].to_csv(out, header=header, index=False)
+            header = False
+        out.flush()
+        os.fsync(out.fileno())
+    atomic_replace(tmp_path, enhanced_file)
+    return dropped
+
+
+def _append_enhanced(enhanced_file, df):
+    exists = os.path.exists(enhanced_file) and os.path.getsize(enhanced_file) > 0
+    if exists:
+        df = df.reindex(columns=pd.read_csv(enhanced_file, nrows=0).columns)
+    with open(enhanced_file, "ab") as out:
+        if exists:
+            with open(enhanced_file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write(b"\n")
+        write_csv_chunk(df, out, header=not exists)
+        out.flush()
+        os.fsync(out.fileno())
+
+
+def enrich_new_rows(store, enhanced_file=ENHANCED_FILE, reference_date=None, chunk_rows=50_000):
+    """
+    Compute the derived columns for rows written to the store since the last
+    run and append them to the enhanced file.
+
+    Only the new rows are normalized and enriched. When a new row is an
+    updated version of a product already in the enhanced file, the old row
+    is removed first, which is the only case that rewrites the file.
+    The store position reached is kept as a mark, so a run reads only the
+    rows after it; the row hashes of every enriched row are only compared
+    on the first run after a compaction renumbered the store.
+
+    Every run that appends rows changes the enhanced file, so the next read
+    of dataset_service rebuilds its snapshot and indexes once.
+    Returns a dict with the number of new, appended, replaced and rejected rows.
+    """
+    stats = {"rows": 0, "appended": 0, "replaced": 0, "rejected": 0}
+    with FileLock(enhanced_file + ".lock"):
+        previous = _read_mark(enhanced_file)
+        new = store.read_since(previous, chunk_rows) if previous is not None else None
+        if new is not None:
+            rows, keys, hashes, known, mark = new
+        else:
+            state = _read_state(enhanced_file)
+            if state is None:
+                # First run: nothing to catch up on yet
+                _append_state(enhanced_file, *store.index_entries())
+                return stats
+            rows, keys, hashes, mark = store.read_new(state["row"], chunk_rows)
+            known = np.isin(keys, state["key"][state["key"] != NO_KEY])
+        stats["rows"] = len(rows)
+
+        if len(rows):
+            normalized, rejected = normalize_products(rows)
+            stats["rejected"] = len(rejected)
+            if len(normalized):
+                enriched = derive_columns(normalized, reference_date, get_model())
+                positions = normalized.index.to_numpy()
+                updated = keys[positions][known[positions]]
+                if len(updated) and os.path.exists(enhanced_file):
+                    stats["replaced"] = _drop_products(enhanced_file, updated, chunk_rows)
+                _append_enhanced(enhanced_file, enriched)
+                stats["appended"] = len(enriched)
+
+            # Recorded after the rows are written: a crash in between enriches them again rather than losing them
+            _append_state(enhanced_file, keys, hashes)
+        if mark != previous:
+            atomic_write_bytes(_mark_file(enhanced_file), json.dumps(mark).encode("utf-8"))
+    return stats
+
+
+_enrichers = {}
+_enrichers_lock = threading.Lock()
+
+
+def start_enrichment(store, enhanced_file=ENHANCED_FILE, delay=ENRICH_DELAY):
+    """
+    Seed the enrichment state and start the process-wide enrichment thread of
+    enhanced_file, the first time only.
+
+    Every run that appends rows changes the enhanced file, and dataset_service
+    then rebuilds its snapshot and indexes once (about 15 s at 1M rows). The
+    thread therefore waits delay seconds after a request_enrichment() before
+    running enrich_new_rows, so all submits of that window cost one append
+    and one rebuild instead of one per submit.
+    """
+    enhanced_file = os.path.abspath(enhanced_file)
+    with _enrichers_lock:
+        if enhanced_file in _enrichers:
+            return
+        seed_enrichment(store, enhanced_file)
+        pending = _enrichers[enhanced_file] = threading.Event()
+        # Catch up on rows stored while no process was enriching
+        pending.set()
+        threading.Thread(target=_enrichment_loop, args=(store, enhanced_file, delay, pending),
+                         name="enrichment", daemon=True).start()
+
+
+def request_enrichment(enhanced_file=ENHANCED_FILE):
+    """Have the enrichment thread pick up newly stored rows after its delay"""
+    with _enrichers_lock:
+        pending = _enrichers.get(os.path.abspath(enhanced_file))
+    if pending is not None:
+        pending.set()
+
+
+def _enrichment_loop(store, enhanced_file, delay, pending):
+    while True:
+        pending.wait()
+        # Requests made while waiting join this run
+        time.sleep(delay)
+        pending.clear()
+        try:
+            enrich_new_rows(store, enhanced_file)
+        except Exception:
+            # The rows stay in the store; the next request retries them
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from product_store import ProductStore
+
+    parser = argparse.ArgumentParser(description="Append enriched rows for new products to enhanced_store_data.csv")
+    parser.add_argument("source", nargs="?", default="products_data.csv")
+    parser.add_argument("enhanced", nargs="?", default=ENHANCED_FILE)
+    parser.add_argument("--reference-date", default=None)
+    args = parser.parse_args()
+
+    stats = enrich_new_rows(ProductStore(args.source, dedup=True), args.enhanced, args.reference_date)
+    print(f"{stats['rows']} new rows: appended {stats['appended']}, replaced {stats['replaced']}, rejected {stats['rejected']}")
@@ -0,0 +1,85 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Exclusive lock on a side file, shared by threads and processes.
+
+    Uses flock on POSIX and msvcrt.locking on Windows. Every open of the lock
+    file gets its own lock, so two Streamlit sessions in the same process
+    exclude each other just like two separate processes do.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _fsync_dir(path):
+    """Flush a directory entry so a rename survives a crash (no-op on Windows)"""
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_signature(path):
+    """Size and nanosecond mtime of a file as bytes; a derived file records it to tell whether it is stale"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}".encode("ascii")
+
+
+def temp_path(path):
+    """Temp file next to path, unique to this process and thread, for atomic_replace"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def atomic_replace(tmp_path, path):
+    """Move a fully written temp file over its target in one atomic step"""
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def atomic_write_bytes(path, data):
+    """Replace a file with new contents so readers see either the old or the new version"""
+    tmp_path = temp_path(path)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    atomic_replace(tmp_path, path)
@@ -0,0 +1,229 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """
+    Bitmap index over one version of the product table.
+
+    Equality filters are answered from one packed bitset per (column, value),
+    range filters from a sorted permutation of the column, so any combination
+    of filters costs a few vectorized ANDs over n/8 bytes and one take. A
+    narrow range is resolved from its slice of row ids alone, without
+    touching the other rows. The per-column structures are built on first
+    use, which for the slider columns is the first page load, and kept for
+    the lifetime of the index; the frame itself is never modified.
+    """
+
+    # A range slice narrower than this share of the rows is checked row by row instead of as a bitmap
+    SLICE_FRACTION = 1 / 16
+
+    def __init__(self, df, version=None):
+        """Index df; nothing is computed until a column is first filtered on"""
+        self.df = df
+        self.version = version
+        self.rows = len(df)
+        self._codes = {}
+        self._bitmaps = {}
+        self._sorted = {}
+        self._lock = threading.Lock()
+
+    def _column_codes(self, column):
+        """Integer code of every row and the value each code stands for"""
+        codes = self._codes.get(column)
+        if codes is None:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes = (values.cat.codes.to_numpy(), values.cat.categories)
+            else:
+                codes = pd.factorize(values)
+            self._codes[column] = codes
+        return codes
+
+    def bitmap(self, column, value):
+        """Packed bitset of the rows where column == value"""
+        key = (column, value)
+        with self._lock:
+            bits = self._bitmaps.get(key)
+            if bits is None:
+                codes, uniques = self._column_codes(column)
+                matches = np.flatnonzero(uniques == value)
+                # Missing values have code -1 and never match
+                hit = codes == matches[0] if len(matches) else np.zeros(self.rows, dtype=bool)
+                bits = self._bitmaps[key] = np.packbits(hit)
+            return bits
+
+    def _sorted_column(self, column):
+        """
+        Return (sorted values, row of each sorted value, number of non-missing
+        values, column values in row order); missing values sort last.
+        """
+        with self._lock:
+            entry = self._sorted.get(column)
+            if entry is None:
+                values = self.df[column].to_numpy()
+                order = np.argsort(values, kind="stable")
+                present = int(np.count_nonzero(pd.notna(values)))
+                entry = self._sorted[column] = (values[order], order, present, values)
+            return entry
+
+    def _bounds(self, column, low, high):
+        """Translate a (low, high) filter into [low, stop) bounds in the column's own dtype"""
+        values = self._sorted_column(column)[0]
+        if np.issubdtype(values.dtype, np.datetime64):
+            # The dashboard passes dates; a date range covers its whole last day
+            low = np.datetime64(pd.Timestamp(low), "ns").astype(values.dtype)
+            stop = np.datetime64(pd.Timestamp(high) + pd.Timedelta(days=1), "ns").astype(values.dtype)
+            return low, stop, "left"
+        return low, high, "right"
+
+    def range_rows(self, column, low, high):
+        """Row ids with low <= column <= high, as a slice of the sorted permutation (not in row order)"""
+        values, order, _, _ = self._sorted_column(column)
+        low, stop, side = self._bounds(column, low, high)
+        return order[np.searchsorted(values, low, "left"):np.searchsorted(values, stop, side)]
+
+    def value_range(self, column):
+        """Smallest and largest non-missing value of a column, or (None, None) when it has none"""
+        values, _, present, _ = self._sorted_column(column)
+        if not present:
+            return None, None
+        return values[0], values[present - 1]
+
+    def _in_range(self, rows, column, low, high):
+        """Which of the given rows fall inside a range filter"""
+        raw = self._sorted_column(column)[3][rows]
+        low, stop, side = self._bounds(column, low, high)
+        return (raw >= low) & ((raw < stop) if side == "left" else (raw <= stop))
+
+    def positions(self, filters, trace=None):
+        """
+        Row positions matching every filter: {column: value} for equality,
+        {column: (low, high)} for ranges. When trace is a list, one
+        (step, rows or None, seconds) entry is appended per stage.
+        """
+        bits = None
+        ranges = []
+        for column, value in filters.items():
+            started = time.perf_counter()
+            if isinstance(value, tuple):
+                rows = self.range_rows(column, *value)
+                # A range covering every row filters nothing
+                if len(rows) < self.rows:
+                    ranges.append((len(rows), column, value, rows))
+                _trace(trace, f"range {column} in [{value[0]}, {value[1]}]", len(rows), started)
+                continue
+            other = self.bitmap(column, value)
+            bits = other.copy() if bits is None else np.bitwise_and(bits, other, out=bits)
+            _trace(trace, f"bitmap {column} == {value!r}", None, started)
+
+        started = time.perf_counter()
+        ranges.sort(key=lambda entry: entry[0])
+        if ranges and ranges[0][0] <= self.rows * self.SLICE_FRACTION:
+            # Narrow range: start from its row ids and check only those rows against the other filters
+            rows = np.sort(ranges[0][3])
+            for _, column, (low, high), _ in ranges[1:]:
+                rows = rows[self._in_range(rows, column, low, high)]
+            if bits is not None:
+                rows = rows[(bits[rows >> 3] >> (7 - (rows & 7))) & 1 == 1]
+            _trace(trace, f"check {ranges[0][0]} rows of the {ranges[0][1]} slice", len(rows), started)
+            return rows
+
+        for _, _, _, rows in ranges:
+            hit = np.zeros(self.rows, dtype=bool)
+            hit[rows] = True
+            other = np.packbits(hit)
+            bits = other if bits is None else np.bitwise_and(bits, other, out=bits)
+        if bits is None:
+            rows = np.arange(self.rows)
+        else:
+            rows = np.flatnonzero(np.unpackbits(bits, count=self.rows))
+        _trace(trace, f"AND {len(ranges)} range bitmaps and unpack", len(rows), started)
+        return rows
+
+    def select(self, filters):
+        """Rows of the indexed frame matching the filters, taken in one pass"""
+        return self.df.take(self.positions(filters))
+
+
+def _trace(trace, step, rows, started):
+    if trace is not None:
+        trace.append((step, rows, time.perf_counter() - started))
+
+
+def _mask_chain(df, filters):
+    """The dashboard's previous filter: one comparison pass over the frame per filter"""
+    mask = pd.Series(True, index=df.index)
+    for column, value in filters.items():
+        if isinstance(value, tuple):
+            values = df[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                values = values.dt.date
+            mask &= (values >= value[0]) & (values <= value[1])
+        else:
+            mask &= df[column] == value
+    return df[mask]
+
+
+def benchmark(sizes=(5_000, 1_000_000, 10_000_000), repeats=3):
+    """Time the mask chain against the bitmap index on the product table resampled to each size"""
+    from dataset_service import get_products
+
+    columns = ["store_name", "product_group", "product_brand", "status", "discount",
+               "sales_volume", "product_price", "date_of_manufacture"]
+    base = get_products(columns)
+    first = base.iloc[0]
+    dates = base["date_of_manufacture"]
+    filter_sets = {
+        "all filters": {
+            "date_of_manufacture": (dates.quantile(0.1).date(), dates.quantile(0.9).date()),
+            "store_name": first["store_name"],
+            "product_group": first["product_group"],
+            "status": "yes",
+            "discount": "yes",
+            "sales_volume": (int(base["sales_volume"].quantile(0.2)), int(base["sales_volume"].max())),
+            "product_price": (float(base["product_price"].min()), float(base["product_price"].quantile(0.8))),
+        },
+        "narrow price": {
+            "store_name": first["store_name"],
+            "product_price": (float(base["product_price"].quantile(0.98)), float(base["product_price"].max())),
+        },
+    }
+
+    print(f"{'filters':<14}{'rows':>12}{'chain ms':>11}{'index ms':>11}{'cold ms':>11}{'matches':>10}")
+    for size in sizes:
+        df = base.sample(size, replace=True, random_state=0, ignore_index=True)
+        index = FilterIndex(df)
+        for name, filters in filter_sets.items():
+            started = time.perf_counter()
+            for _ in range(repeats):
+                expected = _mask_chain(df, filters)
+            chain = (time.perf_counter() - started) / repeats
+
+            # The first query builds the structures it needs
+            started = time.perf_counter()
+            index.positions(filters)
+            cold = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for _ in range(repeats):
+                result = index.select(filters)
+            indexed = (time.perf_counter() - started) / repeats
+
+            assert result.index.equals(expected.index)
+            print(f"{name:<14}{size:>12,}{chain * 1000:>11.1f}{indexed * 1000:>11.1f}{cold * 1000:>11.1f}{len(result):>10,}")
+            del expected, result
+        del df, index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the bitmap filter index against the mask chain")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.sizes, args.repeats)
@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points, in one vectorized pass"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest(lat, lon, lats, lons, k, skip=None):
+    """
+    Positions of the k points closest to (lat, lon), nearest first, and
+    their distances in km. Points where skip is True and points without
+    coordinates are never returned.
+    """
+    distances = haversine_km(lat, lon, lats, lons)
+    excluded = np.isnan(distances) if skip is None else np.isnan(distances) | skip
+    distances[excluded] = np.inf
+    k = min(k, len(distances) - int(np.count_nonzero(excluded)))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    # Only the k smallest are sorted; the rest of the array is never ordered
+    top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+    top = top[np.argsort(distances[top], kind="stable")]
+    return top, distances[top]
+
+
+def _loop_nearest(df, shop, k=4):
+    """The map page's previous search: a Python haversine per product row and a sort of all of them"""
+    from math import asin, cos, radians, sin, sqrt
+
+    def haversine_distance(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        return 2 * asin(sqrt(a)) * EARTH_RADIUS_KM
+
+    base = df[df["shop_name"] == shop].iloc[0]
+    distances = []
+    for _, row in df.iterrows():
+        if row["shop_name"] == shop and row["latitude"] == base["latitude"] and row["longitude"] == base["longitude"]:
+            continue
+        distance = haversine_distance(base["latitude"], base["longitude"], row["latitude"], row["longitude"])
+        distances.append((row["shop_name"], row["latitude"], row["longitude"], distance))
+    return sorted(distances, key=lambda entry: entry[3])[:k]
+
+
+def _vector_nearest(df, shop, k=4):
+    """The map page's search now: drop repeated store points, then one vectorized pass and a partial sort"""
+    points = df[["shop_name", "latitude", "longitude"]].drop_duplicates()
+    base = points[points["shop_name"] == shop].iloc[0]
+    lats, lons = points["latitude"].to_numpy(), points["longitude"].to_numpy()
+    skip = (points["shop_name"] == shop).to_numpy() & (lats == base["latitude"]) & (lons == base["longitude"])
+    top, distances = nearest(base["latitude"], base["longitude"], lats, lons, k, skip)
+    return [(name, lat, lon, distance) for (name, lat, lon), distance in zip(points.iloc[top].itertuples(index=False), distances)]
+
+
+def benchmark(sizes=(5_000, 100_000), k=4, repeats=3):
+    """Time the row loop against the vectorized kernel on the store coordinates resampled to each size"""
+    from dataset_service import GEO_COLUMNS, get_geo_view, get_products
+
+    # The product rows, as the map page read them before the stores table
+    base = get_products(list(GEO_COLUMNS)).rename(columns=GEO_COLUMNS).dropna()
+    shop = base["shop_name"].iloc[0]
+    print(f"{'rows':>10}{'points':>10}{'loop ms':>11}{'vector ms':>11}  nearest")
+    for size in sizes:
+        df = base.sample(size, replace=True, random_state=0, ignore_index=True)
+
+        started = time.perf_counter()
+        # The loop sorts every row anyway; keep the whole order to compare against
+        expected = _loop_nearest(df, shop, None)
+        loop = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            result = _vector_nearest(df, shop, k)
+        vector = (time.perf_counter() - started) / repeats
+
+        # The loop lists a store point once per product row at it; compare against its distinct points
+        distinct = list(dict.fromkeys(expected))[:k]
+        assert np.allclose([entry[3] for entry in result], [entry[3] for entry in distinct])
+        points = len(df[["shop_name", "latitude", "longitude"]].drop_duplicates())
+        print(f"{size:>10,}{points:>10,}{loop * 1000:>11.1f}{vector * 1000:>11.2f}  {result[0][0]} {result[0][3]:.2f} km")
+
+    # What the page does now: one point per store from the stores table
+    stores = get_geo_view()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = _vector_nearest(stores, shop, k)
+    vector = (time.perf_counter() - started) / repeats
+    print(f"{'stores':>10}{len(stores):>10,}{'':>11}{vector * 1000:>11.2f}  {result[0][0]} {result[0][3]:.2f} km")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the nearest-store search against the row loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5_000, 100_000])
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.sizes, args.k, args.repeats)
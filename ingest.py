@@ -0,0 +1,356 @@
+import codecs
+import hashlib
+import io
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from dedup_index import identity_hashes
+from normalize import canonicalize
+
+
+def _latin1_fallback(error):
+    return error.object[error.start:error.end].decode("iso-8859-1"), error.end
+
+
+# Exports come as UTF-8 or as ISO-8859-1; bytes that are not valid UTF-8 are read as ISO-8859-1, so
+# neither 'Nestlé' turns into 'NestlÃ©' nor an old export fails to load
+codecs.register_error("latin1_fallback", _latin1_fallback)
+
+CSV_READ_OPTIONS = {"encoding": "utf-8", "encoding_errors": "latin1_fallback", "sep": ",", "on_bad_lines": "skip"}
+CSV_SEGMENT_BYTES = 4 << 20
+
+
+def _file_size(uploaded_file):
+    size = getattr(uploaded_file, "size", None)
+    if size is None:
+        position = uploaded_file.tell()
+        uploaded_file.seek(0, 2)
+        size = uploaded_file.tell()
+        uploaded_file.seek(position)
+    return size or 1
+
+
+def _iter_csv_chunks(uploaded_file, chunk_rows):
+    size = _file_size(uploaded_file)
+    uploaded_file.seek(0)
+    # The context manager detaches pandas' text wrapper without closing the upload buffer
+    with pd.read_csv(uploaded_file, chunksize=chunk_rows, **CSV_READ_OPTIONS) as reader:
+        for chunk in reader:
+            yield chunk, min(uploaded_file.tell() / size, 1.0)
+
+
+def _row_boundaries(data, segment_bytes):
+    """Byte offsets of row starts about segment_bytes apart, the first one right after the header"""
+    boundaries = []
+    quoted = False
+    previous = 0
+    target = 0
+    while True:
+        newline = data.find(b"\n", target)
+        if newline == -1:
+            break
+        # Escaped quotes come in pairs, so an odd count since the last newline flips in and out of a
+        # quoted field; a newline inside one does not end the row
+        quoted ^= data.count(b'"', previous, newline) % 2 == 1
+        previous = newline
+        target = newline + 1
+        if not quoted:
+            boundaries.append(newline + 1)
+            target += segment_bytes
+    if not boundaries or boundaries[-1] < len(data):
+        boundaries.append(len(data))
+    return boundaries
+
+
+def _csv_segments(uploaded_file, segment_bytes):
+    """Return the header columns and a generator of (byte_offset, DataFrame) segments of a CSV upload"""
+    data = uploaded_file.getvalue()
+    boundaries = _row_boundaries(data, segment_bytes)
+    columns = list(pd.read_csv(io.BytesIO(data[:boundaries[0]]), nrows=0, **CSV_READ_OPTIONS).columns)
+
+    def segments():
+        for start, end in zip(boundaries, boundaries[1:]):
+            yield start, pd.read_csv(io.BytesIO(data[start:end]), header=None, names=columns, **CSV_READ_OPTIONS)
+
+    return columns, segments()
+
+
+def _iter_xlsx_chunks(uploaded_file, chunk_rows):
+    from openpyxl import load_workbook
+
+    uploaded_file.seek(0)
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = max((sheet.max_row or 0) - 1, 1)
+        rows = sheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+
+        batch = []
+        done = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                done += len(batch)
+                yield pd.DataFrame(batch, columns=columns), min(done / total_rows, 1.0)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns), 1.0
+    finally:
+        workbook.close()
+
+
+def upload_digest(uploaded_file):
+    """SHA-1 of an upload's contents; a different file under the same name and size gets a different digest"""
+    with uploaded_file.getbuffer() as data:
+        return hashlib.sha1(data).hexdigest()
+
+
+def iter_upload_chunks(uploaded_file, chunk_rows=50_000):
+    """Yield (DataFrame, fraction_done) batches of an uploaded CSV or XLSX file"""
+    if uploaded_file.name.endswith(".csv"):
+        return _iter_csv_chunks(uploaded_file, chunk_rows)
+    if uploaded_file.name.endswith(".xlsx"):
+        return _iter_xlsx_chunks(uploaded_file, chunk_rows)
+    raise ValueError(f"Unsupported file type: {uploaded_file.name}")
+
+
+def read_page(uploaded_file, start, rows, pages=None, chunk_rows=50_000):
+    """
+    Read rows [start, start + rows) of an upload, indexed by their position in the file.
+
+    pages is the checkpoint table validate_upload returns; with it a CSV page is
+    read from the nearest recorded row start instead of from the top of the file.
+    """
+    uploaded_file.seek(0)
+    if uploaded_file.name.endswith(".csv"):
+        # Count rows the way validate_upload and ingest_upload do: quoted newlines and skipped bad
+        # lines make physical line numbers drift from parsed row positions
+        offset, options = 0, {}
+        if pages and pages["rows"]:
+            segment = max(bisect_right(pages["rows"], start) - 1, 0)
+            offset, options = pages["rows"][segment], {"header": None, "names": pages["columns"]}
+            uploaded_file.seek(pages["offsets"][segment])
+        parts = []
+        empty = pd.DataFrame(columns=options.get("names", []))
+        # The context manager detaches pandas' text wrapper without closing the upload buffer
+        with pd.read_csv(uploaded_file, chunksize=chunk_rows, **options, **CSV_READ_OPTIONS) as reader:
+            for chunk in reader:
+                empty = chunk.iloc[:0]
+                if offset + len(chunk) > start:
+                    parts.append(chunk.iloc[max(start - offset, 0):start + rows - offset])
+                offset += len(chunk)
+                if offset >= start + rows:
+                    break
+        page = pd.concat(parts) if parts else empty
+    elif uploaded_file.name.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+            values = list(sheet.iter_rows(min_row=start + 2, max_row=start + rows + 1, values_only=True))
+        finally:
+            workbook.close()
+        page = pd.DataFrame(values, columns=columns)
+    else:
+        raise ValueError(f"Unsupported file type: {uploaded_file.name}")
+
+    uploaded_file.seek(0)
+    page.index = pd.RangeIndex(start, start + len(page))
+    return page
+
+
+def _any_present(df, columns):
+    present = pd.Series(False, index=df.index)
+    for col in columns:
+        if col in df.columns:
+            present |= df[col].notna()
+    return present
+
+
+def validate_upload(uploaded_file, known_brands=None, chunk_rows=50_000, max_examples=20, segment_bytes=CSV_SEGMENT_BYTES):
+    """
+    Check a whole upload in one streaming pass and return (total_rows, report, pages).
+
+    The report has one line per failed check with the number of rows and the
+    positions of the first max_examples of them, the same positions the
+    paginated preview shows. pages records the row position and byte offset of
+    each CSV segment for read_page; it is None for XLSX files, whose rows sit
+    in a compressed sheet that cannot be seeked into.
+    """
+    known = pd.Index(sorted(known_brands or []))
+    found = {}
+    total = 0
+    if uploaded_file.name.endswith(".csv"):
+        columns, segments = _csv_segments(uploaded_file, segment_bytes)
+        pages = {"columns": columns, "rows": [], "offsets": []}
+        chunks = ((chunk, byte_offset) for byte_offset, chunk in segments)
+    else:
+        pages = None
+        chunks = ((chunk, None) for chunk, _ in iter_upload_chunks(uploaded_file, chunk_rows))
+    for chunk, byte_offset in chunks:
+        if byte_offset is not None:
+            pages["rows"].append(total)
+            pages["offsets"].append(byte_offset)
+        chunk = chunk.rename(columns=lambda col: str(col).strip())
+        canonical = canonicalize(chunk)
+        positions = np.arange(total, total + len(chunk))
+        total += len(chunk)
+
+        checks = {
+            "Missing product name": canonical["product_name"].isna(),
+            "Negative price": canonical["product_price"] < 0,
+            "Unreadable manufacture date": canonical["date_of_manufacture"].isna() & _any_present(chunk, ["date_of_manufacture", "production_date"]),
+            "Unreadable expiry date": canonical["date_of_expiry"].isna() & _any_present(chunk, ["date_of_expiry", "expire_date"]),
+            "Expiry before manufacture": canonical["date_of_expiry"] < canonical["date_of_manufacture"],
+        }
+        if len(known):
+            brand = canonical["product_brand"]
+            checks["Unknown brand"] = brand.notna() & ~brand.isin(known)
+
+        for check, failed in checks.items():
+            failed = failed.fillna(False).to_numpy(bool)
+            count, examples = found.get(check, (0, []))
+            if len(examples) < max_examples:
+                examples = examples + positions[failed][:max_examples - len(examples)].tolist()
+            found[check] = (count + int(failed.sum()), examples)
+
+    uploaded_file.seek(0)
+    report = pd.DataFrame(
+        [(check, count, ", ".join(map(str, examples))) for check, (count, examples) in found.items() if count],
+        columns=["check", "rows", "first rows"]
+    )
+    return total, report, pages
+
+
+def new_upload_edits():
+    """Empty diff of preview edits: changed cells, deleted rows and added rows"""
+    return {"edited": {}, "deleted": set(), "added": []}
+
+
+def merge_editor_changes(edits, editor_state, positions):
+    """
+    Fold the changes of one st.data_editor page into the upload diff.
+
+    editor_state is the widget's session-state dict; its row numbers are
+    local to the page and are mapped back to file positions.
+    """
+    changed = False
+    for local, values in editor_state.get("edited_rows", {}).items():
+        edits["edited"].setdefault(positions[int(local)], {}).update(values)
+        changed = True
+    for local in editor_state.get("deleted_rows", []):
+        edits["deleted"].add(positions[int(local)])
+        changed = True
+    for row in editor_state.get("added_rows", []):
+        edits["added"].append(dict(row))
+        changed = True
+    return changed
+
+
+def apply_edits(chunk, offset, edits):
+    """Apply the upload diff to the rows of a chunk that starts at file position offset"""
+    chunk = chunk.copy()
+    chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+    if edits is None:
+        return chunk
+
+    end = offset + len(chunk)
+    for position, values in edits["edited"].items():
+        if offset <= position < end:
+            for col, value in values.items():
+                if col in chunk.columns and chunk[col].dtype != object:
+                    # Edited values may not fit the parsed dtype, e.g. text typed into a number column
+                    chunk[col] = chunk[col].astype(object)
+                chunk.loc[position, col] = value
+    deleted = [position for position in edits["deleted"] if offset <= position < end]
+    return chunk.drop(index=deleted)
+
+
+def validate_chunk(df):
+    """Drop rows that carry no product; return (valid_rows, rejected_count)"""
+    df = df.rename(columns=lambda col: str(col).strip())
+    valid = df.notna().any(axis=1)
+    if "product_name" in df.columns:
+        valid &= df["product_name"].notna() & (df["product_name"].astype(str).str.strip() != "")
+    return df[valid], int((~valid).sum())
+
+
+def _add_upsert_stats(stats, result):
+    stats["rows_written"] += result["inserted"] + result["updated"]
+    for key in ("inserted", "updated", "duplicates", "batch_duplicates"):
+        stats[key] += result[key]
+
+
+def _edited_batches(uploaded_file, edits, chunk_rows):
+    """Yield (rows_read, valid_rows, rejected_count, fraction_done) per batch, with the preview edits applied"""
+    offset = 0
+    for chunk, fraction in iter_upload_chunks(uploaded_file, chunk_rows):
+        rows = len(chunk)
+        valid, rejected = validate_chunk(apply_edits(chunk, offset, edits))
+        offset += rows
+        yield rows, valid, rejected, fraction
+
+
+def ingest_upload(uploaded_file, store, edits=None, chunk_rows=50_000, progress=None):
+    """
+    Stream an uploaded file into the product store in bounded-memory batches.
+
+    Rows are upserted, so products already in the store are updated or
+    skipped instead of being stored twice. A product listed more than once
+    in the file is written once, with the values of its last row, however
+    the rows fall into batches. edits is the diff collected from the
+    paginated preview (see new_upload_edits) and is applied to each batch
+    on the way in. progress, if given, is called with the fraction of the
+    work done after each batch.
+    """
+    stats = {
+        "rows_read": 0, "rows_written": 0, "rows_rejected": 0, "chunks": 0,
+        "inserted": 0, "updated": 0, "duplicates": 0, "batch_duplicates": 0,
+    }
+    added, added_rejected = validate_chunk(pd.DataFrame(edits["added"] if edits is not None else []))
+
+    # First pass: the key of every row, so only the last row of each product is written
+    positions = []
+    keys = []
+    rows_read = 0
+    for rows, valid, _, fraction in _edited_batches(uploaded_file, edits, chunk_rows):
+        positions.append(valid.index.to_numpy())
+        keys.append(identity_hashes(valid)[0])
+        rows_read += rows
+        if progress is not None:
+            progress(fraction / 2)
+    positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+    keys.append(identity_hashes(added)[0] if len(added) else np.empty(0, dtype=np.uint64))
+    last = ~pd.Series(np.concatenate(keys)).duplicated(keep="last").to_numpy()
+    latest = np.zeros(rows_read, dtype=bool)
+    latest[positions[last[:len(positions)]]] = True
+
+    for rows, valid, rejected, fraction in _edited_batches(uploaded_file, edits, chunk_rows):
+        keep = latest[valid.index.to_numpy()]
+        stats["rows_read"] += rows
+        stats["batch_duplicates"] += int((~keep).sum())
+        _add_upsert_stats(stats, store.upsert(valid[keep]))
+        stats["rows_rejected"] += rejected
+        stats["chunks"] += 1
+        if progress is not None:
+            progress(0.5 + fraction / 2)
+
+    if len(added):
+        keep = last[len(positions):]
+        stats["batch_duplicates"] += int((~keep).sum())
+        _add_upsert_stats(stats, store.upsert(added[keep]))
+    stats["rows_rejected"] += added_rejected
+
+    uploaded_file.seek(0)
+    return stats
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+MODEL_FILE = "discount_percentage_model.joblib"
+
+
+def _array_bytes(obj, seen=None):
+    """Return (heap_bytes, mapped_bytes) of the numpy arrays reachable from a model object"""
+    if seen is None:
+        seen = {}
+    if id(obj) in seen:
+        return 0, 0
+    # Keep a reference so temporary state objects are not freed and their ids reused
+    seen[id(obj)] = obj
+
+    if isinstance(obj, np.ndarray):
+        # Arrays backed by a memory map live in the page cache, shared between processes
+        base = obj
+        while isinstance(base, np.ndarray) and not isinstance(base, np.memmap):
+            base = base.base
+        if isinstance(base, np.memmap):
+            return 0, obj.nbytes
+        return obj.nbytes, 0
+
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif hasattr(obj, "__dict__"):
+        children = vars(obj).values()
+    elif hasattr(obj, "__getstate__") and type(obj).__module__.startswith("sklearn"):
+        # Cython objects such as sklearn's Tree only expose their arrays through their state
+        state = obj.__getstate__()
+        children = state.values() if isinstance(state, dict) else ()
+    else:
+        return 0, 0
+
+    heap = mapped = 0
+    for child in children:
+        child_heap, child_mapped = _array_bytes(child, seen)
+        heap += child_heap
+        mapped += child_mapped
+    return heap, mapped
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of joblib models, shared by every session.
+
+    Each artifact is loaded once per (size, mtime) version with memory-mapped
+    arrays, so large numpy arrays stay in the OS page cache instead of being
+    copied into every process. A changed file is picked up on the next get().
+    """
+
+    def __init__(self, mmap_mode="r"):
+        """Initialize an empty registry"""
+        self.mmap_mode = mmap_mode
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path=MODEL_FILE):
+        """Return the model stored at path, or None when the file does not exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+        key = os.path.abspath(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["signature"] == signature:
+                entry["hits"] += 1
+                return entry["model"]
+
+            import joblib
+
+            started = time.perf_counter()
+            # Compressed artifacts cannot be mapped; joblib then falls back to a normal load
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            load_seconds = time.perf_counter() - started
+            heap_bytes, mapped_bytes = _array_bytes(model)
+
+            self._entries[key] = {
+                "signature": signature,
+                "model": model,
+                "hits": 0,
+                "loads": (entry["loads"] if entry else 0) + 1,
+                "load_seconds": load_seconds,
+                "file_bytes": stat.st_size,
+                "heap_bytes": heap_bytes,
+                "mapped_bytes": mapped_bytes,
+            }
+            return model
+
+    def info(self, path=MODEL_FILE):
+        """Return load time, size and reuse counters of a loaded model, or None"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is None:
+                return None
+            return {name: value for name, value in entry.items() if name not in ("model", "signature")}
+
+
+_registry = ModelRegistry()
+
+
+def get_model(path=MODEL_FILE):
+    """Return the shared copy of a model from the process-wide registry"""
+    return _registry.get(path)
+
+
+def model_info(path=MODEL_FILE):
+    """Return the registry's report for a model"""
+    return _registry.info(path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE
+    if get_model(path) is None:
+        sys.exit(f"{path} not found")
+    get_model(path)
+    info = model_info(path)
+    print(f"{path}: loaded in {info['load_seconds'] * 1000:.1f} ms, file {info['file_bytes'] / 2**20:.1f} MB, "
+          f"arrays {info['heap_bytes'] / 2**20:.1f} MB in memory + {info['mapped_bytes'] / 2**20:.1f} MB mapped")
@@ -0,0 +1,49 @@
+import itertools
+
+
+# The consumer page narrows products in this order
+HIERARCHY_LEVELS = ["product_group", "product_brand", "product_name"]
+
+
+class OptionHierarchy:
+    """
+    Group -> brand -> product name tree of one version of the product table.
+
+    For every level and every combination of selected parent levels the
+    tree keeps the sorted child values and how many rows each covers, so a
+    cascading dropdown is filled by one dict lookup: O(options) per rerun
+    instead of a pass over the rows. A parent left at 'All' is a wildcard.
+    """
+
+    def __init__(self, df, levels=HIERARCHY_LEVELS, version=None):
+        """Build the tree; costs a few groupbys over the table, once per version"""
+        self.version = version
+        self.levels = [level for level in levels if level in df.columns]
+        self._children = {}
+        for depth, level in enumerate(self.levels):
+            # One groupby per subset of selected parents; 7 for the three levels
+            for selected in itertools.product((False, True), repeat=depth):
+                parents = [column for column, on in zip(self.levels, selected) if on]
+                counts = df.groupby(parents + [level], observed=True).size()
+                children = {}
+                for key, count in counts.items():
+                    key = key if isinstance(key, tuple) else (key,)
+                    values = iter(key[:-1])
+                    parent = tuple(next(values) if on else None for on in selected)
+                    children.setdefault(parent, []).append((key[-1], int(count)))
+                for parent, values in children.items():
+                    self._children[(level, parent)] = dict(sorted(values))
+
+    def counts(self, column, filters=None):
+        """
+        Ordered {value: rows} of a level under the selected parents; filters
+        maps parent levels to their selected value, missing ones mean 'All'.
+        """
+        filters = filters or {}
+        depth = self.levels.index(column)
+        parent = tuple(filters.get(level) for level in self.levels[:depth])
+        return self._children.get((column, parent), {})
+
+    def options(self, column, filters=None):
+        """Sorted values of a level under the selected parents"""
+        return list(self.counts(column, filters))
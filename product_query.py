@@ -0,0 +1,288 @@
+import datetime
+import hashlib
+import numbers
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from dataset_service import get_products_catalog, get_products_index
+
+
+class FilterSpec:
+    """
+    Validated description of a product query.
+
+    equals maps a column to the single value it must have; ranges maps a
+    column to an inclusive (low, high) pair of numbers, dates or
+    timestamps. Columns not present in the spec are not filtered.
+    """
+
+    SCALARS = (str, numbers.Number)
+    BOUNDS = (numbers.Number, datetime.date, pd.Timestamp)
+
+    def __init__(self, equals=None, ranges=None):
+        """Check the filter values and keep them in a fixed column order"""
+        self.equals = {}
+        self.ranges = {}
+        for column, value in sorted((equals or {}).items()):
+            if not isinstance(value, self.SCALARS):
+                raise TypeError(f"Filter on {column} needs a string or number, got {type(value).__name__}")
+            self.equals[column] = value
+        for column, bounds in sorted((ranges or {}).items()):
+            if len(bounds) != 2 or not all(isinstance(bound, self.BOUNDS) for bound in bounds):
+                raise TypeError(f"Range on {column} needs a (low, high) pair of numbers or dates")
+            low, high = bounds
+            if isinstance(low, datetime.date) != isinstance(high, datetime.date):
+                raise TypeError(f"Range on {column} mixes dates and numbers")
+            if isinstance(low, datetime.date):
+                # Dates and timestamps do not compare with each other directly
+                if pd.Timestamp(low) > pd.Timestamp(high):
+                    raise ValueError(f"Range on {column} is empty: {low} > {high}")
+            elif low > high:
+                raise ValueError(f"Range on {column} is empty: {low} > {high}")
+            self.ranges[column] = (low, high)
+
+    @classmethod
+    def from_filters(cls, filters):
+        """Build a spec from the pages' {column: value or (low, high)} dicts"""
+        if isinstance(filters, cls):
+            return filters
+        filters = filters or {}
+        return cls(
+            equals={column: value for column, value in filters.items() if not isinstance(value, tuple)},
+            ranges={column: value for column, value in filters.items() if isinstance(value, tuple)},
+        )
+
+    def to_filters(self):
+        """Return the spec as one {column: value or (low, high)} dict"""
+        return {**self.equals, **self.ranges}
+
+    def key(self):
+        """Canonical hash of the spec: equal filters give equal keys whatever their order or number type"""
+        parts = [f"{column}={_canonical(value)}" for column, value in self.equals.items()]
+        parts += [f"{column}:{_canonical(low)}..{_canonical(high)}" for column, (low, high) in self.ranges.items()]
+        return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def __repr__(self):
+        return f"FilterSpec(equals={self.equals!r}, ranges={self.ranges!r})"
+
+
+class QueryResult:
+    """
+    Rows matched by a query, how they were found and how long each step took.
+
+    version is the table version the bitmap index answered for, whose row
+    positions the rows keep as index; it is None for catalog queries.
+    """
+
+    def __init__(self, spec, rows, engine, steps, seconds, version=None):
+        """Initialize a query result"""
+        self.spec = spec
+        self.rows = rows
+        self.engine = engine
+        self.steps = steps
+        self.seconds = seconds
+        self.version = version
+
+    def explain(self):
+        """Return a readable plan of the query with the time spent in each step"""
+        lines = [f"{self.spec!r} via {self.engine}: {len(self.rows)} rows in {self.seconds * 1000:.2f} ms"]
+        for step, rows, seconds in self.steps:
+            matched = f"{rows} rows" if rows is not None else ""
+            lines.append(f"  {step:<60}{matched:>14}{seconds * 1000:>10.2f} ms")
+        return "\n".join(lines)
+
+
+def _canonical(value):
+    """One spelling per filter value, so 5 and 5.0 or a date and its midnight timestamp hash the same"""
+    if isinstance(value, str):
+        return repr(value)
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value).isoformat()
+    return repr(float(value))
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of query results as row-id arrays, shared by every session.
+
+    Entries are keyed on the dataset version and the canonical hash of the
+    filter spec, so a rewritten table never serves stale rows; entries of
+    older versions are dropped as soon as a new version is seen. The least
+    recently used entries are evicted once either bound is exceeded.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 2**20):
+        """Initialize an empty cache"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._version = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version, key):
+        """Return the cached row ids for a spec key, or None"""
+        with self._lock:
+            positions = self._entries.get((version, key)) if version == self._version else None
+            if positions is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            return positions
+
+    def put(self, version, key, positions):
+        """Store the row ids of a spec key, evicting the least recently used entries"""
+        if positions.nbytes > self.max_bytes:
+            return
+        # Shared between sessions, so nobody may modify it
+        positions.flags.writeable = False
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            old = self._entries.pop((version, key), None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[(version, key)] = positions
+            self._bytes += positions.nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and the memory held by the cached row ids"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "evictions": self.evictions,
+            }
+
+
+_results = ResultCache()
+
+
+def query_cache_stats():
+    """Return the counters of the process-wide query result cache"""
+    return _results.stats()
+
+
+def _positions(index, spec, steps=None):
+    """Row ids matching a spec, from the result cache when the same filters ran before on this version"""
+    started = time.perf_counter()
+    key = spec.key()
+    positions = _results.get(index.version, key)
+    if positions is not None:
+        if steps is not None:
+            steps.append((f"result cache hit {key[:12]}", len(positions), time.perf_counter() - started))
+        return positions
+    positions = index.positions(spec.to_filters(), trace=steps)
+    _results.put(index.version, key, positions)
+    return positions
+
+
+def _parse_dates(df):
+    """SQLite returns dates as text; type them like the in-memory table"""
+    for column in df.columns:
+        if "date" in column.lower():
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+    return df
+
+
+def query(filters=None):
+    """
+    Return the products matching filters, a FilterSpec or a {column: value
+    or (low, high)} dict, as a QueryResult. Filters run as SQL when the
+    SQLite catalog is enabled, else on the shared bitmap index.
+    """
+    spec = FilterSpec.from_filters(filters)
+    started = time.perf_counter()
+    steps = []
+
+    catalog = get_products_catalog()
+    version = None
+    if catalog is not None:
+        step_started = time.perf_counter()
+        rows = _parse_dates(catalog.select(spec.to_filters()))
+        steps.append(("SQL select on the catalog", len(rows), time.perf_counter() - step_started))
+        engine = "sqlite catalog"
+    else:
+        index = get_products_index()
+        positions = _positions(index, spec, steps)
+        step_started = time.perf_counter()
+        rows = index.df.take(positions)
+        steps.append(("take matching rows", len(rows), time.perf_counter() - step_started))
+        engine = "bitmap index"
+        version = index.version
+
+    return QueryResult(spec, rows, engine, steps, time.perf_counter() - started, version)
+
+
+def distinct(column, filters=None):
+    """Sorted distinct non-missing values of a column among the rows matching filters"""
+    spec = FilterSpec.from_filters(filters)
+    catalog = get_products_catalog()
+    if catalog is not None:
+        return catalog.distinct(column, spec.to_filters())
+    index = get_products_index()
+    values = index.df[column]
+    if spec.equals or spec.ranges:
+        values = values.take(_positions(index, spec))
+    # Manual entries carry no store, so skip missing values
+    return sorted(values.dropna().unique().tolist())
+
+
+def value_range(column):
+    """Smallest and largest value of a column over the whole table"""
+    catalog = get_products_catalog()
+    if catalog is not None:
+        low, high = catalog.min_max(column)
+    else:
+        low, high = get_products_index().value_range(column)
+    if "date" in column.lower():
+        return pd.Timestamp(low).date(), pd.Timestamp(high).date()
+    return low, high
+
+
+def _parse_filter(text):
+    """Parse a command line filter: column=value or column=low..high"""
+    column, _, value = text.partition("=")
+    if ".." not in value:
+        return column, value
+    bounds = []
+    for bound in value.split("..", 1):
+        try:
+            bounds.append(float(bound))
+        except ValueError:
+            bounds.append(pd.Timestamp(bound).date())
+    return column, tuple(bounds)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a product query outside the UI and print its plan")
+    parser.add_argument("filters", nargs="*", help="column=value or column=low..high")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    filters = dict(_parse_filter(text) for text in args.filters)
+    for run in range(args.repeat):
+        result = query(filters)
+        # The first run builds the index structures it needs; later runs hit the result cache
+        print(f"run {run + 1}: {result.seconds * 1000:.2f} ms")
+    print(result.explain())
+    print(query_cache_stats())
@@ -0,0 +1,533 @@
+import json
+import os
+import shutil
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from dedup_index import DedupIndex, NO_KEY, identity_hashes
+from file_utils import FileLock, atomic_replace, atomic_write_bytes, temp_path
+
+
+class ProductStore:
+    """
+    Append-only storage for the products CSV written by the Data page.
+
+    New rows go to a JSON-lines journal next to the CSV, so an insert only
+    costs the size of the batch. A background thread periodically folds the
+    journal back into the CSV so the file on disk stays a plain CSV.
+
+    All writers serialize on a lock file, and every batch is written and
+    fsynced before the lock is released. The first journal line records the
+    generation of the CSV it extends, a counter kept in a side file that
+    only compaction advances, so touching or copying the CSV never
+    invalidates acknowledged rows. Compaction records its intent before it
+    replaces the CSV; the next operation finishes or rolls back a
+    compaction that crashed half way, so the rows end up in either the old
+    CSV plus its journal or the new CSV, never both. A journal of another
+    generation is never deleted, only moved aside with a warning.
+
+    With dedup enabled the store also keeps a DedupIndex next to the CSV and
+    upsert() writes only new or changed products. Rows superseded by a later
+    version are hidden from readers and dropped at the next compaction.
+    """
+
+    def __init__(self, csv_file="products_data.csv", compact_interval=60, compact_threshold_bytes=1 << 20, dedup=False):
+        """Initialize the store for the given CSV file"""
+        self.csv_file = csv_file
+        self.journal_file = csv_file + ".journal"
+        self.lock_file = csv_file + ".lock"
+        self.index_file = csv_file + ".keys"
+        self.generation_file = csv_file + ".generation"
+        self.intent_file = csv_file + ".compacting"
+        self.compact_interval = compact_interval
+        self.compact_threshold_bytes = compact_threshold_bytes
+
+        self._index = DedupIndex(self.index_file) if dedup else None
+        self._lock = threading.Lock()
+        self._compactor = None
+        self._stop = threading.Event()
+
+    def append(self, df):
+        """Append the rows of a DataFrame to the store and return the number of rows written"""
+        if df is None or len(df) == 0:
+            return 0
+
+        hashes = identity_hashes(df) if self._index is not None else None
+        with self._locked():
+            if hashes is not None:
+                self._load_index()
+            self._write_journal(df)
+            if hashes is not None:
+                self._index.append(*hashes)
+
+        return len(df)
+
+    def upsert(self, df):
+        """
+        Write the rows of a DataFrame that are new or changed, keyed on IDENTITY_COLUMNS.
+
+        Returns a dict counting the rows inserted, updated, skipped as exact
+        duplicates of the stored version, and skipped because a later row in
+        the same batch has the same key. Stores without dedup append everything.
+        """
+        if df is None or len(df) == 0:
+            return {"rows": 0, "inserted": 0, "updated": 0, "duplicates": 0, "batch_duplicates": 0}
+        if self._index is None:
+            rows = self.append(df)
+            return {"rows": rows, "inserted": rows, "updated": 0, "duplicates": 0, "batch_duplicates": 0}
+
+        # Hash outside the lock; only the lookup and the write are serialized
+        keys, rows = identity_hashes(df)
+        with self._locked():
+            self._load_index()
+            write, stats = self._index.classify(keys, rows)
+            if write.any():
+                self._write_journal(df[write])
+                self._index.append(keys[write], rows[write])
+        return stats
+
+    def read(self):
+        """Return every stored row as one DataFrame, the same shape the CSV would have"""
+        with self._locked():
+            keep = self._keep_mask()
+            base = self._read_base()
+            journal = self._read_journal()
+
+        if journal.empty:
+            df = base
+        elif base.empty:
+            df = journal
+        else:
+            df = pd.concat([base, journal], ignore_index=True)
+        if keep is not None and len(keep) == len(df):
+            df = df[keep].reset_index(drop=True)
+        return df
+
+    def read_new(self, seen_rows, chunk_rows=50_000):
+        """
+        Return (rows, keys, row_hashes, mark) for the latest stored rows whose
+        row hash is not in seen_rows, with every value left as a string.
+
+        Only needs a dedup store. Comparing the hashes costs O(all rows);
+        pass mark to read_since next time to read only the rows after it.
+        """
+        if self._index is None:
+            raise ValueError("read_new needs a store opened with dedup=True")
+
+        with self._locked():
+            keep = self._keep_mask()
+            pairs = self._index.pairs()
+            wanted = keep & ~np.isin(pairs["row"], seen_rows)
+            rows = self._select_rows(wanted, chunk_rows)
+            mark = [self._generation(), len(pairs)]
+
+        selected = pairs[wanted]
+        return rows, selected["key"].copy(), selected["row"].copy(), mark
+
+    def read_since(self, mark, chunk_rows=50_000):
+        """
+        Return (rows, keys, row_hashes, known, mark) for the latest versions
+        of the rows stored after mark, a mark from read_new or read_since.
+        known is True where the product already had a row before mark.
+
+        Rows are only appended between compactions, so this reads just the
+        new rows; the one pass over all keys for known is a hash lookup.
+        Returns None when a compaction renumbered the rows since mark; use
+        read_new then.
+        """
+        if self._index is None:
+            raise ValueError("read_since needs a store opened with dedup=True")
+
+        with self._locked():
+            self._sync_index()
+            generation, start = mark
+            pairs = self._index.pairs()
+            if generation != self._generation() or not self._index.base_rows <= start <= len(pairs):
+                return None
+
+            keys = pairs["key"][start:]
+            latest = (keys == NO_KEY) | ~pd.Series(keys).duplicated(keep="last").to_numpy()
+            wanted = np.zeros(len(pairs), dtype=bool)
+            wanted[start:] = latest
+            rows = self._select_rows(wanted, chunk_rows)
+
+            selected = pairs[start:][latest]
+            earlier = pairs["key"][:start]
+            earlier = earlier[pd.Series(earlier).isin(selected["key"]).to_numpy()]
+            known = np.isin(selected["key"], earlier) & (selected["key"] != NO_KEY)
+            mark = [generation, len(pairs)]
+
+        return rows, selected["key"].copy(), selected["row"].copy(), known, mark
+
+    def index_entries(self):
+        """Return (keys, row_hashes) of the latest version of every stored row"""
+        if self._index is None:
+            raise ValueError("index_entries needs a store opened with dedup=True")
+        with self._locked():
+            keep = self._keep_mask()
+            pairs = self._index.pairs()[keep]
+        return pairs["key"].copy(), pairs["row"].copy()
+
+    def iter_chunks(self, chunk_rows=50_000, as_text=False):
+        """
+        Yield every stored row as DataFrames of at most chunk_rows rows, CSV
+        first, then the journal. With as_text every value is left as a string.
+
+        Writers wait until the iteration finishes, so the rows form one
+        consistent snapshot. Do not call other store methods from inside the
+        loop; they wait for the same lock.
+        """
+        with self._locked():
+            keep = self._keep_mask()
+            start = 0
+            for chunk in self._iter_rows(chunk_rows, as_text):
+                if keep is not None:
+                    rows = len(chunk)
+                    chunk = chunk[keep[start:start + rows]]
+                    start += rows
+                yield chunk
+
+    def journal_size(self):
+        """Return the size of the pending journal in bytes"""
+        try:
+            return os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            return 0
+
+    def compact(self, chunk_rows=50_000):
+        """
+        Fold the journal into the CSV file and return the number of rows moved.
+
+        Works in batches of chunk_rows, so memory stays bounded however large
+        the CSV and the journal have grown. When the journal adds no new
+        columns and supersedes no CSV row, the existing CSV bytes are copied
+        as they are.
+        """
+        with self._locked():
+            if not self._journal_is_current():
+                return 0
+
+            keep = self._keep_mask()
+            base_rows = self._index.base_rows if keep is not None else 0
+            base_columns = self._base_columns()
+            columns = list(base_columns)
+            moved = 0
+            for batch in self._iter_journal(chunk_rows):
+                moved += len(batch)
+                for record in batch:
+                    for key in record:
+                        if key not in columns:
+                            columns.append(key)
+            if moved == 0:
+                return 0
+
+            tmp_path = temp_path(self.csv_file)
+            with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+                if base_columns and base_columns == columns and (keep is None or keep[:base_rows].all()):
+                    with open(self.csv_file, encoding="utf-8", newline="") as src:
+                        shutil.copyfileobj(src, out)
+                    if out.tell() and not self._ends_with_newline():
+                        out.write("\n")
+                else:
+                    pd.DataFrame(columns=columns).to_csv(out, index=False)
+                    if base_columns:
+                        start = 0
+                        for chunk in pd.read_csv(self.csv_file, chunksize=chunk_rows):
+                            if keep is not None:
+                                rows = len(chunk)
+                                chunk = chunk[keep[start:start + rows]]
+                                start += rows
+                            chunk.reindex(columns=columns).to_csv(out, header=False, index=False)
+
+                start = base_rows
+                for batch in self._iter_journal(chunk_rows):
+                    chunk = pd.DataFrame(batch)
+                    if keep is not None:
+                        chunk = chunk[keep[start:start + len(batch)]]
+                        start += len(batch)
+                    chunk.reindex(columns=columns).to_csv(out, header=False, index=False)
+
+                out.flush()
+                os.fsync(out.fileno())
+
+            if keep is not None:
+                entries = self._index.pairs()[keep]
+
+            # Commit point: once the CSV is replaced, _recover() completes the compaction even after a crash
+            generation = self._generation() + 1
+            atomic_write_bytes(self.intent_file, json.dumps({"generation": generation, "tmp": tmp_path}).encode("utf-8"))
+            atomic_replace(tmp_path, self.csv_file)
+            self._start_generation(generation)
+            if keep is not None:
+                self._index.rewrite(generation, len(entries), entries["key"], entries["row"])
+            os.remove(self.intent_file)
+
+        return moved
+
+    def start_background_compaction(self):
+        """Start the daemon thread that compacts the journal once it grows past the threshold"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+
+        self._stop.clear()
+        self._compactor = threading.Thread(target=self._compaction_loop, name="product-store-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_background_compaction(self):
+        """Stop the background compaction thread"""
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _compaction_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            if self.journal_size() >= self.compact_threshold_bytes:
+                try:
+                    self.compact()
+                except Exception:
+                    # Leave the journal in place; the next pass retries
+                    pass
+
+    @contextmanager
+    def _locked(self):
+        """Hold the store lock, with any interrupted compaction resolved first"""
+        with self._lock, FileLock(self.lock_file):
+            self._recover()
+            yield
+
+    def _recover(self):
+        """Finish or roll back a compaction that crashed, and set aside a journal of another generation"""
+        try:
+            with open(self.intent_file, encoding="utf-8") as f:
+                intent = json.load(f)
+        except FileNotFoundError:
+            intent = None
+        if intent is not None:
+            if os.path.exists(intent["tmp"]):
+                # The CSV was never replaced; the old CSV and its journal are still the data
+                os.remove(intent["tmp"])
+            else:
+                # The new CSV already holds the journal rows; record its generation and start an empty journal
+                self._start_generation(intent["generation"])
+            os.remove(self.intent_file)
+
+        header = self._journal_header()
+        if header is not None and not self._journal_is_current():
+            # Never drop acknowledged rows; keep them where an operator can replay them
+            aside = f"{self.journal_file}.stale-{time.time_ns()}"
+            os.replace(self.journal_file, aside)
+            warnings.warn(f"{self.journal_file} belongs to another generation of {self.csv_file}; moved it to {aside}")
+
+    def _generation(self):
+        """Number of compactions the CSV has been through; only compact() advances it"""
+        try:
+            with open(self.generation_file, encoding="utf-8") as f:
+                return json.load(f)["generation"]
+        except FileNotFoundError:
+            return 0
+
+    def _start_generation(self, generation):
+        atomic_write_bytes(self.generation_file, json.dumps({"generation": generation}).encode("utf-8"))
+        self._reset_journal()
+
+    def _journal_header(self):
+        try:
+            with open(self.journal_file, "rb") as f:
+                header = f.readline()
+        except FileNotFoundError:
+            return None
+        try:
+            header = json.loads(header)
+        except ValueError:
+            return {}
+        return header if isinstance(header, dict) else {}
+
+    def _journal_is_current(self):
+        header = self._journal_header()
+        if header is None:
+            return False
+        # Journals written before generations were recorded extend generation 0
+        return header.get("_generation", 0 if "_base" in header else None) == self._generation()
+
+    def _write_journal(self, df):
+        payload = df.to_json(orient="records", lines=True, date_format="iso", force_ascii=False)
+        if not payload.endswith("\n"):
+            payload += "\n"
+        data = payload.encode("utf-8")
+
+        if self._journal_header() is None:
+            self._reset_journal()
+
+        fd = os.open(self.journal_file, os.O_RDWR | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        try:
+            self._repair_tail(fd)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _journal_rows(self):
+        if not self._journal_is_current():
+            return 0
+        with open(self.journal_file, "rb") as f:
+            next(f)
+            # Only complete lines count; a torn tail is dropped by the next append
+            return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+    def _load_index(self):
+        """Bring the dedup index up to date, rebuilding it if it belongs to another generation"""
+        if not self._index.is_current(self._generation()):
+            self._rebuild_index()
+        self._index.load()
+
+    def _keep_mask(self):
+        """Return which stored rows are the latest version of their product, or None without dedup"""
+        if self._index is None:
+            return None
+        self._sync_index()
+        return self._index.keep_mask()
+
+    def _sync_index(self):
+        self._load_index()
+        # A writer without the index (or a crash between the two writes) leaves them misaligned
+        if self._index.entry_count() != self._index.base_rows + self._journal_rows():
+            self._rebuild_index()
+            self._index.load()
+
+    def _select_rows(self, wanted, chunk_rows):
+        """Read the stored rows where wanted is True as text; the CSV is skipped when none of them is in it"""
+        base_rows = self._index.base_rows
+        include_base = bool(wanted[:base_rows].any())
+        chunks = []
+        start = 0 if include_base else base_rows
+        for chunk in self._iter_rows(chunk_rows, as_text=True, include_base=include_base):
+            rows = len(chunk)
+            chunks.append(chunk[wanted[start:start + rows]])
+            start += rows
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def _rebuild_index(self):
+        """Hash every stored row, keeping superseded rows hidden and pre-existing duplicates visible"""
+        keys = []
+        rows = []
+        base_rows = 0
+        for chunk, in_base in self._iter_rows(50_000, as_text=True, with_source=True):
+            chunk_keys, chunk_rows = identity_hashes(chunk)
+            keys.append(chunk_keys)
+            rows.append(chunk_rows)
+            if in_base:
+                base_rows += len(chunk)
+
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.uint64)
+        unkeyed = self._index.unkeyed(len(keys))
+        if unkeyed is None:
+            # Only the last copy of a duplicate already in the CSV takes part in deduplication;
+            # journal rows were written as new versions and supersede earlier ones
+            unkeyed = np.zeros(len(keys), dtype=bool)
+            unkeyed[:base_rows] = pd.Series(keys[:base_rows]).duplicated(keep="last").to_numpy()
+        keys[unkeyed] = NO_KEY
+        self._index.rewrite(self._generation(), base_rows, keys, rows)
+
+    def _iter_rows(self, chunk_rows, as_text=False, with_source=False, include_base=True):
+        """Yield every stored row, CSV first; the caller must hold the store lock"""
+        if include_base and os.path.exists(self.csv_file) and os.path.getsize(self.csv_file) > 0:
+            with pd.read_csv(self.csv_file, chunksize=chunk_rows, dtype=str if as_text else None) as reader:
+                for chunk in reader:
+                    yield (chunk, True) if with_source else chunk
+
+        if self._journal_is_current():
+            for batch in self._iter_journal(chunk_rows):
+                chunk = pd.DataFrame(batch)
+                if as_text:
+                    chunk = chunk.astype(object).where(chunk.isna(), chunk.astype(str))
+                yield (chunk, False) if with_source else chunk
+
+    def _reset_journal(self):
+        header = json.dumps({"_generation": self._generation()}) + "\n"
+        atomic_write_bytes(self.journal_file, header.encode("utf-8"))
+
+    def _repair_tail(self, fd):
+        """Drop a partial last line left behind by a writer that crashed mid-batch"""
+        end = os.lseek(fd, 0, os.SEEK_END)
+        if end == 0:
+            return
+        os.lseek(fd, end - 1, os.SEEK_SET)
+        if os.read(fd, 1) == b"\n":
+            return
+
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            os.lseek(fd, pos, os.SEEK_SET)
+            chunk = os.read(fd, step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                os.ftruncate(fd, pos + newline + 1)
+                return
+        os.ftruncate(fd, 0)
+
+    def _read_base(self):
+        if not os.path.exists(self.csv_file):
+            return pd.DataFrame()
+        return pd.read_csv(self.csv_file)
+
+    def _base_columns(self):
+        if not os.path.exists(self.csv_file) or os.path.getsize(self.csv_file) == 0:
+            return []
+        return list(pd.read_csv(self.csv_file, nrows=0).columns)
+
+    def _ends_with_newline(self):
+        with open(self.csv_file, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _iter_journal(self, batch_rows):
+        batch = []
+        with open(self.journal_file, encoding="utf-8") as f:
+            next(f)
+            for line in f:
+                if not line.endswith("\n"):
+                    # Torn write from a crashed writer; it was never acknowledged
+                    break
+                if line.strip():
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_rows:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
+
+    def _read_journal(self):
+        if not self._journal_is_current():
+            return pd.DataFrame()
+
+        records = []
+        for batch in self._iter_journal(50_000):
+            records.extend(batch)
+        return pd.DataFrame(records)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_product_store(csv_file="products_data.csv"):
+    """Return the process-wide deduplicating store for a CSV file, starting its compactor on first use"""
+    path = os.path.abspath(csv_file)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ProductStore(csv_file, dedup=True)
+            store.start_background_compaction()
+            _stores[path] = store
+    return store
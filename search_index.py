@@ -0,0 +1,309 @@
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# Longest n-gram kept in the posting lists; longer search terms intersect several of them
+GRAM = 3
+
+# Smallest trigram similarity a fuzzy match needs, as in PostgreSQL's pg_trgm
+FUZZY_THRESHOLD = 0.3
+
+# Cyrillic letters as spelled in Uzbek Latin, so Russian and both Uzbek scripts fold to the same text
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+
+# Apostrophes of Uzbek Latin (o‘, g‘) in all the ways they get typed
+APOSTROPHES = "'`ʻʼ‘’"
+
+_FOLD = str.maketrans({**CYRILLIC_TO_LATIN, **{mark: "" for mark in APOSTROPHES}})
+
+# Russian and Uzbek words shoppers type for the catalog's English product words, already folded
+SYNONYMS = {
+    "milk": ["moloko", "sut"],
+    "bread": ["xleb", "hleb", "non"],
+    "buns": ["bulochki", "bulka", "bulochka"],
+    "butter": ["maslo", "saryog"],
+    "cheese": ["sir", "syr", "pishloq"],
+    "cottage": ["tvorog"],
+    "cream": ["slivki", "smetana", "qaymoq"],
+    "yogurt": ["yogurt", "qatiq"],
+    "tea": ["chay", "choy"],
+    "coffee": ["kofe", "qahva"],
+    "juices": ["sok", "sharbat"],
+    "water": ["voda", "suv"],
+    "chocolate": ["shokolad"],
+    "candies": ["konfeti", "konfet"],
+    "biscuits": ["pechene", "pechenye"],
+    "cakes": ["tort", "pirojnoe"],
+    "jam": ["varene", "murabbo"],
+    "halva": ["xalva", "holva"],
+    "pasta": ["makaroni", "makaron"],
+    "noodles": ["lapsha"],
+    "flour": ["muka", "un"],
+    "sausage": ["kolbasa"],
+    "meat": ["myaso", "gosht"],
+    "beef": ["govyadina"],
+    "lamb": ["baranina", "qoy"],
+    "poultry": ["ptitsa", "kuritsa", "tovuq"],
+}
+
+
+def fold(text):
+    """Lower-case text, spell Cyrillic in Latin letters and strip accents and apostrophes: 'Nestlé' -> 'nestle'"""
+    text = unicodedata.normalize("NFKD", text.casefold().translate(_FOLD))
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _word_grams(word):
+    # Padded like pg_trgm, so short words and word starts still make trigrams
+    return _grams(f"  {word} ", 3)
+
+
+def _words(text):
+    return re.findall(r"\w+", text)
+
+
+def _gather(offsets, values, ids):
+    """Concatenate the CSR slices values[offsets[i]:offsets[i + 1]] of ids in one step; also return their lengths"""
+    starts = offsets[ids]
+    lengths = offsets[ids + 1] - starts
+    ends = np.cumsum(lengths)
+    if not len(ends) or not ends[-1]:
+        return values[:0], lengths
+    return values[np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)], lengths
+
+
+def _csr(keys, values, size):
+    """Group values by key: key k owns values[offsets[k]:offsets[k + 1]] of the returned array"""
+    order = np.argsort(keys, kind="stable")
+    return np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=size)))), values[order]
+
+
+class SearchIndex:
+    """
+    Inverted n-gram index over the text columns of one version of the product table.
+
+    Every distinct text value, folded to lower-case unaccented Latin, is a
+    term. For exact searches each 1-, 2- and 3-gram of a term maps to the
+    sorted ids of the terms containing it; a search intersects the posting
+    lists of the query's grams and confirms the few candidates with a plain
+    substring test. For fuzzy searches every word of a term, and the
+    Russian and Uzbek synonyms of catalog words, maps its padded trigrams
+    to word ids, so a query word is scored against all words with one
+    bincount. Terms reach their rows through a CSR array, so a keystroke
+    never scans the cells.
+    """
+
+    def __init__(self, df, version=None):
+        """Index every text column of df; costs one pass over its distinct values"""
+        self.version = version
+        self.rows = len(df)
+        self.columns = df.select_dtypes(include=["object", "category"]).columns.tolist()
+
+        term_ids = {}
+        row_terms = []
+        for column in self.columns:
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+            else:
+                codes, uniques = pd.factorize(values)
+            # Values that only differ in case, script or accents share a term
+            ids = np.array(
+                [term_ids.setdefault(fold(value), len(term_ids)) if isinstance(value, str) else -1 for value in uniques] + [-1],
+                dtype=np.int32,
+            )
+            # Missing cells have code -1 and land on the trailing -1, which matches nothing
+            row_terms.append(ids[codes])
+        self.terms = list(term_ids)
+
+        cell_terms = np.concatenate(row_terms) if row_terms else np.empty(0, dtype=np.int32)
+        cell_rows = np.tile(np.arange(self.rows, dtype=np.int32), len(self.columns))
+        present = cell_terms >= 0
+        self._term_offsets, self._term_rows = _csr(cell_terms[present], cell_rows[present], len(self.terms))
+
+        postings = {}
+        for term_id, term in enumerate(self.terms):
+            for n in range(1, GRAM + 1):
+                for gram in _grams(term, n):
+                    postings.setdefault(gram, []).append(term_id)
+        self._postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+        word_ids = {}
+        word_terms = []
+        for term_id, term in enumerate(self.terms):
+            for word in set(_words(term)):
+                for alias in [word] + SYNONYMS.get(word, []):
+                    word_terms.append((word_ids.setdefault(alias, len(word_ids)), term_id))
+        self.words = list(word_ids)
+        pairs = np.array(word_terms, dtype=np.int64).reshape(-1, 2)
+        self._word_offsets, self._word_terms = _csr(pairs[:, 0], pairs[:, 1], len(self.words))
+
+        word_postings = {}
+        for word_id, word in enumerate(self.words):
+            for gram in _word_grams(word):
+                word_postings.setdefault(gram, []).append(word_id)
+        self._word_postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in word_postings.items()}
+        self._word_gram_counts = np.array([len(_word_grams(word)) for word in self.words], dtype=np.int64)
+
+    def matching_terms(self, text, prefix=False):
+        """
+        Ids of the terms containing text, after folding both; with prefix,
+        only terms with a word starting with text.
+        """
+        text = fold(text)
+        if not text:
+            return np.arange(len(self.terms))
+        n = min(GRAM, len(text))
+        lists = [self._postings.get(gram) for gram in _grams(text, n)]
+        if any(ids is None for ids in lists):
+            return np.empty(0, dtype=np.int64)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if not len(candidates):
+                break
+        if len(text) <= GRAM and not prefix:
+            # The text is itself a gram, so its posting list is exact
+            return candidates
+        if prefix:
+            found = [term_id for term_id in candidates if (" " + self.terms[term_id]).find(" " + text) >= 0]
+        else:
+            # Shared grams do not guarantee the gram order; confirm the few candidates directly
+            found = [term_id for term_id in candidates if text in self.terms[term_id]]
+        return np.array(found, dtype=np.int64)
+
+    def matches(self, text, rows=None, prefix=False):
+        """
+        Boolean mask of the rows where any text column contains text; rows
+        are positions in the indexed table, all rows when None.
+        """
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[_gather(self._term_offsets, self._term_rows, self.matching_terms(text, prefix))[0]] = True
+        return mask if rows is None else mask[rows]
+
+    def term_scores(self, text, threshold=FUZZY_THRESHOLD):
+        """
+        Similarity in [0, 1] of every term to text: 1 for terms containing
+        it, else the mean over the query words of their best trigram
+        similarity to a word or synonym in the term.
+        """
+        scores = np.zeros(len(self.terms))
+        query_words = _words(fold(text))
+        for query_word in query_words:
+            grams = _word_grams(query_word)
+            lists = [self._word_postings[gram] for gram in grams if gram in self._word_postings]
+            if not lists:
+                continue
+            shared = np.bincount(np.concatenate(lists), minlength=len(self.words))
+            similarity = shared / (len(grams) + self._word_gram_counts - shared)
+            similar = np.flatnonzero(similarity >= threshold)
+            terms, lengths = _gather(self._word_offsets, self._word_terms, similar)
+            best = np.zeros(len(self.terms))
+            np.maximum.at(best, terms, np.repeat(similarity[similar], lengths))
+            scores += best
+        if query_words:
+            scores /= len(query_words)
+        scores[scores < threshold] = 0
+        scores[self.matching_terms(text)] = 1.0
+        return scores
+
+    def rank(self, text, rows=None, threshold=FUZZY_THRESHOLD):
+        """
+        Positions of the rows matching text, exactly or fuzzily, best match
+        first, and their scores; positions index into rows when given, else
+        into the indexed table. A row scores as its best matching cell.
+        """
+        scores = self.term_scores(text, threshold)
+        found = np.flatnonzero(scores)
+        hit_rows, lengths = _gather(self._term_offsets, self._term_rows, found)
+        row_scores = np.zeros(self.rows)
+        np.maximum.at(row_scores, hit_rows, np.repeat(scores[found], lengths))
+        hit = np.zeros(self.rows, dtype=bool)
+        hit[hit_rows] = True
+        if rows is not None:
+            row_scores, hit = row_scores[rows], hit[rows]
+        positions = np.flatnonzero(hit)
+        # Stable, so equally good matches keep their table order
+        positions = positions[np.argsort(-row_scores[positions], kind="stable")]
+        return positions, row_scores[positions]
+
+
+def _contains_scan(df, text):
+    """The consumer page's previous search: a case-insensitive substring scan of every text cell"""
+    mask = np.zeros(len(df), dtype=bool)
+    for column in df.select_dtypes(include=["object", "category"]).columns:
+        mask |= df[column].str.contains(text, case=False, regex=False, na=False).to_numpy()
+    return mask
+
+
+def benchmark(rows=1_000_000, distinct=100_000, terms=("mi", "milk", "fresh", "00042", "zzz"),
+              fuzzy=("moloko", "молоко", "sut", "Nestle", "chocolat"), repeats=3):
+    """
+    Time the substring scan against the index on the product table resampled
+    to rows rows, then the fuzzy ranking on shopper spellings.
+    """
+    from dataset_service import get_products
+
+    base = get_products()
+    df = base.sample(rows, replace=True, random_state=0, ignore_index=True)
+    # A real catalog has far more distinct product names than the sample data; number the variants
+    names = sorted(base["product_name"].dropna().unique())
+    variants = [f"{names[number % len(names)]} {number:05d}" for number in range(distinct)]
+    df["product_name"] = pd.Categorical.from_codes(np.random.default_rng(0).integers(distinct, size=rows), variants)
+
+    started = time.perf_counter()
+    index = SearchIndex(df)
+    print(f"{rows:,} rows, {len(index.terms):,} distinct terms, {len(index.words):,} words, "
+          f"built in {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(f"{'term':<16}{'scan ms':>10}{'index ms':>10}{'matches':>12}")
+    for text in terms:
+        started = time.perf_counter()
+        for _ in range(repeats):
+            expected = _contains_scan(df, text)
+        scan = (time.perf_counter() - started) / repeats
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            result = index.matches(text)
+        indexed = (time.perf_counter() - started) / repeats
+
+        # The sample data is plain ASCII, where folding changes nothing but case
+        assert (result == expected).all()
+        print(f"{text!r:<16}{scan * 1000:>10.1f}{indexed * 1000:>10.2f}{int(result.sum()):>12,}")
+
+    print(f"\n{'fuzzy':<16}{'scan hits':>10}{'rank ms':>10}{'matches':>12}  best match")
+    for text in fuzzy:
+        scan_hits = int(_contains_scan(df, text).sum())
+        started = time.perf_counter()
+        for _ in range(repeats):
+            positions, scores = index.rank(text)
+        ranked = (time.perf_counter() - started) / repeats
+        best = df["product_brand"].iat[positions[0]] + " / " + df["product_name"].iat[positions[0]] if len(positions) else "-"
+        print(f"{text!r:<16}{scan_hits:>10,}{ranked * 1000:>10.2f}{len(positions):>12,}  {best}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the search index against the substring scan")
+    parser.add_argument("terms", nargs="*", default=["mi", "milk", "fresh", "00042", "zzz"])
+    parser.add_argument("--fuzzy", nargs="*", default=["moloko", "молоко", "sut", "Nestle", "chocolat"])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.rows, args.distinct, args.terms, args.fuzzy, args.repeats)
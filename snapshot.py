@@ -0,0 +1,113 @@
+import os
+
+import pandas as pd
+
+from file_utils import FileLock, atomic_replace, file_signature, temp_path
+
+
+# Low-cardinality text columns stored as categoricals
+CATEGORY_COLUMNS = [
+    "store_name", "product_group", "product_brand", "product_name",
+    "status", "discount", "last_status",
+]
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Parquet schema metadata key holding the size and mtime of the CSV a snapshot was built from
+SOURCE_KEY = b"zerowaste.source"
+
+
+def snapshot_path(csv_file):
+    """Return the Parquet snapshot path that belongs to a CSV file"""
+    return os.path.splitext(csv_file)[0] + ".parquet"
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def read_typed_csv(csv_file, columns=None):
+    """Parse a product CSV with categorical text columns and explicit date formats"""
+    header = pd.read_csv(csv_file, nrows=0).columns
+    usecols = [col for col in header if columns is None or col in columns]
+    dtype = {col: "category" for col in CATEGORY_COLUMNS if col in usecols}
+    df = pd.read_csv(csv_file, usecols=usecols, dtype=dtype)
+
+    for col in df.columns:
+        if "date" in col.lower():
+            try:
+                df[col] = pd.to_datetime(df[col], format=DATE_FORMAT)
+            except ValueError:
+                # Not ISO dates; let pandas infer the format
+                df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def write_snapshot(csv_file):
+    """Write the typed Parquet snapshot of a CSV file and return its path"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = snapshot_path(csv_file)
+    # Writers of the CSV hold its lock, so the recorded size and mtime belong to the rows read
+    with FileLock(csv_file + ".lock"):
+        source = file_signature(csv_file)
+        df = read_typed_csv(csv_file)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), SOURCE_KEY: source})
+    tmp_path = temp_path(path)
+    pq.write_table(table, tmp_path)
+    atomic_replace(tmp_path, path)
+    return path
+
+
+def snapshot_is_fresh(csv_file):
+    """Whether a snapshot exists and was built from the CSV's current size and mtime"""
+    import pyarrow.parquet as pq
+
+    path = snapshot_path(csv_file)
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(csv_file):
+        return True
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, ValueError):
+        # Not a readable Parquet file; rebuild it
+        return False
+    return metadata.get(SOURCE_KEY) == file_signature(csv_file)
+
+
+def load_table(csv_file, columns=None):
+    """
+    Load a product table, reading only the requested columns.
+
+    Reads the Parquet snapshot when one is available, refreshing it first if
+    the CSV changed. Falls back to parsing the CSV when pyarrow is not
+    installed or no snapshot can be written.
+    """
+    path = snapshot_path(csv_file)
+    if _has_pyarrow():
+        if not snapshot_is_fresh(csv_file):
+            try:
+                write_snapshot(csv_file)
+            except OSError:
+                pass
+        if os.path.exists(path):
+            return pd.read_parquet(path, engine="pyarrow", columns=columns)
+
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(csv_file)
+    return read_typed_csv(csv_file, columns)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for csv_file in sys.argv[1:] or ["enhanced_store_data.csv", "store_product_data.csv"]:
+        print(f"{csv_file} -> {write_snapshot(csv_file)}")
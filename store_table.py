@@ -0,0 +1,102 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from file_utils import atomic_write_bytes, file_signature
+
+
+STORE_COLUMNS = ["store_id", "store_name", "location_lat", "location_long", "products"]
+
+
+def stores_path(csv_file):
+    """Return the path of the stores table that belongs to a product CSV"""
+    return os.path.splitext(csv_file)[0] + ".stores.csv"
+
+
+def source_path(csv_file):
+    """Return the file recording which version of the product CSV the stores table was built from"""
+    return stores_path(csv_file) + ".source"
+
+
+def store_id(name):
+    """Stable id of a store name; spelling differences in case and spacing give the same id"""
+    return hashlib.sha1(" ".join(name.split()).casefold().encode("utf-8")).hexdigest()[:12]
+
+
+def build_stores(df, previous=None):
+    """
+    One row per store: its id, name, location and number of product rows.
+
+    Product rows of one store carry scattered coordinates; a store is
+    placed at their median. Stores already in previous keep the location
+    they were given then, so a new batch of rows never moves a store.
+    """
+    codes, names = pd.factorize(df["store_name"])
+    present = codes >= 0
+    ids = np.array([store_id(str(name)) for name in names], dtype=object)
+    rows = pd.DataFrame({
+        "store_id": ids[codes[present]],
+        "store_name": np.asarray(names, dtype=object)[codes[present]],
+        "location_lat": df["location_lat"].to_numpy()[present],
+        "location_long": df["location_long"].to_numpy()[present],
+    })
+    stores = rows.groupby("store_id", sort=False).agg(
+        store_name=("store_name", "first"),
+        location_lat=("location_lat", "median"),
+        location_long=("location_long", "median"),
+        products=("store_name", "size"),
+    ).reset_index()
+
+    if previous is not None and len(previous):
+        located = previous.dropna(subset=["location_lat", "location_long"]).set_index("store_id")
+        known = stores["store_id"].isin(located.index).to_numpy()
+        for column in ["location_lat", "location_long"]:
+            stores.loc[known, column] = located.loc[stores["store_id"][known], column].to_numpy()
+    return stores.sort_values("store_name", kind="stable", ignore_index=True)[STORE_COLUMNS]
+
+
+def read_stores(path, columns=None):
+    """Read a stores table written by write_stores"""
+    return pd.read_csv(path, dtype={"store_id": str, "store_name": str}, usecols=columns)
+
+
+def write_stores(csv_file, df, source=None):
+    """
+    Write the stores table of a product CSV from its canonical rows and return its path.
+
+    source is the file_signature of the CSV taken before df was read; it is
+    recorded next to the table for stores_are_fresh.
+    """
+    path = stores_path(csv_file)
+    previous = read_stores(path) if os.path.exists(path) else None
+    stores = build_stores(df, previous)
+    atomic_write_bytes(path, stores.to_csv(index=False).encode("utf-8"))
+    # Written after the table: a crash in between leaves the table looking stale, never fresh
+    atomic_write_bytes(source_path(csv_file), source or file_signature(csv_file))
+    return path
+
+
+def stores_are_fresh(csv_file):
+    """Whether the stores table exists and was built from the product CSV's current size and mtime"""
+    if not os.path.exists(stores_path(csv_file)):
+        return False
+    if not os.path.exists(csv_file):
+        return True
+    try:
+        with open(source_path(csv_file), "rb") as f:
+            return f.read() == file_signature(csv_file)
+    except FileNotFoundError:
+        return False
+
+
+if __name__ == "__main__":
+    import sys
+
+    from dataset_service import GEO_COLUMNS, map_columns
+    from snapshot import load_table
+
+    for csv_file in sys.argv[1:] or ["enhanced_store_data.csv", "store_product_data.csv"]:
+        path = write_stores(csv_file, map_columns(load_table(csv_file))[list(GEO_COLUMNS)])
+        print(f"{csv_file} -> {path} ({len(read_stores(path))} stores)")
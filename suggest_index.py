@@ -0,0 +1,164 @@
+import re
+import time
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from search_index import fold
+
+
+# Columns suggestions come from, with the kind of name shown next to each suggestion
+SUGGEST_COLUMNS = {"product_name": "product", "product_brand": "brand", "store_name": "store"}
+
+# Sorts after every character, so prefix + END bounds all keys starting with prefix
+END = "\U0010ffff"
+
+
+class SuggestIndex:
+    """
+    Sorted-prefix autocomplete over product, brand and store names.
+
+    Every distinct name is one entry, ranked by the sales_volume of all its
+    rows. Each word start of a folded name is a key in one sorted list, so
+    'pure' finds 'Nestlé Pure Life' and 'молоко' finds 'Moloko'. A prefix
+    is two bisects into the keys; the top entries of that range come from
+    one argpartition over their popularity, so a suggestion costs O(log n)
+    plus the size of the matching range, with no Python loop over it.
+    """
+
+    def __init__(self, df, columns=SUGGEST_COLUMNS, version=None):
+        """Build the sorted keys; costs one groupby per column and a sort of the keys"""
+        self.version = version
+        self.entries = []
+        popularity = []
+        keys = []
+        for column in columns:
+            if column not in df.columns:
+                continue
+            if "sales_volume" in df.columns:
+                totals = df.groupby(column, observed=True)["sales_volume"].sum()
+            else:
+                totals = df[column].value_counts()
+            for value, total in totals.items():
+                if not isinstance(value, str):
+                    continue
+                entry = len(self.entries)
+                self.entries.append((value, column))
+                popularity.append(total)
+                folded = fold(value)
+                for word in re.finditer(r"\w+", folded):
+                    keys.append((folded[word.start():], entry))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._key_entries = np.array([entry for _, entry in keys], dtype=np.int64)
+        self.popularity = np.array(popularity, dtype=np.int64)
+        self._key_popularity = self.popularity[self._key_entries]
+
+    def suggest(self, prefix, k=10):
+        """
+        Up to k names with a word starting with prefix, most sold first, as
+        {'text', 'column', 'kind', 'sales_volume'} dicts.
+        """
+        prefix = fold(prefix).strip()
+        if not prefix or k <= 0:
+            return []
+        low = bisect_left(self._keys, prefix)
+        high = bisect_left(self._keys, prefix + END, low)
+        popularity = self._key_popularity[low:high]
+
+        # A name can match at several of its words; over-select so k distinct names survive
+        wanted = min(len(popularity), 4 * k)
+        if wanted < len(popularity):
+            candidates = np.argpartition(-popularity, wanted - 1)[:wanted]
+        else:
+            candidates = np.arange(len(popularity))
+        candidates = candidates[np.argsort(-popularity[candidates], kind="stable")]
+
+        suggestions = []
+        seen = set()
+        for entry in self._key_entries[low + candidates]:
+            if entry in seen:
+                continue
+            seen.add(entry)
+            text, column = self.entries[entry]
+            suggestions.append({
+                "text": text,
+                "column": column,
+                "kind": SUGGEST_COLUMNS.get(column, column),
+                "sales_volume": int(self.popularity[entry]),
+            })
+            if len(suggestions) == k:
+                break
+        return suggestions
+
+
+def _name_totals(df):
+    """Every distinct name with its folded spelling and sales, as a scan-based suggester would hold them"""
+    tables = []
+    for column in SUGGEST_COLUMNS:
+        totals = df.groupby(column, observed=True)["sales_volume"].sum()
+        tables.append(pd.DataFrame({"folded": [fold(value) for value in totals.index], "sales_volume": totals.to_numpy()}))
+    return pd.concat(tables, ignore_index=True)
+
+
+def _scan_suggest(totals, prefix, k):
+    """Reference answer: scan every distinct name for a word starting with prefix and sort by sales"""
+    prefix = fold(prefix).strip()
+    folded = totals["folded"]
+    hit = folded.str.startswith(prefix) | folded.str.contains(" " + prefix, regex=False)
+    return totals["sales_volume"][hit].sort_values(ascending=False, kind="stable").head(k).tolist()
+
+
+def benchmark(skus=1_000_000, prefixes=("m", "mi", "milk", "milk 00002", "nes", "нес", "pure", "fresh", "zz"),
+              k=10, repeats=20):
+    """Time suggestions over a catalog of skus distinct product names built from the product table"""
+    from dataset_service import get_products
+
+    base = get_products()
+    df = base.sample(skus, replace=True, random_state=0, ignore_index=True)
+    # One row per SKU, each with its own numbered product name
+    names = sorted(base["product_name"].dropna().unique())
+    df["product_name"] = [f"{names[number % len(names)]} {number:06d}" for number in range(skus)]
+
+    started = time.perf_counter()
+    index = SuggestIndex(df)
+    print(f"{skus:,} SKUs, {len(index.entries):,} names, {len(index._keys):,} keys, "
+          f"built in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    totals = _name_totals(df)
+    print(f"{'prefix':<14}{'scan ms':>10}{'suggest ms':>12}{'range':>10}  top suggestions")
+    for prefix in prefixes:
+        started = time.perf_counter()
+        expected = _scan_suggest(totals, prefix, k)
+        scan = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            suggestions = index.suggest(prefix, k)
+        suggest = (time.perf_counter() - started) / repeats
+
+        assert [item["sales_volume"] for item in suggestions] == expected
+        folded = fold(prefix)
+        matched = bisect_left(index._keys, folded + END) - bisect_left(index._keys, folded)
+        top = ", ".join(item["text"] for item in suggestions[:3])
+        print(f"{prefix!r:<14}{scan * 1000:>10.1f}{suggest * 1000:>12.3f}{matched:>10,}  {top}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Suggest product, brand and store names, or benchmark the suggestions")
+    parser.add_argument("prefix", nargs="?", help="print the suggestions for this prefix instead of benchmarking")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.prefix is None:
+        benchmark(args.skus, k=args.k, repeats=args.repeats)
+    else:
+        from dataset_service import get_products_suggest
+
+        for item in get_products_suggest().suggest(args.prefix, args.k):
+            print(f"{item['kind']:<8}{item['text']:<40}{item['sales_volume']:>12,}")
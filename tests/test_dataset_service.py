@@ -0,0 +1,36 @@
+import os
+
+import pandas as pd
+
+from dataset_service import get_products_search
+from product_query import query
+
+
+def _write(path, names, mtime_ns):
+    pd.DataFrame({
+        "store_name": ["Korzinka"] * len(names),
+        "product_group": ["Dairy Products"] * len(names),
+        "product_brand": ["Nestle"] * len(names),
+        "product_name": names,
+    }).to_csv(path, index=False)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_search_ranks_query_rows_of_the_same_table_version(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write("enhanced_store_data.csv", ["Milk", "Kefir"], 10**18)
+    result = query({"product_brand": "Nestle"})
+    search = get_products_search(result.version)
+    assert search.version == result.version
+
+    _write("enhanced_store_data.csv", ["Bread", "Tea", "Kefir"], 2 * 10**18)
+    # The index of the queried version stays usable until a newer one replaces it
+    assert get_products_search(result.version) is search
+
+    newer = get_products_search()
+    assert newer.version != result.version
+    assert get_products_search(result.version) is None
+
+    result = query({"product_brand": "Nestle"})
+    positions, _ = get_products_search(result.version).rank("kefir", result.rows.index.to_numpy())
+    assert result.rows.iloc[positions]["product_name"].tolist() == ["Kefir"]
@@ -0,0 +1,41 @@
+import numpy as np
+
+from dedup_index import NO_KEY, DedupIndex
+
+
+def _index(tmp_path, keys, rows):
+    index = DedupIndex(str(tmp_path / "products.csv.keys"))
+    index.rewrite(0, len(keys), np.array(keys, dtype=np.uint64), np.array(rows, dtype=np.uint64))
+    return index
+
+
+def test_classify_splits_a_batch_into_inserts_updates_and_duplicates(tmp_path):
+    index = _index(tmp_path, [10, 20], [100, 200])
+
+    keys = np.array([10, 20, 30, 30], dtype=np.uint64)
+    rows = np.array([100, 201, 300, 301], dtype=np.uint64)
+    write, stats = index.classify(keys, rows)
+
+    # Only the last copy of key 30 in the batch is written
+    assert write.tolist() == [False, True, False, True]
+    assert stats == {"rows": 4, "inserted": 1, "updated": 1, "duplicates": 1, "batch_duplicates": 1}
+
+
+def test_keep_mask_hides_superseded_rows_but_never_unkeyed_ones(tmp_path):
+    index = _index(tmp_path, [10, NO_KEY, 20, NO_KEY], [100, 1, 200, 1])
+    index.append(np.array([10], dtype=np.uint64), np.array([101], dtype=np.uint64))
+
+    assert index.keep_mask().tolist() == [False, True, True, True, True]
+    assert index.entries == {10: 101, 20: 200}
+
+
+def test_a_reloaded_index_sees_entries_appended_by_another_writer(tmp_path):
+    index = _index(tmp_path, [10], [100])
+    reader = DedupIndex(index.path)
+    reader.load()
+
+    index.append(np.array([20], dtype=np.uint64), np.array([200], dtype=np.uint64))
+    reader.load()
+
+    assert reader.entries == {10: 100, 20: 200}
+    assert reader.entry_count() == 2
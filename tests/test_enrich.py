@@ -0,0 +1,37 @@
+import pandas as pd
+
+from enrich import MAX_DISCOUNT, derive_columns
+from normalize import normalize_products
+
+
+def _rows(**columns):
+    df = pd.DataFrame({
+        "store_name": ["Korzinka"] * 3,
+        "product_name": ["Milk", "Kefir", "Bread"],
+        "product_price": [100.0] * 3,
+        "sales_volume": [10] * 3,
+        "status": ["yes"] * 3,
+        "date_of_manufacture": ["2024-01-01"] * 3,
+        "date_of_expiry": ["2024-01-05", "2024-01-15", "2024-12-31"],
+    })
+    return normalize_products(df.assign(**columns))[0]
+
+
+def test_derived_columns_follow_the_expiry_date():
+    out = derive_columns(_rows(), reference_date="2024-01-10")
+
+    # Expired, little shelf life left, plenty left
+    assert out["discount"].tolist() == ["yes", "yes", "no"]
+    assert out["discount_percentage"].iloc[0] == MAX_DISCOUNT
+    assert out["discount_percentage"].iloc[2] == 0.0
+    assert out["discount_price"].iloc[0] == 100.0 * MAX_DISCOUNT / 100
+    assert out["last_status"].tolist() == ["no", "yes", "yes"]
+    assert out["ultra_discount_percentage"].iloc[0] == MAX_DISCOUNT
+
+
+def test_values_present_in_the_rows_are_kept():
+    out = derive_columns(_rows(discount=["no"] * 3, discount_percentage=[7.0] * 3), reference_date="2024-01-10")
+
+    assert out["discount"].tolist() == ["no"] * 3
+    assert out["discount_percentage"].tolist() == [7.0] * 3
+    assert out["ultra_discount_percentage"].tolist() == [0.0] * 3
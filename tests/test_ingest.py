@@ -0,0 +1,94 @@
+import io
+
+import pandas as pd
+
+from ingest import apply_edits, ingest_upload, iter_upload_chunks, merge_editor_changes, new_upload_edits, read_page, validate_upload
+from product_store import ProductStore
+
+
+class Upload(io.BytesIO):
+    """Stands in for Streamlit's UploadedFile"""
+
+    def __init__(self, data, name="products.csv"):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+CSV = (
+    b"store_name,product_brand,product_name,sales_volume\n"
+    b"Korzinka,Nestle,Milk,1\n"
+    b"Korzinka,Nestle,Bread,5\n"
+    b"Korzinka,Nestle,Milk,2\n"
+)
+
+
+def test_reupload_of_a_file_with_repeated_products_writes_nothing(tmp_path):
+    store = ProductStore(str(tmp_path / "products.csv"), dedup=True)
+
+    first = ingest_upload(Upload(CSV), store, chunk_rows=1)
+    again = ingest_upload(Upload(CSV), store, chunk_rows=1)
+
+    assert (first["inserted"], first["updated"], first["batch_duplicates"]) == (2, 0, 1)
+    assert again["rows_written"] == 0 and again["duplicates"] == 2
+    df = store.read()
+    assert sorted(zip(df["product_name"], df["sales_volume"])) == [("Bread", 5), ("Milk", 2)]
+
+
+def test_added_rows_count_as_the_last_row_of_their_product(tmp_path):
+    store = ProductStore(str(tmp_path / "products.csv"), dedup=True)
+    edits = new_upload_edits()
+    edits["added"].append({"store_name": "Korzinka", "product_brand": "Nestle", "product_name": "Milk", "sales_volume": 9})
+
+    stats = ingest_upload(Upload(CSV), store, edits, chunk_rows=2)
+
+    assert stats["inserted"] == 2
+    assert store.read().set_index("product_name")["sales_volume"].to_dict() == {"Bread": 5, "Milk": 9}
+
+
+def test_utf8_and_latin1_uploads_decode_to_the_same_text(tmp_path):
+    store = ProductStore(str(tmp_path / "products.csv"), dedup=True)
+    header = "store_name,product_brand,product_name,sales_volume\n"
+    utf8 = (header + "Korzinka,Nestlé,Nescafé Gold,1\n").encode("utf-8")
+    latin1 = (header + "Korzinka,Nestlé,Nescafé Gold,1\n").encode("iso-8859-1")
+
+    assert ingest_upload(Upload(utf8), store)["inserted"] == 1
+    assert ingest_upload(Upload(latin1), store)["duplicates"] == 1
+    assert store.read()["product_brand"].tolist() == ["Nestlé"]
+
+
+def test_pages_read_from_checkpoints_match_a_full_parse():
+    lines = [b"store_name,product_name,sales_volume"]
+    for i in range(200):
+        if i % 7 == 0:
+            lines.append(b'Korzinka,"Milk ""%d""\nlitre",%d' % (i, i))
+        elif i % 11 == 0:
+            lines.append(b"Korzinka,Bad,%d,extra,fields" % i)
+        else:
+            lines.append(b"Korzinka,Bread %d,%d" % (i, i))
+    upload = Upload(b"\n".join(lines) + b"\n")
+
+    expected = pd.concat([chunk for chunk, _ in iter_upload_chunks(upload, chunk_rows=1000)], ignore_index=True)
+    total, _, pages = validate_upload(upload, segment_bytes=256)
+
+    assert total == len(expected)
+    assert len(pages["rows"]) > 5
+    for start in (0, 1, 37, 100, total - 3):
+        page = read_page(upload, start, 10, pages)
+        pd.testing.assert_frame_equal(page, expected.iloc[start:start + 10], check_index_type=False)
+
+
+def test_editor_changes_map_page_rows_to_file_positions():
+    edits = new_upload_edits()
+    page = pd.DataFrame({"product_name": ["Milk", "Bread", "Kefir"], "sales_volume": [1, 2, 3]})
+    state = {"edited_rows": {"0": {"sales_volume": "many"}}, "deleted_rows": [2], "added_rows": [{"product_name": "Tea"}]}
+
+    assert merge_editor_changes(edits, state, [100, 101, 102])
+    assert not merge_editor_changes(edits, {}, [100, 101, 102])
+    assert edits == {"edited": {100: {"sales_volume": "many"}}, "deleted": {102}, "added": [{"product_name": "Tea"}]}
+
+    redrawn = apply_edits(page, 100, edits)
+    assert redrawn.index.tolist() == [100, 101]
+    assert redrawn["sales_volume"].tolist() == ["many", 2]
+    # Edits of other pages leave this one alone
+    assert apply_edits(page, 0, edits)["sales_volume"].tolist() == [1, 2, 3]
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from normalize import ENHANCED_COLUMNS, normalize_products
+
+
+def test_manual_and_uploaded_rows_share_one_schema():
+    df = pd.DataFrame({
+        "store_name": ["Korzinka", None],
+        "shop_name": [None, None],
+        "product_group": ["Dairy Products", None],
+        "product_category": [None, "Bakery Products"],
+        "product_name": ["Milk", " Bread "],
+        "product_price": ["12000", "5 sum"],
+        "date_of_manufacture": ["2024-01-01", None],
+        "date_of_expiry": ["2024-01-11", None],
+        "production_date": [None, "01.02.2024"],
+        "expire_date": [None, "05.02.2024"],
+        "brand_availability": [None, "Yes"],
+    })
+
+    normalized, rejected = normalize_products(df)
+
+    assert list(normalized.columns) == ENHANCED_COLUMNS
+    assert rejected.empty
+    assert normalized["product_group"].tolist() == ["Dairy Products", "Bakery Products"]
+    assert normalized["product_name"].tolist() == ["Milk", "Bread"]
+    assert normalized["product_price"].tolist() == [12000.0, 5.0]
+    assert normalized["duration_of_expiry"].tolist() == [10.0, 4.0]
+    assert normalized["status"].tolist()[1] == "yes"
+
+
+def test_rejected_rows_keep_their_source_columns_and_first_failing_check():
+    df = pd.DataFrame({
+        "product_name": [None, "Milk", "Kefir"],
+        "product_price": ["1", "-3", "2"],
+        "date_of_manufacture": ["2024-01-01", "2024-01-01", "2024-02-01"],
+        "date_of_expiry": ["2024-01-05", "2024-01-05", "2024-01-01"],
+    })
+
+    normalized, rejected = normalize_products(df)
+
+    assert normalized.empty
+    assert rejected["reject_reason"].tolist() == ["missing product name", "invalid price", "expiry before manufacture"]
+    assert rejected["product_price"].tolist() == ["1", "-3", "2"]
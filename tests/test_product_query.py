@@ -0,0 +1,36 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from product_query import FilterSpec
+
+
+def test_equal_filters_give_equal_keys():
+    a = FilterSpec.from_filters({"product_group": "Dairy Products", "sales_volume": (5, 10)})
+    b = FilterSpec.from_filters({"sales_volume": (5.0, 10.0), "product_group": "Dairy Products"})
+    assert a.key() == b.key()
+
+    day = FilterSpec(ranges={"date_of_expiry": (datetime.date(2024, 1, 1), datetime.date(2024, 2, 1))})
+    midnight = FilterSpec(ranges={"date_of_expiry": (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01"))})
+    assert day.key() == midnight.key()
+
+
+def test_different_filters_give_different_keys():
+    keys = {
+        FilterSpec().key(),
+        FilterSpec(equals={"product_name": "5"}).key(),
+        FilterSpec(equals={"product_name": 5}).key(),
+        FilterSpec(ranges={"product_name": (5, 5)}).key(),
+        FilterSpec(equals={"product_brand": "5"}).key(),
+    }
+    assert len(keys) == 5
+
+
+def test_invalid_filters_are_rejected():
+    with pytest.raises(TypeError):
+        FilterSpec(equals={"product_name": ["Milk"]})
+    with pytest.raises(TypeError):
+        FilterSpec(ranges={"sales_volume": (1, datetime.date(2024, 1, 1))})
+    with pytest.raises(ValueError):
+        FilterSpec(ranges={"sales_volume": (10, 5)})
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+
+import pandas as pd
+
+from product_store import ProductStore
+
+
+def _row(volume, name="Milk"):
+    return pd.DataFrame({
+        "store_name": ["Korzinka"],
+        "product_brand": ["Nestle"],
+        "product_name": [name],
+        "sales_volume": [volume],
+    })
+
+
+def test_touching_the_csv_keeps_superseded_rows_hidden(tmp_path):
+    csv_file = str(tmp_path / "products.csv")
+    store = ProductStore(csv_file, dedup=True)
+    store.upsert(_row(1))
+    store.compact()
+    assert store.upsert(_row(2))["updated"] == 1
+
+    os.utime(csv_file)
+
+    df = ProductStore(csv_file, dedup=True).read()
+    assert len(df) == 1
+    assert df["sales_volume"].tolist() == [2]
+    store.compact()
+    assert pd.read_csv(csv_file)["sales_volume"].tolist() == [2]
+
+
+def _write_batches(args):
+    csv_file, writer_id, batches, rows = args
+    # The deduplicating upsert path, as get_product_store() gives the app
+    store = ProductStore(csv_file, dedup=True)
+    inserted = 0
+    for batch in range(batches):
+        df = pd.DataFrame({
+            "store_name": [f"store-{row}" for row in range(rows)],
+            "product_brand": [f"writer-{writer_id}"] * rows,
+            "product_name": [f"batch-{batch}"] * rows,
+            "sales_volume": list(range(rows)),
+        })
+        inserted += store.upsert(df)["inserted"]
+    return inserted
+
+
+def _compact_repeatedly(args):
+    csv_file, rounds = args
+    store = ProductStore(csv_file, dedup=True)
+    for _ in range(rounds):
+        store.compact()
+        # Touching the CSV, as a checkout or copy does, must not cost any journal rows
+        os.utime(csv_file)
+
+
+def test_concurrent_writers_and_compaction_lose_no_rows(tmp_path, writers=4, batches=5, rows=10, compactions=5):
+    csv_file = str(tmp_path / "products.csv")
+    pd.DataFrame({"product_brand": ["seed"], "product_name": ["seed"], "sales_volume": [0]}).to_csv(csv_file, index=False)
+
+    with multiprocessing.Pool(writers + 1) as pool:
+        compaction = pool.map_async(_compact_repeatedly, [(csv_file, compactions)])
+        written = sum(pool.map(_write_batches, [(csv_file, i, batches, rows) for i in range(writers)]))
+        compaction.get()
+
+    df = ProductStore(csv_file, dedup=True).read()
+    per_writer = df[df["product_brand"] != "seed"].groupby("product_brand").size()
+    assert written == writers * batches * rows
+    assert len(df) == written + 1
+    assert (per_writer == batches * rows).all()
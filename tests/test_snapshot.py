@@ -0,0 +1,18 @@
+import os
+
+from snapshot import load_table, snapshot_path
+
+
+def test_a_rewritten_csv_older_than_its_snapshot_is_reloaded(tmp_path):
+    csv_file = str(tmp_path / "products.csv")
+    with open(csv_file, "w") as f:
+        f.write("product_name,sales_volume\nMilk,1\n")
+    assert load_table(csv_file)["sales_volume"].tolist() == [1]
+
+    # A copied or restored file can carry an mtime older than the snapshot's
+    with open(csv_file, "w") as f:
+        f.write("product_name,sales_volume\nMilk,1\nBread,2\n")
+    snapshot_mtime = os.stat(snapshot_path(csv_file)).st_mtime_ns
+    os.utime(csv_file, ns=(snapshot_mtime - 10**9, snapshot_mtime - 10**9))
+
+    assert load_table(csv_file)["sales_volume"].tolist() == [1, 2]
@@ -0,0 +1,22 @@
+import os
+
+import pandas as pd
+
+from store_table import stores_are_fresh, write_stores
+
+
+def test_a_rewritten_csv_older_than_its_stores_table_is_stale(tmp_path):
+    csv_file = str(tmp_path / "products.csv")
+    with open(csv_file, "w") as f:
+        f.write("store_name,location_lat,location_long\nKorzinka,41.3,69.2\n")
+    df = pd.read_csv(csv_file)
+    write_stores(csv_file, df)
+    assert stores_are_fresh(csv_file)
+
+    with open(csv_file, "a") as f:
+        f.write("Makro,41.2,69.3\n")
+    os.utime(csv_file, ns=(0, 0))
+
+    assert not stores_are_fresh(csv_file)
+    write_stores(csv_file, pd.read_csv(csv_file))
+    assert stores_are_fresh(csv_file)
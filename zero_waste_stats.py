@@ -14,6 +14,16 @@ import folium
 from streamlit_folium import folium_static
 import calendar
 import os
+import time
+from dataset_service import dataset_version, get_products_catalog, get_products_index, get_stores
+from dataset_cache import cache_stats
+from model_registry import get_model, model_info
+from product_query import distinct, query, query_cache_stats, value_range
+
+
+# Widgets inside a fragment rerun only that fragment; older Streamlit versions rerun the whole app
+_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
 
 class StoreDataAnalysisDashboard:
     """
@@ -21,7 +31,7 @@ class StoreDataAnalysisDashboard:
     advanced visualizations and machine learning insights.
     """
     
-    def __init__(self, set_page_config=True):
+    def __init__(self, set_page_config=True, lazy_tabs=True):
         """Initialize the dashboard with configuration settings"""
         # Set page configuration only if requested
         if set_page_config:
@@ -37,10 +47,18 @@ class StoreDataAnalysisDashboard:
         
         # Initialize state variables
         self.df = None
+        self.index = None
         self.df_filtered = None
+        self.catalog = None
+        self.last_query = None
+        self.columns = []
         self.model = None
         self.discount_threshold = 15.0
         self.ultra_discount_threshold = 20.0
+        # Only build the selected tab; results are memoized per session until the filters change
+        self.lazy_tabs = lazy_tabs
+        self.filter_key = None
+        self.timings = {}
         
         # Load data and model
         self.load_data()
@@ -93,42 +111,66 @@ class StoreDataAnalysisDashboard:
     # @st.cache_data
     def load_data(self):
         """Load and preprocess the dataset"""
+        # Serve the filters from the SQLite catalog when that backend is enabled
+        self.catalog = get_products_catalog()
+        if self.catalog is not None:
+            self.columns = self.catalog.columns
+            return
+        
         try:
-            # Try to load the enhanced data first
-            self.df = pd.read_csv("enhanced_store_data.csv")
+            # Enhanced data when available, else the original data; typed once and shared by every session
+            self.index = get_products_index()
+            self.df = self.index.df.copy(deep=False)
         except FileNotFoundError:
-            try:
-                # If enhanced data not found, try to load the original data
-                self.df = pd.read_csv("store_product_data.csv")
-              
-            except FileNotFoundError:
-                st.error("❌ No data files found! Please generate data first.")
-                st.stop()
+            st.error("❌ No data files found! Please generate data first.")
+            st.stop()
         
-        # Convert date columns to datetime
-        date_columns = [col for col in self.df.columns if 'date' in col.lower()]
-        for col in date_columns:
-            self.df[col] = pd.to_datetime(self.df[col])
+        self.df = self._parse_dates(self.df)
+        self.columns = list(self.df.columns)
         
-        # Set the filtered dataframe initially to the full dataframe
-        self.df_filtered = self.df.copy()
+        # Set the filtered dataframe initially to the full dataframe (a view; writes copy on demand)
+        self.df_filtered = self.df.copy(deep=False)
+    
+    def _parse_dates(self, df):
+        """Convert date columns to datetime"""
+        date_columns = [col for col in df.columns if 'date' in col.lower()]
+        for col in date_columns:
+            # Snapshot columns already arrive typed
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(df[col])
+        return df
     
-    # @st.cache_resource
     def load_model(self):
         """Load the ML model if available"""
-        try:
-            self.model = joblib.load('discount_percentage_model.joblib')
-        except FileNotFoundError:
-            pass
+        # Loaded once per process and file version, shared by every session
+        self.model = get_model('discount_percentage_model.joblib')
+    
+    def _options(self, column, filters=None):
+        """Sorted distinct values of a column among the rows matching the filters"""
+        return distinct(column, filters)
+    
+    def _value_range(self, column):
+        """Minimum and maximum of a column over the whole dataset"""
+        return value_range(column)
+    
+    def _apply_filters(self, filters):
+        """Return the rows matching the filters, pushed down to SQL when the catalog is enabled"""
+        self.last_query = query(filters)
+        self.timings['Filter'] = self.last_query.seconds
+        df = self.last_query.rows
+        # Keep charts and groupbys to the categories that are actually present
+        for col in df.select_dtypes(include='category').columns:
+            df[col] = df[col].cat.remove_unused_categories()
+        return df
     
     def build_sidebar_filters(self):
         """Create sidebar filters for interactive data exploration"""
         st.sidebar.markdown("## Filters")
+        filters = {}
         
         # Date range filter
-        if 'date_of_manufacture' in self.df.columns:
-            min_date = self.df['date_of_manufacture'].min().date()
-            max_date = self.df['date_of_manufacture'].max().date()
+        if 'date_of_manufacture' in self.columns:
+            min_date, max_date = self._value_range('date_of_manufacture')
             
             date_range = st.sidebar.date_input(
                 "Date Range (Manufacture Date)",
@@ -138,58 +180,52 @@ class StoreDataAnalysisDashboard:
             )
             
             if len(date_range) == 2:
-                start_date, end_date = date_range
-                mask = (self.df['date_of_manufacture'].dt.date >= start_date) & (self.df['date_of_manufacture'].dt.date <= end_date)
-                self.df_filtered = self.df[mask]
-            else:
-                self.df_filtered = self.df
-        else:
-            self.df_filtered = self.df
+                filters['date_of_manufacture'] = tuple(date_range)
         
         # Store filter
-        if 'store_name' in self.df.columns:
-            all_stores = ['All Stores'] + sorted(self.df['store_name'].unique().tolist())
+        if 'store_name' in self.columns:
+            all_stores = ['All Stores'] + self._options('store_name')
             selected_store = st.sidebar.selectbox("Select Store", all_stores)
             
             if selected_store != 'All Stores':
-                self.df_filtered = self.df_filtered[self.df_filtered['store_name'] == selected_store]
+                filters['store_name'] = selected_store
         
         # Product group filter
-        if 'product_group' in self.df.columns:
-            all_groups = ['All Groups'] + sorted(self.df['product_group'].unique().tolist())
+        if 'product_group' in self.columns:
+            all_groups = ['All Groups'] + self._options('product_group')
             selected_group = st.sidebar.selectbox("Select Product Group", all_groups)
             
             if selected_group != 'All Groups':
-                self.df_filtered = self.df_filtered[self.df_filtered['product_group'] == selected_group]
+                filters['product_group'] = selected_group
         
         # Brand filter
-        if 'product_brand' in self.df.columns:
-            all_brands = ['All Brands'] + sorted(self.df_filtered['product_brand'].unique().tolist())
+        if 'product_brand' in self.columns:
+            all_brands = ['All Brands'] + self._options('product_brand', filters)
             selected_brand = st.sidebar.selectbox("Select Brand", all_brands)
             
             if selected_brand != 'All Brands':
-                self.df_filtered = self.df_filtered[self.df_filtered['product_brand'] == selected_brand]
+                filters['product_brand'] = selected_brand
         
         # Status filter
-        if 'status' in self.df.columns:
-            status_options = ['All'] + sorted(self.df['status'].unique().tolist())
+        if 'status' in self.columns:
+            status_options = ['All'] + self._options('status')
             selected_status = st.sidebar.selectbox("Select Status", status_options)
             
             if selected_status != 'All':
-                self.df_filtered = self.df_filtered[self.df_filtered['status'] == selected_status]
+                filters['status'] = selected_status
         
         # Discount filter
-        if 'discount' in self.df.columns:
+        if 'discount' in self.columns:
             discount_options = ['All', 'yes', 'no']
             selected_discount = st.sidebar.selectbox("Discount Applied", discount_options)
             
             if selected_discount != 'All':
-                self.df_filtered = self.df_filtered[self.df_filtered['discount'] == selected_discount]
+                filters['discount'] = selected_discount
         
         # Sales volume range filter
-        if 'sales_volume' in self.df.columns:
-            min_sales = int(self.df['sales_volume'].min())
-            max_sales = int(self.df['sales_volume'].max())
+        if 'sales_volume' in self.columns:
+            min_sales, max_sales = self._value_range('sales_volume')
+            min_sales, max_sales = int(min_sales), int(max_sales)
             
             sales_range = st.sidebar.slider(
                 "Sales Volume Range",
@@ -197,13 +233,12 @@ class StoreDataAnalysisDashboard:
                 (min_sales, max_sales)
             )
             
-            self.df_filtered = self.df_filtered[(self.df_filtered['sales_volume'] >= sales_range[0]) & 
-                                         (self.df_filtered['sales_volume'] <= sales_range[1])]
+            filters['sales_volume'] = tuple(sales_range)
         
         # Price range filter
-        if 'product_price' in self.df.columns:
-            min_price = float(self.df['product_price'].min())
-            max_price = float(self.df['product_price'].max())
+        if 'product_price' in self.columns:
+            min_price, max_price = self._value_range('product_price')
+            min_price, max_price = float(min_price), float(max_price)
             
             price_range = st.sidebar.slider(
                 "Product Price Range ($)",
@@ -211,27 +246,44 @@ class StoreDataAnalysisDashboard:
                 (min_price, max_price)
             )
             
-            self.df_filtered = self.df_filtered[(self.df_filtered['product_price'] >= price_range[0]) & 
-                                         (self.df_filtered['product_price'] <= price_range[1])]
+            filters['product_price'] = tuple(price_range)
+        
+        # Apply all filters in one pass
+        self.df_filtered = self._apply_filters(filters)
+        self.filter_key = (dataset_version(), tuple(sorted(filters.items())))
         
         # Display filtered data count
         #st.sidebar.markdown(f"### Showing {len(self.df_filtered)} of {len(self.df)} records")
     
+    def _memo(self, name, compute, *args):
+        """Return compute(*args), reusing the result of an earlier rerun while the filters and args are unchanged"""
+        memo = st.session_state.get('dashboard_memo')
+        if memo is None or memo['filters'] != self.filter_key:
+            # New filters invalidate every tab's results at once
+            memo = st.session_state['dashboard_memo'] = {'filters': self.filter_key, 'values': {}}
+        entry = memo['values'].get(name)
+        if entry is None or entry[0] != args:
+            entry = memo['values'][name] = (args, compute(*args))
+        return entry[1]
+    
     def build_ml_thresholds(self):
-        """Add ML threshold controls to the sidebar"""
+        """Add ML threshold controls above the sections that use them"""
         #st.sidebar.markdown("## ML Thresholds")
+        col1, col2 = st.columns(2)
         
-        if 'discount_percentage' in self.df.columns:
-            self.discount_threshold = st.sidebar.slider(
-                "Discount Percentage Threshold (%)",
-                0.0, 50.0, 15.0, 0.5
-            )
+        if 'discount_percentage' in self.columns:
+            with col1:
+                self.discount_threshold = st.slider(
+                    "Discount Percentage Threshold (%)",
+                    0.0, 50.0, 15.0, 0.5
+                )
         
-        if 'ultra_discount_percentage' in self.df.columns:
-            self.ultra_discount_threshold = st.sidebar.slider(
-                "Ultra Discount Threshold (%)",
-                0.0, 50.0, 20.0, 0.5
-            )
+        if 'ultra_discount_percentage' in self.columns:
+            with col2:
+                self.ultra_discount_threshold = st.slider(
+                    "Ultra Discount Threshold (%)",
+                    0.0, 50.0, 20.0, 0.5
+                )
     
     def add_download_button(self):
         """Add download button for filtered data"""
@@ -246,6 +298,32 @@ class StoreDataAnalysisDashboard:
                 mime="text/csv"
             )
     
+    def add_cache_stats(self):
+        """Show how often the shared dataset cache served the data without reloading"""
+        if self.catalog is not None:
+            return
+        stats = cache_stats()
+        results = query_cache_stats()
+        with st.sidebar.expander("Data cache"):
+            st.caption(
+                f"Hits: {stats['hits']} · Misses: {stats['misses']} · Hit rate: {stats['hit_rate']:.0%}  \n"
+                f"Cached tables: {stats['entries']} · Memory: {stats['memory_bytes'] / 2**20:.1f} MB · "
+                f"Load time: {stats['load_seconds']:.2f} s"
+            )
+            st.caption(
+                f"Filter results: {results['entries']} cached · Hit rate: {results['hit_rate']:.0%} "
+                f"({results['hits']} hits, {results['misses']} misses) · "
+                f"Memory: {results['memory_bytes'] / 2**20:.2f} MB · Evicted: {results['evictions']}"
+            )
+    
+    def add_rerun_timing(self):
+        """Show how long this rerun took, in total and per built tab, and how the filters were resolved"""
+        st.session_state['dashboard_timings'] = self.timings
+        with st.sidebar.expander("Rerun timing"):
+            st.caption("  \n".join(f"{name}: {seconds * 1000:.0f} ms" for name, seconds in self.timings.items()))
+            if self.last_query is not None:
+                st.code(self.last_query.explain(), language=None)
+    
     def build_overall_stats_tab(self):
         """Build the Overall Statistics tab content"""
         #st.markdown("<h2 class='sub-header'>Overall Statistics</h2>", unsafe_allow_html=True)
@@ -315,33 +393,38 @@ class StoreDataAnalysisDashboard:
         
         with col1:
             if 'product_group' in self.df_filtered.columns:
-                group_counts = self.df_filtered['product_group'].value_counts().reset_index()
-                group_counts.columns = ['Product Group', 'Count']
+                def group_figure():
+                    group_counts = self.df_filtered['product_group'].value_counts().reset_index()
+                    group_counts.columns = ['Product Group', 'Count']
+                    
+                    fig = px.pie(
+                        group_counts, 
+                        values='Count', 
+                        names='Product Group', 
+                        title='Distribution by Product Group',
+                        color_discrete_sequence=px.colors.qualitative.Set3
+                    )
+                    fig.update_traces(textposition='inside', textinfo='percent+label')
+                    return fig
                 
-                fig = px.pie(
-                    group_counts, 
-                    values='Count', 
-                    names='Product Group', 
-                    title='Distribution by Product Group',
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(self._memo('group_distribution', group_figure), use_container_width=True)
         
         with col2:
             if 'store_name' in self.df_filtered.columns:
-                store_counts = self.df_filtered['store_name'].value_counts().reset_index()
-                store_counts.columns = ['Store', 'Count']
+                def store_figure():
+                    store_counts = self.df_filtered['store_name'].value_counts().reset_index()
+                    store_counts.columns = ['Store', 'Count']
+                    
+                    return px.bar(
+                        store_counts, 
+                        x='Store', 
+                        y='Count',
+                        title='Distribution by Store',
+                        color='Count',
+                        color_continuous_scale='Viridis'
+                    )
                 
-                fig = px.bar(
-                    store_counts, 
-                    x='Store', 
-                    y='Count',
-                    title='Distribution by Store',
-                    color='Count',
-                    color_continuous_scale='Viridis'
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(self._memo('store_distribution', store_figure), use_container_width=True)
     
     def build_sales_pricing_analysis(self):
         """Build sales and pricing analysis charts"""
@@ -350,34 +433,39 @@ class StoreDataAnalysisDashboard:
         
         with col1:
             if 'product_group' in self.df_filtered.columns and 'sales_volume' in self.df_filtered.columns:
-                group_sales = self.df_filtered.groupby('product_group')['sales_volume'].sum().reset_index()
-                group_sales.columns = ['Product Group', 'Total Sales']
+                def sales_figure():
+                    group_sales = self.df_filtered.groupby('product_group')['sales_volume'].sum().reset_index()
+                    group_sales.columns = ['Product Group', 'Total Sales']
+                    
+                    return px.bar(
+                        group_sales, 
+                        x='Product Group', 
+                        y='Total Sales',
+                        title='Total Sales by Product Group',
+                        color='Total Sales',
+                        color_continuous_scale='Viridis'
+                    )
                 
-                fig = px.bar(
-                    group_sales, 
-                    x='Product Group', 
-                    y='Total Sales',
-                    title='Total Sales by Product Group',
-                    color='Total Sales',
-                    color_continuous_scale='Viridis'
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(self._memo('group_sales', sales_figure), use_container_width=True)
         
         with col2:
             if 'product_group' in self.df_filtered.columns and 'product_price' in self.df_filtered.columns:
-                group_price = self.df_filtered.groupby('product_group')['product_price'].mean().reset_index()
-                group_price.columns = ['Product Group', 'Average Price']
+                def price_figure():
+                    group_price = self.df_filtered.groupby('product_group')['product_price'].mean().reset_index()
+                    group_price.columns = ['Product Group', 'Average Price']
+                    
+                    fig = px.bar(
+                        group_price, 
+                        x='Product Group', 
+                        y='Average Price',
+                        title='Average Price by Product Group',
+                        color='Average Price',
+                        color_continuous_scale='Viridis'
+                    )
+                    fig.update_layout(yaxis_title="Average Price ($)")
+                    return fig
                 
-                fig = px.bar(
-                    group_price, 
-                    x='Product Group', 
-                    y='Average Price',
-                    title='Average Price by Product Group',
-                    color='Average Price',
-                    color_continuous_scale='Viridis'
-                )
-                fig.update_layout(yaxis_title="Average Price ($)")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(self._memo('group_price', price_figure), use_container_width=True)
     
     # def build_geographic_distribution(self):
     #     """Build geographic distribution map"""
@@ -421,225 +509,227 @@ class StoreDataAnalysisDashboard:
     
     def build_geographic_distribution(self):
         """Build a beautiful and enhanced geographic distribution map"""
+        if 'location_lat' in self.df_filtered.columns and 'location_long' in self.df_filtered.columns and 'store_name' in self.df_filtered.columns:
+            st.markdown("<h3 class='section-header' style='color:white; padding:10px; border-bottom:2px solid #4DA1A9;'>Geographic Distribution of Stores</h3>", unsafe_allow_html=True)
+            
+            # The map is rebuilt only when the filters change
+            m = self._memo('store_map', self._store_map)
+            
+            # Display the map
+            folium_static(m)
+            
+            # Add additional context below the map
+            st.markdown("""
+            <div style="margin-top:15px; font-size:0.9em; color:#666;">
+               
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            st.warning("Geographic data (location_lat, location_long, store_name) is required for the map display.")
+    
+    def _store_map(self):
+        """Folium map of the stores in the filtered rows, sized and colored by product count"""
         # Import required plugins
         from folium.plugins import MarkerCluster, MiniMap
         import folium.plugins as plugins
         
-        if 'location_lat' in self.df_filtered.columns and 'location_long' in self.df_filtered.columns and 'store_name' in self.df_filtered.columns:
-            st.markdown("<h3 class='section-header' style='color:white; padding:10px; border-bottom:2px solid #4DA1A9;'>Geographic Distribution of Stores</h3>", unsafe_allow_html=True)
+        # Stores sit at their location in the stores table; the filtered rows decide which appear and their counts
+        counts = self.df_filtered.groupby('store_name', observed=True).size()
+        store_data = get_stores().rename(columns={'location_lat': 'lat', 'location_long': 'lon'})
+        store_data['count'] = store_data['store_name'].map(counts)
+        store_data = store_data.dropna(subset=['count']).astype({'count': int})[['store_name', 'lat', 'lon', 'count']]
+        
+        # Calculate center and zoom level
+        map_center = [store_data['lat'].mean(), store_data['lon'].mean()]
+            
+        # Determine zoom level based on data spread
+        lat_range = store_data['lat'].max() - store_data['lat'].min()
+        lon_range = store_data['lon'].max() - store_data['lon'].min()
+            
+        # Calculate appropriate zoom level
+        max_range = max(lat_range, lon_range)
+        if max_range > 50:
+            zoom_level = 2
+        elif max_range > 20:
+            zoom_level = 4
+        elif max_range > 10:
+            zoom_level = 5
+        elif max_range > 5:
+            zoom_level = 6
+        else:
+            zoom_level = 8
+            
+        # Create map with a more attractive tile layer
+        m = folium.Map(
+            location=map_center,
+            zoom_start=zoom_level,
+            tiles='CartoDB positron',  # Clean, modern look
+            width='100%',
+            attr='&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a> &copy; <a href="http://cartodb.com/attributions">CartoDB</a>'
+        )
             
-            # Calculate center and zoom level
-            map_center = [self.df_filtered['location_lat'].mean(), self.df_filtered['location_long'].mean()]
-            
-            # Determine zoom level based on data spread
-            lat_range = self.df_filtered['location_lat'].max() - self.df_filtered['location_lat'].min()
-            lon_range = self.df_filtered['location_long'].max() - self.df_filtered['location_long'].min()
-            
-            # Calculate appropriate zoom level
-            max_range = max(lat_range, lon_range)
-            if max_range > 50:
-                zoom_level = 2
-            elif max_range > 20:
-                zoom_level = 4
-            elif max_range > 10:
-                zoom_level = 5
-            elif max_range > 5:
-                zoom_level = 6
+        # Add alternative tile layers for user to choose from
+        folium.TileLayer(
+            'CartoDB dark_matter', 
+            name='Dark Mode',
+            attr='&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a> &copy; <a href="http://cartodb.com/attributions">CartoDB</a>'
+        ).add_to(m)
+            
+        folium.TileLayer(
+            'OpenStreetMap', 
+            name='Street View',
+            attr='&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+        ).add_to(m)
+            
+        # Create a MarkerCluster for better performance with many points
+        marker_cluster = MarkerCluster(name='Store Clusters').add_to(m)
+            
+        # Color scheme based on count
+        def get_color(count, max_count):
+            # Create a gradient from light blue to dark blue
+            ratio = count / max_count
+            if ratio < 0.2:
+                return '#8FB9E5'  # Light blue
+            elif ratio < 0.4:
+                return '#5B9BD5'  # Medium blue
+            elif ratio < 0.6:
+                return '#2A75C0'  # Blue
+            elif ratio < 0.8:
+                return '#1E4E79'  # Dark blue
             else:
-                zoom_level = 8
-            
-            # Create map with a more attractive tile layer
-            m = folium.Map(
-                location=map_center,
-                zoom_start=zoom_level,
-                tiles='CartoDB positron',  # Clean, modern look
-                width='100%',
-                attr='&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a> &copy; <a href="http://cartodb.com/attributions">CartoDB</a>'
-            )
+                return '#0F2B43'  # Very dark blue
             
-            # Add alternative tile layers for user to choose from
-            folium.TileLayer(
-                'CartoDB dark_matter', 
-                name='Dark Mode',
-                attr='&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a> &copy; <a href="http://cartodb.com/attributions">CartoDB</a>'
-            ).add_to(m)
-            
-            folium.TileLayer(
-                'OpenStreetMap', 
-                name='Street View',
-                attr='&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
-            ).add_to(m)
-            
-            # Group by store and get mean coordinates and counts
-            store_data = self.df_filtered.groupby('store_name').agg({
-                'location_lat': 'mean',
-                'location_long': 'mean',
-                'product_name': 'count'
-            }).reset_index()
-            
-            store_data.columns = ['store_name', 'lat', 'lon', 'count']
-            
-            # Create a MarkerCluster for better performance with many points
-            marker_cluster = MarkerCluster(name='Store Clusters').add_to(m)
-            
-            # Color scheme based on count
-            def get_color(count, max_count):
-                # Create a gradient from light blue to dark blue
-                ratio = count / max_count
-                if ratio < 0.2:
-                    return '#8FB9E5'  # Light blue
-                elif ratio < 0.4:
-                    return '#5B9BD5'  # Medium blue
-                elif ratio < 0.6:
-                    return '#2A75C0'  # Blue
-                elif ratio < 0.8:
-                    return '#1E4E79'  # Dark blue
-                else:
-                    return '#0F2B43'  # Very dark blue
-            
-            # Create a feature group for the regular markers
-            store_markers = folium.FeatureGroup(name='Individual Stores')
+        # Create a feature group for the regular markers
+        store_markers = folium.FeatureGroup(name='Individual Stores')
             
-            # Add markers for each store with custom styling
-            for idx, row in store_data.iterrows():
-                # Calculate size based on count (min 8, max 25)
-                size = 8 + (row['count'] / store_data['count'].max() * 17)
-                color = get_color(row['count'], store_data['count'].max())
+        # Add markers for each store with custom styling
+        for idx, row in store_data.iterrows():
+            # Calculate size based on count (min 8, max 25)
+            size = 8 + (row['count'] / store_data['count'].max() * 17)
+            color = get_color(row['count'], store_data['count'].max())
                 
-                # Create a custom HTML icon
-                icon_size = int(size * 2)  # Double the marker size for the icon
+            # Create a custom HTML icon
+            icon_size = int(size * 2)  # Double the marker size for the icon
                 
-                # Enhanced popup with more styled information
-                popup_html = f"""
-                <div style="width:200px; font-family:Arial,sans-serif;">
-                    <h4 style="color:#2E4057; margin:2px 0; border-bottom:1px solid #ccc; padding-bottom:5px;">
-                        {row['store_name']}
-                    </h4>
-                    <div style="margin:8px 0;">
-                        <strong>Products:</strong> <span style="color:#2A75C0; font-weight:bold;">{row['count']}</span>
-                    </div>
-                    <div style="margin:5px 0; font-size:11px; color:#777;">
-                        Coordinates: [{row['lat']:.4f}, {row['lon']:.4f}]
-                    </div>
+            # Enhanced popup with more styled information
+            popup_html = f"""
+            <div style="width:200px; font-family:Arial,sans-serif;">
+                <h4 style="color:#2E4057; margin:2px 0; border-bottom:1px solid #ccc; padding-bottom:5px;">
+                    {row['store_name']}
+                </h4>
+                <div style="margin:8px 0;">
+                    <strong>Products:</strong> <span style="color:#2A75C0; font-weight:bold;">{row['count']}</span>
                 </div>
-                """
+                <div style="margin:5px 0; font-size:11px; color:#777;">
+                    Coordinates: [{row['lat']:.4f}, {row['lon']:.4f}]
+                </div>
+            </div>
+            """
                 
-                # Create a better looking popup
-                popup = folium.Popup(folium.Html(popup_html, script=True), max_width=250)
+            # Create a better looking popup
+            popup = folium.Popup(folium.Html(popup_html, script=True), max_width=250)
                 
-                # Create a circle marker with a pulse effect
-                circle = folium.CircleMarker(
-                    location=[row['lat'], row['lon']],
-                    radius=size,
-                    popup=popup,
-                    color=color,
-                    fill=True,
-                    fill_color=color,
-                    fill_opacity=0.7,
-                    weight=1.5,
-                    opacity=0.9
-                )
+            # Create a circle marker with a pulse effect
+            circle = folium.CircleMarker(
+                location=[row['lat'], row['lon']],
+                radius=size,
+                popup=popup,
+                color=color,
+                fill=True,
+                fill_color=color,
+                fill_opacity=0.7,
+                weight=1.5,
+                opacity=0.9
+            )
                 
-                # Add to store markers group
-                circle.add_to(store_markers)
+            # Add to store markers group
+            circle.add_to(store_markers)
                 
-                # Create a smaller marker for the cluster view
-                folium.CircleMarker(
-                    location=[row['lat'], row['lon']],
-                    radius=5,
-                    popup=popup,
-                    color=color,
-                    fill=True,
-                    fill_color=color,
-                    fill_opacity=0.8
-                ).add_to(marker_cluster)
-            
-            # Add the feature group to the map
-            store_markers.add_to(m)
-            
-            # Add a minimap for context
-            minimap = MiniMap(toggle_display=True, position='bottomright')
-            m.add_child(minimap)
-            
-            # Add fullscreen button
-            plugins.Fullscreen(position='topleft', title='Expand map', title_cancel='Exit fullscreen', force_separate_button=True).add_to(m)
-            
-            # Add a measure tool
-            plugins.MeasureControl(position='bottomleft', primary_length_unit='kilometers').add_to(m)
-            
-            # Add a search function to locate stores
-            store_dict = {}
-            for idx, row in store_data.iterrows():
-                store_dict[row['store_name']] = [row['lat'], row['lon']]
-            
-            search = plugins.Search(
-                layer=store_markers,
-                geom_type='Point',
-                placeholder='Search for a store',
-                collapsed=True,
-                search_label='store_name'
-            )
-            m.add_child(search)
-            
-            # Add layer control
-            folium.LayerControl(position='topright', collapsed=False).add_to(m)
-            
-            # Add a title and legend
-            title_html = '''
-            <div style="position: fixed; 
-                        top: 10px; left: 50px; width: 250px; height: 30px; 
-                        border:2px solid grey; z-index:9999; font-size:14px;
-                        background-color:white; padding: 5px;
-                        border-radius:5px; box-shadow: 3px 3px 6px rgba(0,0,0,0.2);">
-                <b>Store Distribution Map</b>
+            # Create a smaller marker for the cluster view
+            folium.CircleMarker(
+                location=[row['lat'], row['lon']],
+                radius=5,
+                popup=popup,
+                color=color,
+                fill=True,
+                fill_color=color,
+                fill_opacity=0.8
+            ).add_to(marker_cluster)
+            
+        # Add the feature group to the map
+        store_markers.add_to(m)
+            
+        # Add a minimap for context
+        minimap = MiniMap(toggle_display=True, position='bottomright')
+        m.add_child(minimap)
+            
+        # Add fullscreen button
+        plugins.Fullscreen(position='topleft', title='Expand map', title_cancel='Exit fullscreen', force_separate_button=True).add_to(m)
+            
+        # Add a measure tool
+        plugins.MeasureControl(position='bottomleft', primary_length_unit='kilometers').add_to(m)
+            
+        # Add a search function to locate stores
+        store_dict = {}
+        for idx, row in store_data.iterrows():
+            store_dict[row['store_name']] = [row['lat'], row['lon']]
+            
+        search = plugins.Search(
+            layer=store_markers,
+            geom_type='Point',
+            placeholder='Search for a store',
+            collapsed=True,
+            search_label='store_name'
+        )
+        m.add_child(search)
+            
+        # Add layer control
+        folium.LayerControl(position='topright', collapsed=False).add_to(m)
+            
+        # Add a title and legend
+        title_html = '''
+        <div style="position: fixed; 
+                    top: 10px; left: 50px; width: 250px; height: 30px; 
+                    border:2px solid grey; z-index:9999; font-size:14px;
+                    background-color:white; padding: 5px;
+                    border-radius:5px; box-shadow: 3px 3px 6px rgba(0,0,0,0.2);">
+            <b>Store Distribution Map</b>
+        </div>
+        '''
+        m.get_root().html.add_child(folium.Element(title_html))
+            
+        # Create a custom legend
+        legend_html = '''
+        <div style="position: fixed; 
+                    bottom: 50px; left: 50px; 
+                    border:2px solid grey; z-index:9999; font-size:12px;
+                    background-color:white; padding: 10px;
+                    border-radius:5px; box-shadow: 3px 3px 6px rgba(0,0,0,0.2);">
+            <p style="margin:0 0 5px 0; font-weight:bold;">Number of Products</p>
+            <div style="display:flex; align-items:center; margin:2px 0;">
+                <div style="width:15px; height:15px; border-radius:50%; background-color:#8FB9E5; margin-right:5px;"></div>
+                <span>Small (< 20%)</span>
             </div>
-            '''
-            m.get_root().html.add_child(folium.Element(title_html))
-            
-            # Create a custom legend
-            legend_html = '''
-            <div style="position: fixed; 
-                        bottom: 50px; left: 50px; 
-                        border:2px solid grey; z-index:9999; font-size:12px;
-                        background-color:white; padding: 10px;
-                        border-radius:5px; box-shadow: 3px 3px 6px rgba(0,0,0,0.2);">
-                <p style="margin:0 0 5px 0; font-weight:bold;">Number of Products</p>
-                <div style="display:flex; align-items:center; margin:2px 0;">
-                    <div style="width:15px; height:15px; border-radius:50%; background-color:#8FB9E5; margin-right:5px;"></div>
-                    <span>Small (< 20%)</span>
-                </div>
-                <div style="display:flex; align-items:center; margin:2px 0;">
-                    <div style="width:15px; height:15px; border-radius:50%; background-color:#5B9BD5; margin-right:5px;"></div>
-                    <span>Medium (20-40%)</span>
-                </div>
-                <div style="display:flex; align-items:center; margin:2px 0;">
-                    <div style="width:15px; height:15px; border-radius:50%; background-color:#2A75C0; margin-right:5px;"></div>
-                    <span>Large (40-60%)</span>
-                </div>
-                <div style="display:flex; align-items:center; margin:2px 0;">
-                    <div style="width:15px; height:15px; border-radius:50%; background-color:#1E4E79; margin-right:5px;"></div>
-                    <span>Very Large (60-80%)</span>
-                </div>
-                <div style="display:flex; align-items:center; margin:2px 0;">
-                    <div style="width:15px; height:15px; border-radius:50%; background-color:#0F2B43; margin-right:5px;"></div>
-                    <span>Massive (> 80%)</span>
-                </div>
+            <div style="display:flex; align-items:center; margin:2px 0;">
+                <div style="width:15px; height:15px; border-radius:50%; background-color:#5B9BD5; margin-right:5px;"></div>
+                <span>Medium (20-40%)</span>
             </div>
-            '''
-            m.get_root().html.add_child(folium.Element(legend_html))
-            
-            
-            # Display the map
-            folium_static(m)
-            
-            # Add additional context below the map
-            st.markdown("""
-            <div style="margin-top:15px; font-size:0.9em; color:#666;">
-               
+            <div style="display:flex; align-items:center; margin:2px 0;">
+                <div style="width:15px; height:15px; border-radius:50%; background-color:#2A75C0; margin-right:5px;"></div>
+                <span>Large (40-60%)</span>
             </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.warning("Geographic data (location_lat, location_long, store_name) is required for the map display.")
+            <div style="display:flex; align-items:center; margin:2px 0;">
+                <div style="width:15px; height:15px; border-radius:50%; background-color:#1E4E79; margin-right:5px;"></div>
+                <span>Very Large (60-80%)</span>
+            </div>
+            <div style="display:flex; align-items:center; margin:2px 0;">
+                <div style="width:15px; height:15px; border-radius:50%; background-color:#0F2B43; margin-right:5px;"></div>
+                <span>Massive (> 80%)</span>
+            </div>
+        </div>
+        '''
+        m.get_root().html.add_child(folium.Element(legend_html))
+        return m
 
 
 
@@ -664,62 +754,65 @@ class StoreDataAnalysisDashboard:
         """Build time series analysis charts"""
         if 'date_of_manufacture' in self.df_filtered.columns and 'sales_volume' in self.df_filtered.columns:
             st.markdown("<h3 class='section-header'>Time Series Analysis</h3>", unsafe_allow_html=True)
-            
-            # Group by month and calculate metrics
-            self.df_filtered['month_year'] = self.df_filtered['date_of_manufacture'].dt.strftime('%Y-%m')
-            monthly_data = self.df_filtered.groupby('month_year').agg({
-                'sales_volume': 'sum',
-                'product_price': 'mean',
-                'product_name': 'count'
-            }).reset_index()
-            
-            monthly_data.columns = ['Month', 'Sales Volume', 'Average Price', 'Product Count']
-            
-            # Sort by month
-            monthly_data['Month_dt'] = pd.to_datetime(monthly_data['Month'] + '-01')
-            monthly_data = monthly_data.sort_values('Month_dt')
-            monthly_data['Month'] = monthly_data['Month_dt'].dt.strftime('%b %Y')
-            
-            # Create time series chart
-            fig = go.Figure()
-            
-            fig.add_trace(go.Scatter(
-                x=monthly_data['Month'],
-                y=monthly_data['Sales Volume'],
-                mode='lines+markers',
-                name='Sales Volume',
-                line=dict(color='blue', width=2)
-            ))
-            
-            fig.add_trace(go.Scatter(
-                x=monthly_data['Month'],
-                y=monthly_data['Product Count'],
-                mode='lines+markers',
-                name='Product Count',
-                line=dict(color='green', width=2),
-                yaxis='y2'
-            ))
-            
-            # Create secondary y-axis
-            fig.update_layout(
-                title='Monthly Sales Volume and Product Count',
-                xaxis_title='Month',
-                yaxis_title='Sales Volume',
-                yaxis2=dict(
-                    title='Product Count',
-                    overlaying='y',
-                    side='right'
-                ),
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                )
+            st.plotly_chart(self._memo('time_series', self._time_series_figure), use_container_width=True)
+    
+    def _time_series_figure(self):
+        """Monthly sales volume and product count of the filtered rows"""
+        # Group by month and calculate metrics
+        monthly_data = self.df_filtered.assign(
+            month_year=self.df_filtered['date_of_manufacture'].dt.strftime('%Y-%m')
+        ).groupby('month_year').agg({
+            'sales_volume': 'sum',
+            'product_price': 'mean',
+            'product_name': 'count'
+        }).reset_index()
+        
+        monthly_data.columns = ['Month', 'Sales Volume', 'Average Price', 'Product Count']
+        
+        # Sort by month
+        monthly_data['Month_dt'] = pd.to_datetime(monthly_data['Month'] + '-01')
+        monthly_data = monthly_data.sort_values('Month_dt')
+        monthly_data['Month'] = monthly_data['Month_dt'].dt.strftime('%b %Y')
+        
+        # Create time series chart
+        fig = go.Figure()
+        
+        fig.add_trace(go.Scatter(
+            x=monthly_data['Month'],
+            y=monthly_data['Sales Volume'],
+            mode='lines+markers',
+            name='Sales Volume',
+            line=dict(color='blue', width=2)
+        ))
+        
+        fig.add_trace(go.Scatter(
+            x=monthly_data['Month'],
+            y=monthly_data['Product Count'],
+            mode='lines+markers',
+            name='Product Count',
+            line=dict(color='green', width=2),
+            yaxis='y2'
+        ))
+        
+        # Create secondary y-axis
+        fig.update_layout(
+            title='Monthly Sales Volume and Product Count',
+            xaxis_title='Month',
+            yaxis_title='Sales Volume',
+            yaxis2=dict(
+                title='Product Count',
+                overlaying='y',
+                side='right'
+            ),
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
             )
-            
-            st.plotly_chart(fig, use_container_width=True)
+        )
+        return fig
     
     def build_product_performance(self):
         """Build product performance analysis charts"""
@@ -729,106 +822,117 @@ class StoreDataAnalysisDashboard:
         
         with col1:
                 if 'product_name' in self.df_filtered.columns and 'sales_volume' in self.df_filtered.columns:
-                    # Get top 10 products
-                    top_products = self.df_filtered.groupby('product_name')['sales_volume'].sum().reset_index()
-                    top_products = top_products.sort_values('sales_volume', ascending=False).head(10)
-                    
-                    # Create horizontal bar chart for better readability
-                    fig = px.bar(
-                        top_products,
-                        y='product_name',  # Swapped x and y for horizontal bars
-                        x='sales_volume',
-                        title='Top 10 Products by Sales Volume',
-                        color='sales_volume',
-                        color_continuous_scale='Viridis',
-                        orientation='h'    # Horizontal orientation
-                    )
-                    
-                    # Enhance the styling
-                    fig.update_layout(
-                        xaxis_title='Sales Volume',
-                        yaxis_title='Product',
-                        yaxis={'categoryorder': 'total ascending'},  # Sort bars
+                    def top_products_figure():
+                        # Get top 10 products
+                        top_products = self.df_filtered.groupby('product_name')['sales_volume'].sum().reset_index()
+                        top_products = top_products.sort_values('sales_volume', ascending=False).head(10)
                         
-                        font=dict(family="Arial, sans-serif", size=12),
-                    )
+                        # Create horizontal bar chart for better readability
+                        fig = px.bar(
+                            top_products,
+                            y='product_name',  # Swapped x and y for horizontal bars
+                            x='sales_volume',
+                            title='Top 10 Products by Sales Volume',
+                            color='sales_volume',
+                            color_continuous_scale='Viridis',
+                            orientation='h'    # Horizontal orientation
+                        )
+                        
+                        # Enhance the styling
+                        fig.update_layout(
+                            xaxis_title='Sales Volume',
+                            yaxis_title='Product',
+                            yaxis={'categoryorder': 'total ascending'},  # Sort bars
+                            
+                            font=dict(family="Arial, sans-serif", size=12),
+                        )
+                        return fig
               
                     # Display the chart
-                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(self._memo('top_products', top_products_figure), use_container_width=True)
         
         with col2:
             if 'product_brand' in self.df_filtered.columns and 'sales_volume' in self.df_filtered.columns:
-                brand_performance = self.df_filtered.groupby('product_brand').agg({
-                    'sales_volume': 'sum',
-                    'product_name': 'count'
-                }).reset_index()
-                
-                brand_performance.columns = ['Brand', 'Sales Volume', 'Product Count']
-                brand_performance = brand_performance.sort_values('Sales Volume', ascending=False)
+                def brand_figure():
+                    brand_performance = self.df_filtered.groupby('product_brand').agg({
+                        'sales_volume': 'sum',
+                        'product_name': 'count'
+                    }).reset_index()
+                    
+                    brand_performance.columns = ['Brand', 'Sales Volume', 'Product Count']
+                    brand_performance = brand_performance.sort_values('Sales Volume', ascending=False)
+                    
+                    return px.scatter(
+                        brand_performance,
+                        x='Product Count',
+                        y='Sales Volume',
+                        size='Sales Volume',
+                        color='Brand',
+                        hover_name='Brand',
+                        title='Brand Performance by Product Count and Sales'
+                    )
                 
-                fig = px.scatter(
-                    brand_performance,
-                    x='Product Count',
-                    y='Sales Volume',
-                    size='Sales Volume',
-                    color='Brand',
-                    hover_name='Brand',
-                    title='Brand Performance by Product Count and Sales'
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(self._memo('brand_performance', brand_figure), use_container_width=True)
     
     def build_expiry_analysis(self):
         """Build expiry analysis charts"""
         if 'date_of_expiry' in self.df_filtered.columns:
             st.markdown("<h3 class='section-header'>Expiry Analysis</h3>", unsafe_allow_html=True)
             
-            # Calculate days until expiry
-            current_date = datetime.now()
-            self.df_filtered['days_until_expiry'] = (self.df_filtered['date_of_expiry'] - current_date).dt.days
-            
-            # Create expiry bins
-            bins = [-1000, 0, 30, 90, 180, 365, 1000]
-            labels = ['Expired', '< 30 days', '30-90 days', '90-180 days', '6mo-1yr', '> 1 year']
-            self.df_filtered['expiry_status'] = pd.cut(self.df_filtered['days_until_expiry'], bins=bins, labels=labels)
-            
-            expiry_counts = self.df_filtered['expiry_status'].value_counts().reset_index()
-            expiry_counts.columns = ['Expiry Status', 'Count']
-            
-            # Reorder categories
-            expiry_counts['Expiry Status'] = pd.Categorical(
-                expiry_counts['Expiry Status'],
-                categories=labels,
-                ordered=True
-            )
-            expiry_counts = expiry_counts.sort_values('Expiry Status')
-            
-            fig = px.bar(
-                expiry_counts,
-                x='Expiry Status',
-                y='Count',
-                title='Products by Expiry Timeframe',
-                color='Expiry Status',
-                color_discrete_map={
-                    'Expired': 'red',
-                    '< 30 days': 'orange',
-                    '30-90 days': 'yellow',
-                    '90-180 days': 'yellowgreen',
-                    '6mo-1yr': 'green',
-                    '> 1 year': 'darkgreen'
-                }
-            )
+            fig, expiring_display = self._memo('expiry', self._expiry_analysis)
             st.plotly_chart(fig, use_container_width=True)
             
             # Products expiring soon
-            if self.df_filtered[self.df_filtered['expiry_status'] == '< 30 days'].shape[0] > 0:
+            if expiring_display is not None:
                 #st.markdown("<div class='highlight'>", unsafe_allow_html=True)
                 st.markdown("<b>⚠️ Products Expiring in Next 30 Days:</b>", unsafe_allow_html=True)
-                
-                expiring_soon = self.df_filtered[self.df_filtered['expiry_status'] == '< 30 days'].sort_values('days_until_expiry')
-                expiring_display = expiring_soon[['product_name', 'product_brand', 'store_name', 'days_until_expiry', 'product_price']].head(10)
                 st.dataframe(expiring_display)
                 st.markdown("</div>", unsafe_allow_html=True)
     
+    def _expiry_analysis(self):
+        """Expiry timeframe chart and the first products expiring within 30 days"""
+        # Calculate days until expiry
+        current_date = datetime.now()
+        expiry = self.df_filtered.assign(days_until_expiry=(self.df_filtered['date_of_expiry'] - current_date).dt.days)
+        
+        # Create expiry bins
+        bins = [-1000, 0, 30, 90, 180, 365, 1000]
+        labels = ['Expired', '< 30 days', '30-90 days', '90-180 days', '6mo-1yr', '> 1 year']
+        expiry['expiry_status'] = pd.cut(expiry['days_until_expiry'], bins=bins, labels=labels)
+        
+        expiry_counts = expiry['expiry_status'].value_counts().reset_index()
+        expiry_counts.columns = ['Expiry Status', 'Count']
+        
+        # Reorder categories
+        expiry_counts['Expiry Status'] = pd.Categorical(
+            expiry_counts['Expiry Status'],
+            categories=labels,
+            ordered=True
+        )
+        expiry_counts = expiry_counts.sort_values('Expiry Status')
+        
+        fig = px.bar(
+            expiry_counts,
+            x='Expiry Status',
+            y='Count',
+            title='Products by Expiry Timeframe',
+            color='Expiry Status',
+            color_discrete_map={
+                'Expired': 'red',
+                '< 30 days': 'orange',
+                '30-90 days': 'yellow',
+                '90-180 days': 'yellowgreen',
+                '6mo-1yr': 'green',
+                '> 1 year': 'darkgreen'
+            }
+        )
+        
+        expiring_soon = expiry[expiry['expiry_status'] == '< 30 days'].sort_values('days_until_expiry')
+        if expiring_soon.shape[0] == 0:
+            return fig, None
+        expiring_display = expiring_soon[['product_name', 'product_brand', 'store_name', 'days_until_expiry', 'product_price']].head(10)
+        return fig, expiring_display
+    
 
 
 
@@ -851,12 +955,32 @@ class StoreDataAnalysisDashboard:
             """Build the ML Insights tab content"""
             st.markdown("<h2 class='sub-header'>Machine Learning Insights</h2>", unsafe_allow_html=True)
             
-            self.build_discount_analysis()
+            self.build_threshold_sections()
             self.build_sales_discount_correlation()
-            self.build_ultra_discount_analysis()
             self.build_model_insights()
-            self.build_customer_segmentation()
-            self.build_ml_recommendations()
+            self.build_segmentation_section()
+    
+    @_fragment
+    def build_threshold_sections(self):
+        """Threshold sliders and the sections that depend on them; moving a slider reruns only this fragment"""
+        started = time.perf_counter()
+        self.build_ml_thresholds()
+        self.build_discount_analysis()
+        self.build_ultra_discount_analysis()
+        self.build_ml_recommendations()
+        self._show_fragment_time("Threshold sections", started)
+    
+    @_fragment
+    def build_segmentation_section(self):
+        """Customer segmentation; the Number of Segments slider reruns only this fragment"""
+        started = time.perf_counter()
+        self.build_customer_segmentation()
+        self._show_fragment_time("Segmentation", started)
+    
+    def _show_fragment_time(self, name, started):
+        """Record and show how long a fragment took, which is the latency of its sliders"""
+        self.timings[name] = time.perf_counter() - started
+        st.caption(f"{name} updated in {self.timings[name] * 1000:.0f} ms")
         
     def build_discount_analysis(self):
         """Build discount analysis charts"""
@@ -876,55 +1000,63 @@ class StoreDataAnalysisDashboard:
             if len(discount_data) == 0:
                 st.info("No products with discounts in the current filtered dataset.")
                 return
+            
+            def histogram_figure(threshold):
+                fig = px.histogram(
+                    discount_data,
+                    x='discount_percentage',
+                    nbins=20,
+                    title='Distribution of Discount Percentages',
+                    color_discrete_sequence=['blue']
+                )
+                fig.update_layout(xaxis_title='Discount Percentage (%)', yaxis_title='Count')
                 
-            fig = px.histogram(
-                discount_data,
-                x='discount_percentage',
-                nbins=20,
-                title='Distribution of Discount Percentages',
-                color_discrete_sequence=['blue']
-            )
-            fig.update_layout(xaxis_title='Discount Percentage (%)', yaxis_title='Count')
-            
-            # Add threshold line
-            fig.add_vline(
-                x=self.discount_threshold,
-                line_dash='dash',
-                line_color='red',
-                annotation_text=f'Threshold: {self.discount_threshold}%',
-                annotation_position="top right"
-            )
+                # Add threshold line
+                fig.add_vline(
+                    x=threshold,
+                    line_dash='dash',
+                    line_color='red',
+                    annotation_text=f'Threshold: {threshold}%',
+                    annotation_position="top right"
+                )
+                return fig
             
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(self._memo('discount_histogram', histogram_figure, self.discount_threshold), use_container_width=True)
         
         with col2:
             # Discount percentage by product group
             if 'product_group' in self.df_filtered.columns:
-                group_discount = discount_data.groupby('product_group')['discount_percentage'].mean().reset_index()
+                def group_figure(threshold):
+                    group_discount = discount_data.groupby('product_group')['discount_percentage'].mean().reset_index()
+                    
+                    if len(group_discount) == 0:
+                        return None
+                        
+                    group_discount.columns = ['Product Group', 'Average Discount (%)']
+                    
+                    fig = px.bar(
+                        group_discount,
+                        x='Product Group',
+                        y='Average Discount (%)',
+                        title='Average Discount by Product Group',
+                        color='Average Discount (%)',
+                        color_continuous_scale='Viridis'
+                    )
+                    
+                    # Add threshold line
+                    fig.add_hline(
+                        y=threshold,
+                        line_dash='dash',
+                        line_color='red',
+                        annotation_text=f'Threshold: {threshold}%',
+                        annotation_position="top right"
+                    )
+                    return fig
                 
-                if len(group_discount) == 0:
+                fig = self._memo('discount_by_group', group_figure, self.discount_threshold)
+                if fig is None:
                     st.info("No product groups with discounts in the current filtered dataset.")
                     return
-                    
-                group_discount.columns = ['Product Group', 'Average Discount (%)']
-                
-                fig = px.bar(
-                    group_discount,
-                    x='Product Group',
-                    y='Average Discount (%)',
-                    title='Average Discount by Product Group',
-                    color='Average Discount (%)',
-                    color_continuous_scale='Viridis'
-                )
-                
-                # Add threshold line
-                fig.add_hline(
-                    y=self.discount_threshold,
-                    line_dash='dash',
-                    line_color='red',
-                    annotation_text=f'Threshold: {self.discount_threshold}%',
-                    annotation_position="top right"
-                )
                 
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -944,25 +1076,29 @@ class StoreDataAnalysisDashboard:
         if len(discount_sales_data) == 0:
             st.info("No products with discounts in the current filtered dataset.")
             return
+        
+        def correlation():
+            hover_data = ['product_name']
+            if 'product_price' in discount_sales_data.columns:
+                hover_data.append('product_price')
+            
+            # The OLS trendline is the slowest chart on the dashboard
+            fig = px.scatter(
+                discount_sales_data,
+                x='sales_volume',
+                y='discount_percentage',
+                color='product_group' if 'product_group' in discount_sales_data.columns else None,
+                title='Sales Volume vs Discount Percentage',
+                trendline='ols',
+                hover_data=hover_data
+            )
+            fig.update_layout(xaxis_title='Sales Volume', yaxis_title='Discount Percentage (%)')
             
-        hover_data = ['product_name']
-        if 'product_price' in discount_sales_data.columns:
-            hover_data.append('product_price')
-            
-        fig = px.scatter(
-            discount_sales_data,
-            x='sales_volume',
-            y='discount_percentage',
-            color='product_group' if 'product_group' in discount_sales_data.columns else None,
-            title='Sales Volume vs Discount Percentage',
-            trendline='ols',
-            hover_data=hover_data
-        )
-        fig.update_layout(xaxis_title='Sales Volume', yaxis_title='Discount Percentage (%)')
-        st.plotly_chart(fig, use_container_width=True)
+            # Calculate correlation coefficient
+            return fig, discount_sales_data['sales_volume'].corr(discount_sales_data['discount_percentage'])
         
-        # Calculate correlation coefficient
-        corr = discount_sales_data['sales_volume'].corr(discount_sales_data['discount_percentage'])
+        fig, corr = self._memo('sales_discount_correlation', correlation)
+        st.plotly_chart(fig, use_container_width=True)
         
         correlation_text = "This indicates "
         if corr > 0.3:
@@ -1001,26 +1137,28 @@ class StoreDataAnalysisDashboard:
         
         with col1:
             # Ultra discount gauge chart
-            fig = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=ultra_discount_pct,
-                title={'text': "Products with Ultra Discount (%)"},
-                gauge={
-                    'axis': {'range': [None, 100]},
-                    'bar': {'color': "darkblue"},
-                    'steps': [
-                        {'range': [0, 20], 'color': "lightgray"},
-                        {'range': [20, 50], 'color': "gray"},
-                        {'range': [50, 100], 'color': "darkgray"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': getattr(self, 'ultra_discount_threshold', 30) * 2  # Default to 30 if not set
+            def gauge_figure(threshold):
+                return go.Figure(go.Indicator(
+                    mode="gauge+number",
+                    value=ultra_discount_pct,
+                    title={'text': "Products with Ultra Discount (%)"},
+                    gauge={
+                        'axis': {'range': [None, 100]},
+                        'bar': {'color': "darkblue"},
+                        'steps': [
+                            {'range': [0, 20], 'color': "lightgray"},
+                            {'range': [20, 50], 'color': "gray"},
+                            {'range': [50, 100], 'color': "darkgray"}
+                        ],
+                        'threshold': {
+                            'line': {'color': "red", 'width': 4},
+                            'thickness': 0.75,
+                            'value': threshold * 2
+                        }
                     }
-                }
-            ))
-            st.plotly_chart(fig, use_container_width=True)
+                ))
+            
+            st.plotly_chart(self._memo('ultra_gauge', gauge_figure, self.ultra_discount_threshold), use_container_width=True)
         
         with col2:
             ultra_discount_products = self.df_filtered[self.df_filtered['ultra_discount_percentage'] > 0]
@@ -1028,16 +1166,18 @@ class StoreDataAnalysisDashboard:
             if len(ultra_discount_products) == 0:
                 st.info("No products with ultra discounts in the current filtered dataset.")
             elif 'product_group' in self.df_filtered.columns:
-                # Ultra discount by product group
-                ultra_group = ultra_discount_products.groupby('product_group').agg({
-                    'product_name': 'count',
-                    'ultra_discount_percentage': 'mean'
-                }).reset_index()
-                
-                ultra_group.columns = ['Product Group', 'Product Count', 'Average Ultra Discount (%)']
-                
-                if len(ultra_group) > 0:
-                    fig = px.scatter(
+                def group_figure():
+                    # Ultra discount by product group
+                    ultra_group = ultra_discount_products.groupby('product_group').agg({
+                        'product_name': 'count',
+                        'ultra_discount_percentage': 'mean'
+                    }).reset_index()
+                    
+                    ultra_group.columns = ['Product Group', 'Product Count', 'Average Ultra Discount (%)']
+                    
+                    if len(ultra_group) == 0:
+                        return None
+                    return px.scatter(
                         ultra_group,
                         x='Product Count',
                         y='Average Ultra Discount (%)',
@@ -1045,6 +1185,9 @@ class StoreDataAnalysisDashboard:
                         color='Product Group',
                         title='Ultra Discount Overview by Product Group'
                     )
+                
+                fig = self._memo('ultra_by_group', group_figure)
+                if fig is not None:
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("No product groups with ultra discounts available.")
@@ -1059,6 +1202,14 @@ class StoreDataAnalysisDashboard:
             
         st.markdown("<h3 class='section-header'>Machine Learning Model Insights</h3>", unsafe_allow_html=True)
         
+        info = model_info('discount_percentage_model.joblib')
+        if info is not None:
+            st.caption(
+                f"Model loaded in {info['load_seconds'] * 1000:.0f} ms · file {info['file_bytes'] / 2**20:.1f} MB · "
+                f"arrays {info['heap_bytes'] / 2**20:.1f} MB in memory, {info['mapped_bytes'] / 2**20:.1f} MB memory-mapped · "
+                f"reused {info['hits']} times"
+            )
+        
         # Display feature importance
         if hasattr(self.model, 'feature_importances_'):
             try:
@@ -1121,154 +1272,165 @@ class StoreDataAnalysisDashboard:
         st.markdown("<h3 class='section-header'>Customer Segmentation Analysis</h3>", unsafe_allow_html=True)
         
         try:
-            # Prepare data for clustering
-            cluster_data = self.df_filtered[['sales_volume', 'product_price']].copy()
-            
-            if 'discount_percentage' in self.df_filtered.columns:
-                cluster_data['discount_percentage'] = self.df_filtered['discount_percentage']
-            
             # Check for and handle NaN values
-            if cluster_data.isna().any().any():
+            cluster_columns = ['sales_volume', 'product_price']
+            if 'discount_percentage' in self.df_filtered.columns:
+                cluster_columns.append('discount_percentage')
+            if self.df_filtered[cluster_columns].isna().any().any():
                 st.warning("Data contains missing values. Filling with appropriate defaults for segmentation.")
-                cluster_data = cluster_data.fillna({
-                    'sales_volume': cluster_data['sales_volume'].median(),
-                    'product_price': cluster_data['product_price'].median(),
-                    'discount_percentage': 0 if 'discount_percentage' in cluster_data.columns else None
-                })
-            
-            # Standardize the data
-            scaler = StandardScaler()
-            scaled_data = scaler.fit_transform(cluster_data)
             
             # Determine optimal number of clusters (3-5 typically works well)
             n_clusters = st.slider("Number of Segments", 2, 6, 3)
             
-            # Perform KMeans clustering
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-            self.df_filtered['cluster'] = kmeans.fit_predict(scaled_data)
-            
-            # Create segment labels
-            cluster_centers = scaler.inverse_transform(kmeans.cluster_centers_)
-            segment_labels = []
-            
-            for i in range(n_clusters):
-                center = cluster_centers[i]
-                if len(center) >= 3:  # If discount_percentage is included
-                    sales, price, discount = center
-                    if sales > cluster_centers[:, 0].mean() and price > cluster_centers[:, 1].mean():
-                        label = "High Value Premium"
-                    elif sales > cluster_centers[:, 0].mean() and discount > cluster_centers[:, 2].mean():
-                        label = "High Volume Promotional"
-                    elif price > cluster_centers[:, 1].mean():
-                        label = "Premium Niche"
-                    elif sales > cluster_centers[:, 0].mean():
-                        label = "Popular Mainstream"
-                    else:
-                        label = "Budget Basics"
-                else:  # Just sales and price
-                    sales, price = center
-                    if sales > cluster_centers[:, 0].mean() and price > cluster_centers[:, 1].mean():
-                        label = "Premium Bestsellers"
-                    elif sales > cluster_centers[:, 0].mean():
-                        label = "Popular Value"
-                    elif price > cluster_centers[:, 1].mean():
-                        label = "Luxury Niche"
-                    else:
-                        label = "Economy Essentials"
-                
-                segment_labels.append(f"Segment {i+1}: {label}")
-            
-            # Map cluster numbers to segment labels
-            segment_map = {i: segment_labels[i] for i in range(n_clusters)}
-            self.df_filtered['segment'] = self.df_filtered['cluster'].map(segment_map)
+            # KMeans only runs again when the filters or the number of segments change
+            scatter_fig, pie_fig, segment_insights = self._memo('segmentation', self._segment_products, n_clusters)
             
             # Visualize the clusters
             col1, col2 = st.columns(2)
             
             with col1:
-                # Scatter plot of clusters
-                hover_data = ['product_name']
-                if 'product_group' in self.df_filtered.columns:
-                    hover_data.append('product_group')
-                    
-                fig = px.scatter(
-                    self.df_filtered, 
-                    x='sales_volume', 
-                    y='product_price',
-                    color='segment',
-                    hover_data=hover_data,
-                    title='Product Segmentation Analysis',
-                    labels={'sales_volume': 'Sales Volume', 'product_price': 'Product Price ($)'}
-                )
-                
-                # Move the legend below the chart
-                fig.update_layout(
-                    legend=dict(
-                        orientation="h",
-                        yanchor="top",
-                        y=-0.2,
-                        xanchor="center",
-                        x=0.5,
-                        title=None
-                    ),
-                    margin=dict(b=100)  # Add bottom margin to make room for the legend
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(scatter_fig, use_container_width=True)
             
             with col2:
-                # Segment composition
-                segment_counts = self.df_filtered['segment'].value_counts().reset_index()
-                segment_counts.columns = ['Segment', 'Count']
-                
-                fig = px.pie(
-                    segment_counts,
-                    values='Count',
-                    names='Segment',
-                    title='Segment Distribution',
-                    color_discrete_sequence=px.colors.qualitative.Pastel
-                )
-                fig.update_traces(textposition='inside', textinfo='percent+label')
-                
-                # Move the legend below the chart
-                fig.update_layout(
-                    legend=dict(
-                        orientation="h",
-                        yanchor="top",
-                        y=-0.2,
-                        xanchor="center",
-                        x=0.5,
-                        title=None
-                    ),
-                    margin=dict(b=100)  # Add bottom margin to make room for the legend
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(pie_fig, use_container_width=True)
             
             # Segment insights table
             st.markdown("<b>Segment Insights:</b>", unsafe_allow_html=True)
             
-            agg_dict = {
-                'product_name': 'count',
-                'sales_volume': 'mean',
-                'product_price': 'mean'
-            }
-            
-            if 'discount_percentage' in self.df_filtered.columns:
-                agg_dict['discount_percentage'] = 'mean'
-            
-            segment_insights = self.df_filtered.groupby('segment').agg(agg_dict).reset_index()
-            
-            columns = ['Segment', 'Product Count', 'Avg Sales Volume', 'Avg Price ($)']
-            if 'discount_percentage' in agg_dict:
-                columns.append('Avg Discount (%)')
-                
-            segment_insights.columns = columns
-            
             st.dataframe(segment_insights)
         except Exception as e:
             st.error(f"Error in customer segmentation: {str(e)}")
     
+    def _segment_products(self, n_clusters):
+        """Cluster the filtered products with KMeans; returns the scatter and pie charts and the per-segment table"""
+        # Prepare data for clustering
+        cluster_data = self.df_filtered[['sales_volume', 'product_price']].copy()
+        
+        if 'discount_percentage' in self.df_filtered.columns:
+            cluster_data['discount_percentage'] = self.df_filtered['discount_percentage']
+        
+        if cluster_data.isna().any().any():
+            cluster_data = cluster_data.fillna({
+                'sales_volume': cluster_data['sales_volume'].median(),
+                'product_price': cluster_data['product_price'].median(),
+                'discount_percentage': 0 if 'discount_percentage' in cluster_data.columns else None
+            })
+        
+        # Standardize the data
+        scaler = StandardScaler()
+        scaled_data = scaler.fit_transform(cluster_data)
+        
+        # Perform KMeans clustering
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        segmented = self.df_filtered.assign(cluster=kmeans.fit_predict(scaled_data))
+        
+        # Create segment labels
+        cluster_centers = scaler.inverse_transform(kmeans.cluster_centers_)
+        segment_labels = []
+        
+        for i in range(n_clusters):
+            center = cluster_centers[i]
+            if len(center) >= 3:  # If discount_percentage is included
+                sales, price, discount = center
+                if sales > cluster_centers[:, 0].mean() and price > cluster_centers[:, 1].mean():
+                    label = "High Value Premium"
+                elif sales > cluster_centers[:, 0].mean() and discount > cluster_centers[:, 2].mean():
+                    label = "High Volume Promotional"
+                elif price > cluster_centers[:, 1].mean():
+                    label = "Premium Niche"
+                elif sales > cluster_centers[:, 0].mean():
+                    label = "Popular Mainstream"
+                else:
+                    label = "Budget Basics"
+            else:  # Just sales and price
+                sales, price = center
+                if sales > cluster_centers[:, 0].mean() and price > cluster_centers[:, 1].mean():
+                    label = "Premium Bestsellers"
+                elif sales > cluster_centers[:, 0].mean():
+                    label = "Popular Value"
+                elif price > cluster_centers[:, 1].mean():
+                    label = "Luxury Niche"
+                else:
+                    label = "Economy Essentials"
+            
+            segment_labels.append(f"Segment {i+1}: {label}")
+        
+        # Map cluster numbers to segment labels
+        segment_map = {i: segment_labels[i] for i in range(n_clusters)}
+        segmented['segment'] = segmented['cluster'].map(segment_map)
+        
+        # Scatter plot of clusters
+        hover_data = ['product_name']
+        if 'product_group' in segmented.columns:
+            hover_data.append('product_group')
+            
+        scatter_fig = px.scatter(
+            segmented, 
+            x='sales_volume', 
+            y='product_price',
+            color='segment',
+            hover_data=hover_data,
+            title='Product Segmentation Analysis',
+            labels={'sales_volume': 'Sales Volume', 'product_price': 'Product Price ($)'}
+        )
+        
+        # Move the legend below the chart
+        scatter_fig.update_layout(
+            legend=dict(
+                orientation="h",
+                yanchor="top",
+                y=-0.2,
+                xanchor="center",
+                x=0.5,
+                title=None
+            ),
+            margin=dict(b=100)  # Add bottom margin to make room for the legend
+        )
+        
+        # Segment composition
+        segment_counts = segmented['segment'].value_counts().reset_index()
+        segment_counts.columns = ['Segment', 'Count']
+        
+        pie_fig = px.pie(
+            segment_counts,
+            values='Count',
+            names='Segment',
+            title='Segment Distribution',
+            color_discrete_sequence=px.colors.qualitative.Pastel
+        )
+        pie_fig.update_traces(textposition='inside', textinfo='percent+label')
+        
+        # Move the legend below the chart
+        pie_fig.update_layout(
+            legend=dict(
+                orientation="h",
+                yanchor="top",
+                y=-0.2,
+                xanchor="center",
+                x=0.5,
+                title=None
+            ),
+            margin=dict(b=100)  # Add bottom margin to make room for the legend
+        )
+        
+        agg_dict = {
+            'product_name': 'count',
+            'sales_volume': 'mean',
+            'product_price': 'mean'
+        }
+        
+        if 'discount_percentage' in segmented.columns:
+            agg_dict['discount_percentage'] = 'mean'
+        
+        segment_insights = segmented.groupby('segment').agg(agg_dict).reset_index()
+        
+        columns = ['Segment', 'Product Count', 'Avg Sales Volume', 'Avg Price ($)']
+        if 'discount_percentage' in agg_dict:
+            columns.append('Avg Discount (%)')
+            
+        segment_insights.columns = columns
+        return scatter_fig, pie_fig, segment_insights
+    
     def build_ml_recommendations(self):
         """Build ML-driven recommendations"""
         if 'discount' not in self.df_filtered.columns or 'sales_volume' not in self.df_filtered.columns:
@@ -1399,33 +1561,51 @@ class StoreDataAnalysisDashboard:
         </div>
         """, unsafe_allow_html=True)
     
+    def _tabs(self, labels):
+        """Create the main tabs; in lazy mode switching tabs reruns the script so only the open tab is built"""
+        if self.lazy_tabs:
+            try:
+                return st.tabs(labels, key='dashboard_tab', on_change='rerun')
+            except TypeError:
+                # Streamlit versions without lazy tabs build every tab
+                pass
+        return st.tabs(labels)
+    
     def run(self):
         """Main method to run the dashboard"""
+        started = time.perf_counter()
+        self.timings = {}
+        
         # Display title
         st.markdown("<h1 class='main-header'>Advanced Store Data Analysis Dashboard</h1>", unsafe_allow_html=True)
         
         # Build sidebar filters and controls
         self.build_sidebar_filters()
-        self.build_ml_thresholds()
         self.add_download_button()
+        self.add_cache_stats()
         
         # Main content tabs
-        tab1, tab2, tab3 = st.tabs(["📊 Overall Statistics", "🔍 Detailed Analysis", "🧠 ML Insights"])
-        
-        # Tab 1: Overall Statistics
-        with tab1:
-            self.build_overall_stats_tab()
-        
-        # Tab 2: Detailed Analysis
-        with tab2:
-            self.build_detailed_analysis_tab()
-        
-        # Tab 3: ML Insights
-        with tab3:
-            self.build_ml_insights_tab()
+        tab_builders = [
+            ("📊 Overall Statistics", self.build_overall_stats_tab),
+            ("🔍 Detailed Analysis", self.build_detailed_analysis_tab),
+            ("🧠 ML Insights", self.build_ml_insights_tab),
+        ]
+        tabs = self._tabs([label for label, _ in tab_builders])
+        
+        for tab, (label, build) in zip(tabs, tab_builders):
+            # open is False for the tabs that are not selected, None when tabs do not track selection
+            if getattr(tab, 'open', None) is False:
+                continue
+            tab_started = time.perf_counter()
+            with tab:
+                build()
+            self.timings[label] = time.perf_counter() - tab_started
         
         # Add footer
         self.add_footer()
+        
+        self.timings['Total'] = time.perf_counter() - started
+        self.add_rerun_timing()
     
     
     